@@ -0,0 +1,203 @@
+import re
+import json
+import math
+import heapq
+import hashlib
+from pathlib import Path
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from langchain_core.documents.base import Document
+
+BM25_INDEX_NAME = "bm25_index.json"
+# 可作為檢索前過濾條件的 chunk metadata 欄位
+FILTER_FIELDS = ("document", "section_title", "article")
+
+# CJK 統一表意文字 (含擴充 A) 與相容表意文字
+_CJK = r"㐀-䶿一-鿿豈-﫿"
+_TOKEN_PATTERN = re.compile(rf"[{_CJK}]+|[a-z0-9]+(?:\.[0-9]+)*")
+# 法條編號，例如「第 3 條」、「第三十條之一」、「第 30-1 條」
+ARTICLE_PATTERN = re.compile(
+    r"第\s*([0-9零〇一二兩三四五六七八九十百千]+)\s*(?:-\s*([0-9]+)\s*)?條(?:\s*之\s*([0-9一二三四五六七八九十]+))?"
+)
+_CHINESE_DIGITS = {"零": 0, "〇": 0, "一": 1, "二": 2, "兩": 2, "三": 3, "四": 4,
+                   "五": 5, "六": 6, "七": 7, "八": 8, "九": 9}
+_CHINESE_UNITS = {"十": 10, "百": 100, "千": 1000}
+
+def chinese_to_int(text: str) -> int:
+    """將阿拉伯數字或中文數字 (例如「三十一」) 轉為整數。"""
+    if text.isdigit():
+        return int(text)
+    total, digit = 0, 0
+    for char in text:
+        if char in _CHINESE_DIGITS:
+            digit = _CHINESE_DIGITS[char]
+        elif char in _CHINESE_UNITS:
+            total += (digit or 1) * _CHINESE_UNITS[char]
+            digit = 0
+    return total + digit
+
+def normalize_article(match: re.Match) -> str:
+    """將法條編號統一成「第30條之1」的形式，讓中文與阿拉伯數字寫法可以互相比對。"""
+    number = chinese_to_int(match.group(1))
+    sub_number = match.group(2) or match.group(3)
+    article = f"第{number}條"
+    if sub_number:
+        article += f"之{chinese_to_int(sub_number)}"
+    return article
+
+def tokenize(text: str) -> List[str]:
+    """
+    CJK-aware tokenizer for BM25.
+
+    Chinese runs are split into character unigrams and bigrams, Latin words and
+    numbers are lower-cased whole tokens, and law article references are added
+    as a single normalized token so "第三條" matches "第 3 條".
+
+    Args:
+        text: Text to tokenize.
+
+    Returns:
+        List[str]: Tokens in order of appearance.
+    """
+    tokens = [normalize_article(match) for match in ARTICLE_PATTERN.finditer(text)]
+    for match in _TOKEN_PATTERN.finditer(text.lower()):
+        token = match.group()
+        if not token.isascii():
+            tokens.extend(token)
+            tokens.extend(token[i:i + 2] for i in range(len(token) - 1))
+        else:
+            tokens.append(token)
+    return tokens
+
+def doc_key(doc: Document) -> str:
+    """Stable key of a chunk, shared by the lexical and dense indexes for score fusion."""
+    source = str(doc.metadata.get("source", ""))
+    return hashlib.sha1(f"{source}\0{doc.page_content}".encode("utf-8")).hexdigest()
+
+class BM25Index:
+    """
+    Inverted index with Okapi BM25 scoring, updatable per source file.
+    """
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.doc_lengths: Dict[str, int] = {}
+        self.documents: Dict[str, Dict] = {}
+        self.sources: Dict[str, List[str]] = {}
+        # FILTER_FIELDS 欄位值 -> chunk keys，讓過濾檢索只需計算符合條件的 chunk
+        self.fields: Dict[str, Dict[str, Set[str]]] = {field: {} for field in FILTER_FIELDS}
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def add_documents(self, docs: Iterable[Document]):
+        """Index chunks; a chunk already in the index is skipped."""
+        for doc in docs:
+            key = doc_key(doc)
+            if key in self.doc_lengths:
+                continue
+            terms = Counter(tokenize(doc.page_content))
+            for term, tf in terms.items():
+                self.postings.setdefault(term, {})[key] = tf
+            length = sum(terms.values())
+            self.doc_lengths[key] = length
+            self.total_length += length
+            self.documents[key] = {"page_content": doc.page_content, "metadata": doc.metadata}
+            self.sources.setdefault(str(doc.metadata.get("source", "")), []).append(key)
+            for field, values in self.fields.items():
+                if field in doc.metadata:
+                    values.setdefault(doc.metadata[field], set()).add(key)
+
+    def remove_sources(self, sources: Iterable[str]):
+        """Drop every chunk that came from the given source files."""
+        for source in sources:
+            for key in self.sources.pop(str(source), []):
+                document = self.documents.pop(key)
+                for field, values in self.fields.items():
+                    value = document["metadata"].get(field)
+                    if value in values:
+                        values[value].discard(key)
+                        if not values[value]:
+                            del values[value]
+                for term in set(tokenize(document["page_content"])):
+                    posting = self.postings.get(term)
+                    if posting is not None:
+                        posting.pop(key, None)
+                        if not posting:
+                            del self.postings[term]
+                self.total_length -= self.doc_lengths.pop(key)
+
+    def keys_matching(self, filters: Dict[str, List[str]]) -> Set[str]:
+        """Keys of the chunks whose metadata has one of the accepted values for every filtered field."""
+        keys: Optional[Set[str]] = None
+        for field, accepted in filters.items():
+            index = self.fields.get(field)
+            if index is None:
+                field_keys = {
+                    key for key, document in self.documents.items()
+                    if document["metadata"].get(field) in accepted
+                }
+            else:
+                field_keys = set().union(*(index.get(value, set()) for value in accepted))
+            keys = field_keys if keys is None else keys & field_keys
+        return set(self.doc_lengths) if keys is None else keys
+
+    def search(self, query: str, k: int = 4, filters: Optional[Dict[str, List[str]]] = None) -> List[Tuple[str, float]]:
+        """
+        Score chunks against a query.
+
+        Args:
+            query: Search text.
+            k: Number of results.
+            filters: Normalized metadata filter (field -> accepted values); only matching chunks are scored.
+
+        Returns:
+            List[Tuple[str, float]]: (chunk key, BM25 score), best first.
+        """
+        if not self.doc_lengths:
+            return []
+        allowed = self.keys_matching(filters) if filters else None
+        if allowed is not None and not allowed:
+            return []
+        n_docs = len(self.doc_lengths)
+        avg_length = self.total_length / n_docs
+        scores: Dict[str, float] = {}
+        for term, query_tf in Counter(tokenize(query)).items():
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+            keys = posting.keys() if allowed is None else posting.keys() & allowed
+            for key in keys:
+                tf = posting[key]
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[key] / avg_length)
+                scores[key] = scores.get(key, 0.0) + query_tf * idf * tf * (self.k1 + 1) / (tf + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def get_document(self, key: str) -> Document:
+        return Document(**self.documents[key])
+
+    def save(self, index_path: Path):
+        """Write the index as JSON, replacing the old file atomically."""
+        index_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = index_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "k1": self.k1,
+                "b": self.b,
+                "documents": self.documents,
+            }, f, ensure_ascii=False)
+        tmp_path.replace(index_path)
+
+    @classmethod
+    def load(cls, index_path: Path) -> Optional["BM25Index"]:
+        """Load a saved index, or None if it does not exist. Postings are rebuilt in memory."""
+        if not index_path.exists():
+            return None
+        with open(index_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        index = cls(k1=data["k1"], b=data["b"])
+        index.add_documents(Document(**document) for document in data["documents"].values())
+        return index
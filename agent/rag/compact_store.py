@@ -0,0 +1,207 @@
+import json
+import numpy as np
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from langchain_core.documents.base import Document
+from langchain_core.embeddings import Embeddings
+
+COMPACT_STORE_NAME = "compact_vectors"
+# meta.json 的格式版本，舊格式的 store 會在下次建置時重寫
+COMPACT_FORMAT = 3
+COMPACT_DTYPES = ("int8", "float16")
+# 重新計分用的向量格式；float16 store 的量化向量本身即為此格式，不另存
+RESCORE_DTYPE = "float16"
+# 每個候選結果以 float16 向量重新計分的倍數 (rescore_k = k * RESCORE_FACTOR)
+RESCORE_FACTOR = 4
+# 一次解量化並計分的列數，限制查詢時的暫存記憶體
+SCORE_BLOCK_ROWS = 8192
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+def quantize(vectors: np.ndarray, dtype: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Quantize unit-length float32 vectors.
+
+    int8 uses one symmetric scale per vector (max |x| maps to 127); float16 is a plain cast.
+
+    Args:
+        vectors: Float32 array of shape (n, dim).
+        dtype: "int8" or "float16".
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Quantized vectors and the per-vector scales (all ones for float16).
+    """
+    if dtype not in COMPACT_DTYPES:
+        raise ValueError(f"Unknown compact dtype '{dtype}', expected one of {COMPACT_DTYPES}")
+    if dtype == "float16":
+        return vectors.astype(np.float16), np.ones(len(vectors), dtype=np.float32)
+    scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127.0
+    quantized = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return quantized, scales.astype(np.float32)
+
+class CompactVectorStore:
+    """
+    Read-only dense index with int8 or float16 vectors in a memory-mapped file.
+
+    Queries scan the quantized vectors, then rescore the best `k * RESCORE_FACTOR`
+    candidates with float16 vectors (a separate file for int8 stores, the scanned
+    vectors themselves for float16 stores). All vector files are opened with mmap,
+    so worker processes serving the same index version share one copy through the
+    page cache and rescoring only reads the candidates' rows. The text and metadata
+    of the final results come from the Chroma collection the store was built from,
+    which also evaluates metadata filters; only documents and metadata are fetched,
+    so Chroma's vector segment is never loaded.
+
+    Implements the `similarity_search` subset of the Chroma interface used by
+    `hybrid_search`, so it can stand in for the Chroma store at query time.
+    """
+    def __init__(self, store_path: Path, embedding: Embeddings, vectorstore):
+        self.store_path = store_path
+        self.embedding = embedding
+        self.vectorstore = vectorstore
+        with open(store_path / "meta.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.dtype = meta["dtype"]
+        self.ids: List[str] = meta["ids"]
+        self.rows = {chroma_id: row for row, chroma_id in enumerate(self.ids)}
+        self.vectors = np.load(store_path / f"vectors.{self.dtype}.npy", mmap_mode="r")
+        self.scales = np.load(store_path / "scales.npy", mmap_mode="r")
+        if self.dtype == RESCORE_DTYPE:
+            self.rescore_vectors = self.vectors
+        else:
+            self.rescore_vectors = np.load(store_path / f"rescore.{RESCORE_DTYPE}.npy", mmap_mode="r")
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes of every vector array the store maps: quantized vectors, scales and rescore vectors."""
+        rescore_bytes = 0 if self.rescore_vectors is self.vectors else self.rescore_vectors.nbytes
+        return int(self.vectors.nbytes + self.scales.nbytes + rescore_bytes)
+
+    @property
+    def disk_bytes(self) -> int:
+        """Bytes of the store's files, in addition to the Chroma database."""
+        return sum(path.stat().st_size for path in self.store_path.iterdir() if path.is_file())
+
+    @staticmethod
+    def built(store_path: Path) -> bool:
+        """Whether a store in the current format exists at `store_path`."""
+        try:
+            with open(store_path / "meta.json", "r", encoding="utf-8") as f:
+                return json.load(f).get("format") == COMPACT_FORMAT
+        except (FileNotFoundError, ValueError):
+            return False
+
+    @classmethod
+    def build(cls, store_path: Path, vectors: np.ndarray, ids: List[str], dtype: str):
+        """
+        Write a compact store. Files are written under new names and then renamed,
+        so a store is never read half-written.
+
+        Args:
+            store_path: Directory of the store.
+            vectors: Float32 embeddings, shape (n, dim).
+            ids: Chroma ids of the embeddings, in the same order.
+            dtype: "int8" or "float16".
+        """
+        store_path.mkdir(parents=True, exist_ok=True)
+        vectors = normalize_rows(np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1))
+        quantized, scales = quantize(vectors, dtype)
+
+        outputs = {f"vectors.{dtype}.npy": quantized, "scales.npy": scales}
+        if dtype != RESCORE_DTYPE:
+            outputs[f"rescore.{RESCORE_DTYPE}.npy"] = vectors.astype(RESCORE_DTYPE)
+        for name, array in outputs.items():
+            with open(store_path / f"{name}.tmp", "wb") as f:
+                np.save(f, array)
+        with open(store_path / "meta.json.tmp", "w", encoding="utf-8") as f:
+            json.dump({
+                "format": COMPACT_FORMAT,
+                "dtype": dtype,
+                "dim": int(vectors.shape[1]) if len(vectors) else 0,
+                "ids": list(ids),
+            }, f)
+        for name in [*outputs, "meta.json"]:
+            (store_path / f"{name}.tmp").replace(store_path / name)
+        # 舊格式或其他 dtype 留下的檔案 (例如 vectors.float32.npy)
+        for path in store_path.iterdir():
+            if path.name not in outputs and path.name != "meta.json":
+                path.unlink()
+
+    @classmethod
+    def from_chroma(cls, vectorstore, store_path: Path, dtype: str):
+        """Write a compact store from the embeddings already stored in a Chroma collection."""
+        stored = vectorstore.get(include=["embeddings"])
+        cls.build(store_path, np.asarray(stored["embeddings"], dtype=np.float32), stored["ids"], dtype)
+
+    @classmethod
+    def load(cls, store_path: Path, embedding: Embeddings, vectorstore) -> Optional["CompactVectorStore"]:
+        """Open a compact store on top of its Chroma collection, or None if it has not been built."""
+        if not cls.built(store_path):
+            return None
+        return cls(store_path, embedding, vectorstore)
+
+    def _candidate_mask(self, where: Optional[Dict]) -> Optional[np.ndarray]:
+        if not where:
+            return None
+        mask = np.zeros(len(self), dtype=bool)
+        for chroma_id in self.vectorstore.get(where=where, include=[])["ids"]:
+            row = self.rows.get(chroma_id)
+            if row is not None:
+                mask[row] = True
+        return mask
+
+    def similarity_search_with_score(
+        self, query: str, k: int = 4, filter: Optional[Dict] = None, rescore_k: Optional[int] = None
+    ) -> List[Tuple[Document, float]]:
+        """
+        Cosine similarity search.
+
+        Args:
+            query: Search text.
+            k: Number of results.
+            filter: Chroma style `where` clause on document metadata.
+            rescore_k: Candidates rescored with float16 vectors, `k * RESCORE_FACTOR` by default.
+
+        Returns:
+            List[Tuple[Document, float]]: Documents with their cosine similarity, best first.
+        """
+        if not len(self):
+            return []
+        query_vector = normalize_rows(np.asarray([self.embedding.embed_query(query)], dtype=np.float32))[0]
+        mask = self._candidate_mask(filter)
+
+        scores = np.empty(len(self), dtype=np.float32)
+        for start in range(0, len(self), SCORE_BLOCK_ROWS):
+            block = self.vectors[start:start + SCORE_BLOCK_ROWS].astype(np.float32)
+            scores[start:start + len(block)] = (block @ query_vector) * self.scales[start:start + len(block)]
+        if mask is not None:
+            scores[~mask] = -np.inf
+
+        n_valid = len(self) if mask is None else int(mask.sum())
+        rescore_k = min(rescore_k or k * RESCORE_FACTOR, n_valid)
+        if rescore_k <= 0:
+            return []
+        # 依列號排序，讀取 mmap 時較連續
+        candidates = np.sort(np.argpartition(-scores, rescore_k - 1)[:rescore_k])
+        exact = self.rescore_vectors[candidates].astype(np.float32) @ query_vector
+        order = np.argsort(-exact)[:k]
+        best, best_scores = candidates[order], exact[order]
+
+        # 只向 Chroma 取最終結果的內容與 metadata，回傳順序不一定與 ids 相同
+        stored = self.vectorstore.get(ids=[self.ids[row] for row in best], include=["documents", "metadatas"])
+        found = {
+            chroma_id: Document(page_content=document, metadata=metadata or {})
+            for chroma_id, document, metadata in zip(stored["ids"], stored["documents"], stored["metadatas"])
+        }
+        return [
+            (found[self.ids[row]], float(score))
+            for row, score in zip(best, best_scores) if self.ids[row] in found
+        ]
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[Dict] = None, **kwargs) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, filter=filter, **kwargs)]
@@ -0,0 +1,47 @@
+from typing import Dict, List, Optional, Union
+from .bm25 import ARTICLE_PATTERN, FILTER_FIELDS, normalize_article
+
+MetadataFilter = Dict[str, Union[str, List[str]]]
+
+def normalize_filter(filters: Optional[MetadataFilter]) -> Dict[str, List[str]]:
+    """
+    Turn a user filter into field -> accepted values. Empty values are dropped and
+    article numbers are normalized the same way as chunk metadata ("第三條" -> "第3條").
+
+    Args:
+        filters (Optional[MetadataFilter]): Field -> value or list of values.
+
+    Returns:
+        Dict[str, List[str]]: Field -> accepted values, empty if nothing to filter on.
+
+    Raises:
+        ValueError: If a field is not one of FILTER_FIELDS.
+    """
+    normalized = {}
+    for field, values in (filters or {}).items():
+        if field not in FILTER_FIELDS:
+            raise ValueError(f"Cannot filter on '{field}', expected one of {list(FILTER_FIELDS)}")
+        values = [values] if isinstance(values, str) else list(values or [])
+        if field == "article":
+            values = [
+                normalize_article(match) if (match := ARTICLE_PATTERN.search(value)) else value
+                for value in values
+            ]
+        values = [value.strip() for value in values if value and value.strip()]
+        if values:
+            normalized[field] = list(dict.fromkeys(values))
+    return normalized
+
+def build_where(filters: Dict[str, List[str]]) -> Optional[Dict]:
+    """Chroma `where` clause for a normalized filter, or None when there is nothing to filter."""
+    clauses = [
+        {field: values[0]} if len(values) == 1 else {field: {"$in": values}}
+        for field, values in filters.items()
+    ]
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+def matches(metadata: Dict, filters: Dict[str, List[str]]) -> bool:
+    """Whether chunk metadata satisfies every field of a normalized filter."""
+    return all(metadata.get(field) in values for field, values in filters.items())
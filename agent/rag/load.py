@@ -3,24 +3,78 @@ import re
 import json
 import hashlib
 from pathlib import Path
-from typing import List, Dict, Tuple
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Tuple, Optional, Iterator
 from langchain_unstructured import UnstructuredLoader
 from langchain_community.vectorstores.utils import filter_complex_metadata
 from langchain_core.documents.base import Document
+from .bm25 import ARTICLE_PATTERN, normalize_article
 
-def pdf_loader(doc_path: Path) -> List:
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+# 切分設定：chunk 大小與相鄰 chunk 的重疊長度，單位為字元 ("char") 或 tiktoken token ("token")
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 100
+CHUNK_UNIT = "char"
+
+# files_record.json 格式版本與檔案 hash 設定；xxh3_64 需要安裝 xxhash
+RECORDS_VERSION = 2
+HASH_ALGORITHMS = ("md5", "blake2b", "xxh3_64")
+HASH_ALGORITHM = os.getenv("RAG_HASH_ALGORITHM", "blake2b")
+HASH_CHUNK_SIZE = 1 << 20
+HASH_WORKERS = 4
+
+# 標題層級，由上而下依序比對編號格式；無編號的標題 (例如「摘要」) 視為最上層
+_NUMERALS = "零〇一二三四五六七八九十百"
+_TITLE_LEVELS = [
+    re.compile(rf"第\s*[{_NUMERALS}0-9]+\s*[章篇]"),
+    re.compile(rf"第\s*[{_NUMERALS}0-9]+\s*節"),
+    re.compile(rf"[{_NUMERALS}]+\s*[、．.]"),
+    re.compile(rf"[（(]\s*[{_NUMERALS}]+\s*[)）]"),
+    re.compile(r"[0-9]+(?:\.[0-9]+)*\s*[、．.]"),
+    re.compile(r"[（(]\s*[0-9]+\s*[)）]"),
+]
+# 位於行首的法條編號，視為新條文的開始
+_ARTICLE_HEADING = re.compile(r"(?:^|\n)\s*(?:" + ARTICLE_PATTERN.pattern + ")")
+
+# 句末標點 (中英文)，英文句號需後接空白以免切開小數與編號，可接收尾的引號或括號
+_SENTENCE_END = re.compile(r'(?:[。｡！？!?；;…]+|[.．](?=\s|$)|\n{2,})[」』”’"\'）)》〉】\]]*')
+
+def pdf_loader(
+    doc_path: Path,
+    files: Optional[List[str]] = None,
+    chunk_size: int = CHUNK_SIZE,
+    chunk_overlap: int = CHUNK_OVERLAP,
+    chunk_unit: str = CHUNK_UNIT,
+    section_titles: Optional[Dict[str, List[str]]] = None,
+    document_names: Optional[Dict[str, str]] = None,
+) -> List:
     """
     Load and process PDF files, ensuring that sentence boundaries are preserved.
 
     Args:
         doc_path (Path): Path to the directory containing PDF files.
+        files (Optional[List[str]]): Only load these files instead of the whole directory.
+        chunk_size (int): Maximum chunk length in `chunk_unit`.
+        chunk_overlap (int): Length of the tail of a chunk repeated at the start of the next one.
+        chunk_unit (str): "char" or "token".
+        section_titles (Optional[Dict[str, List[str]]]): Titles of each file in reading order,
+            used to tag every chunk with the `section_title` and `section_path` it belongs to.
+        document_names (Optional[Dict[str, str]]): File name -> document name stored as the
+            `document` metadata of its chunks, the file stem if not listed.
     
     Returns:
         List: Processed documents with improved chunking.
     """
     # 獲取所有 PDF 文件路徑
-    pdf_files = get_pdf_document_paths(doc_path)
+    pdf_files = get_pdf_document_paths(doc_path) if files is None else files
     pdf_files = [str(file_path) for file_path in pdf_files]
+    if not pdf_files:
+        return []
 
     # 初始化 UnstructuredLoader
     loader = UnstructuredLoader(
@@ -32,82 +86,298 @@ def pdf_loader(doc_path: Path) -> List:
 
     # 加載文檔
     docs = loader.load()
+    if section_titles:
+        assign_section_titles(docs, section_titles)
 
-    # 後處理：自定義切分以保證句子完整
+    # 後處理：自定義切分以保證句子完整，同一文件內相鄰 chunk 保留重疊
     processed_docs = []
+    chunker = SentenceChunker(chunk_size, chunk_overlap, chunk_unit)
+    current_source = None
     for doc in docs:
-        processed_content = preserve_sentence_boundaries(doc.page_content, max_length=1000)
-        for chunk in processed_content:
+        if doc.metadata.get("source") != current_source:
+            current_source = doc.metadata.get("source")
+            chunker.reset()
+        for chunk in chunker.split(doc.page_content):
             processed_docs.append(
-                Document(metadata=doc.metadata, page_content=chunk)
+                Document(metadata=dict(doc.metadata), page_content=chunk)
             )
+    assign_documents(processed_docs, document_names or {})
+    assign_articles(processed_docs)
     filter_docs = filter_complex_metadata(processed_docs)
 
     return filter_docs
 
-def preserve_sentence_boundaries(text: str, max_length: int = 1000) -> List[str]:
+def title_level(title: str) -> int:
+    """Heading depth of a title from its numbering, 0 for chapters and unnumbered titles."""
+    for level, pattern in enumerate(_TITLE_LEVELS):
+        if pattern.match(title.strip()):
+            return level
+    return 0
+
+def assign_section_titles(docs: List[Document], section_titles: Dict[str, List[str]], look_ahead: int = 5) -> None:
+    """
+    Tag each document with the last title seen so far in its source file (`section_title`)
+    and the titles of its enclosing sections joined by " > " (`section_path`).
+
+    Titles are matched in reading order (whitespace ignored); a title that is
+    not found does not block the next `look_ahead` titles from matching.
+
+    Args:
+        docs (List[Document]): Documents in reading order, modified in place.
+        section_titles (Dict[str, List[str]]): Source file -> titles in reading order.
+        look_ahead (int): How many upcoming titles are tried for each document.
+    """
+    positions: Dict[str, int] = {}
+    paths: Dict[str, List[Tuple[int, str]]] = {}
+    for doc in docs:
+        source = str(doc.metadata.get("source", ""))
+        titles = section_titles.get(source, [])
+        content = "".join(doc.page_content.split())
+        position = positions.get(source, 0)
+        for index in range(position, min(position + look_ahead, len(titles))):
+            if "".join(titles[index].split()) in content:
+                level = title_level(titles[index])
+                path = [entry for entry in paths.get(source, []) if entry[0] < level]
+                paths[source] = path + [(level, titles[index])]
+                position = index + 1
+        positions[source] = position
+        if paths.get(source):
+            doc.metadata["section_title"] = paths[source][-1][1]
+            doc.metadata["section_path"] = " > ".join(title for _, title in paths[source])
+
+def assign_documents(docs: List[Document], document_names: Dict[str, str]) -> None:
+    """Tag each document with the name of the file it came from, used for filtered retrieval."""
+    for doc in docs:
+        file_name = Path(str(doc.metadata.get("source", ""))).name
+        doc.metadata["document"] = document_names.get(file_name, Path(file_name).stem)
+
+def assign_articles(docs: List[Document]) -> None:
+    """
+    Tag law chunks with their article number (e.g. "第30條之1"). A chunk takes the first
+    article that starts in it, otherwise the article continued from the previous chunk
+    of the same file. Chunks before the first article are left untagged.
+    """
+    current_articles: Dict[str, str] = {}
+    for doc in docs:
+        source = str(doc.metadata.get("source", ""))
+        headings = [normalize_article(match) for match in _ARTICLE_HEADING.finditer(doc.page_content)]
+        article = headings[0] if headings else current_articles.get(source)
+        if article:
+            doc.metadata["article"] = article
+        if headings:
+            current_articles[source] = headings[-1]
+
+def iter_sentences(text: str) -> Iterator[str]:
+    """Yield the sentences of a text, each keeping its ending punctuation."""
+    start = 0
+    for match in _SENTENCE_END.finditer(text):
+        if match.end() > start:
+            yield text[start:match.end()]
+        start = match.end()
+    if start < len(text):
+        yield text[start:]
+
+class CharSizer:
+    """Measures and hard-splits text by characters."""
+    def length(self, text: str) -> int:
+        return len(text)
+
+    def split(self, text: str, max_length: int) -> List[str]:
+        return [text[i:i + max_length] for i in range(0, len(text), max_length)]
+
+class TokenSizer:
+    """Measures and hard-splits text by tiktoken tokens."""
+    def __init__(self, encoding_name: str = "cl100k_base"):
+        import tiktoken
+        self.encoding = tiktoken.get_encoding(encoding_name)
+
+    def length(self, text: str) -> int:
+        return len(self.encoding.encode(text))
+
+    def split(self, text: str, max_length: int) -> List[str]:
+        # 以 token 起點的字元位置切分，避免把多位元組的中文字切成兩半
+        tokens = self.encoding.encode(text)
+        _, offsets = self.encoding.decode_with_offsets(tokens)
+        cuts = [offsets[i] for i in range(0, len(tokens), max_length)] + [len(text)]
+        return [text[start:end] for start, end in zip(cuts, cuts[1:]) if end > start]
+
+def get_sizer(unit: str):
+    if unit == "char":
+        return CharSizer()
+    if unit == "token":
+        return TokenSizer()
+    raise ValueError(f"Unknown chunk unit '{unit}', expected 'char' or 'token'")
+
+class SentenceChunker:
+    """
+    Streaming sentence-aware chunker.
+
+    Sentences are accumulated into a window until the next one would exceed
+    `max_length`; the window is then emitted and its last sentences (up to
+    `overlap`) start the next chunk. A sentence longer than `max_length` is
+    hard-split. The window survives between `split` calls so consecutive
+    elements of one document overlap too; call `reset` between documents.
+    Every sentence is added and dropped once, so the work is linear in the
+    text size.
+    """
+    def __init__(self, max_length: int = CHUNK_SIZE, overlap: int = 0, unit: str = "char"):
+        if overlap >= max_length:
+            raise ValueError("overlap must be smaller than max_length")
+        self.max_length = max_length
+        self.overlap = overlap
+        self.sizer = get_sizer(unit)
+        self.reset()
+
+    def reset(self):
+        self.window = deque()
+        self.window_length = 0
+        self.pending = False  # window 中是否有尚未輸出的句子
+
+    def split(self, text: str) -> Iterator[str]:
+        for sentence in iter_sentences(text):
+            length = self.sizer.length(sentence)
+            pieces = [(sentence, length)] if length <= self.max_length else [
+                (piece, self.sizer.length(piece)) for piece in self.sizer.split(sentence, self.max_length)
+            ]
+            for piece, piece_length in pieces:
+                if self.window_length + piece_length > self.max_length:
+                    if self.pending:
+                        chunk = "".join(part for part, _ in self.window).strip()
+                        if chunk:
+                            yield chunk
+                        self.pending = False
+                    # 只保留 overlap 長度的句子，並確保放得下新的句子
+                    while self.window and (
+                        self.window_length > self.overlap
+                        or self.window_length + piece_length > self.max_length
+                    ):
+                        self.window_length -= self.window.popleft()[1]
+                self.window.append((piece, piece_length))
+                self.window_length += piece_length
+                self.pending = True
+
+        # 輸出此段文字最後一個 chunk，保留 overlap 長度的句子作為下一段的開頭
+        if self.pending:
+            chunk = "".join(part for part, _ in self.window).strip()
+            if chunk:
+                yield chunk
+            self.pending = False
+        while self.window and self.window_length > self.overlap:
+            self.window_length -= self.window.popleft()[1]
+
+def preserve_sentence_boundaries(
+    text: str, max_length: int = 1000, overlap: int = 0, unit: str = "char"
+) -> List[str]:
     """
     Preserve sentence boundaries by splitting text at punctuation marks and respecting max length.
 
     Args:
         text (str): The input text to be split.
         max_length (int): The maximum allowed length for each chunk.
+        overlap (int): Length of the tail of a chunk repeated at the start of the next one.
+        unit (str): "char" or "token".
     
     Returns:
         List[str]: A list of chunks with sentence boundaries preserved.
     """
-    sentences = re.split(r'(?<=[。！？.?!])', text)  # 按中文或英文句號、感嘆號、問號切分
-    chunks = []
-    current_chunk = ""
-
-    for sentence in sentences:
-        if len(current_chunk) + len(sentence) <= max_length:
-            current_chunk += sentence
-        else:
-            chunks.append(current_chunk.strip())
-            current_chunk = sentence
-    
-    if current_chunk:
-        chunks.append(current_chunk.strip())
-
-    return chunks
+    return list(SentenceChunker(max_length, overlap, unit).split(text))
 
 
-def check_folder_changes(doc_path: Path, files_record_path: Path) -> Tuple[bool, List[str], List[str]]:
+def check_folder_changes(
+    doc_path: Path, files_record_path: Path, save: bool = True
+) -> Tuple[bool, List[str], List[str], List[str]]:
     """
     Check for changes in a folder containing PDF files, comparing the current state with a stored record.
     
     Args:
         doc_path: Path to the directory containing PDF documents.
         files_record_path: Path to the JSON file storing previous file hashes.
+        save: Write the current state to the record file. Index builders pass False and
+            save the state with `save_current_records` once the new index is complete.
     
     Returns:
         has_changes (bool): True if there are changes, False otherwise.
         added_files (List[str]): List of newly added files.
         removed_files (List[str]): List of removed files.
+        changed_files (List[str]): List of files whose content changed.
     """
     # Load previous records
     previous_records = load_previous_records(files_record_path)
 
-    # Get current PDF files and their hashes
-    current_files = {str(file_path): hash_file(file_path) for file_path in get_pdf_document_paths(doc_path)}
+    # Get current PDF files and their hashes, reusing the hashes of files whose stat is unchanged
+    current_records = scan_folder(doc_path, previous_records)
+
+    # Save current state to the record file
+    if save:
+        save_current_records(current_records, files_record_path)
+
+    return compare_records(previous_records, current_records)
+
+def scan_folder(doc_path: Path, previous_records: Optional[Dict] = None, algorithm: str = HASH_ALGORITHM) -> Dict:
+    """
+    Current state of a document folder as a files record.
+
+    A file whose size and mtime_ns match the previous record keeps its recorded hash;
+    only new or modified files are hashed, in parallel. Records migrated from the old
+    MD5-only format have no stat yet, so they keep using MD5 until every file has one.
+
+    Args:
+        doc_path: Path to the directory containing PDF documents.
+        previous_records: Record returned by `load_previous_records`, if any.
+        algorithm: Hash algorithm for new records, see HASH_ALGORITHMS.
+
+    Returns:
+        Dict: {"version", "algorithm", "files": {file path: {"size", "mtime_ns", "hash"}}}.
+    """
+    previous_records = previous_records or empty_records(algorithm)
+    previous_files = previous_records["files"]
+    if any("size" not in entry for entry in previous_files.values()):
+        algorithm = previous_records["algorithm"]
+    same_algorithm = algorithm == previous_records["algorithm"]
+
+    files, pending = {}, []
+    for file_path in get_pdf_document_paths(doc_path):
+        stat = file_path.stat()
+        entry = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        previous = previous_files.get(str(file_path), {})
+        if same_algorithm and previous.get("size") == entry["size"] and previous.get("mtime_ns") == entry["mtime_ns"]:
+            entry["hash"] = previous["hash"]
+        else:
+            pending.append(file_path)
+        files[str(file_path)] = entry
+
+    if pending:
+        with ThreadPoolExecutor(max_workers=min(len(pending), HASH_WORKERS)) as executor:
+            for file_path, file_hash in zip(pending, executor.map(lambda path: hash_file(path, algorithm), pending)):
+                files[str(file_path)]["hash"] = file_hash
+
+    return {"version": RECORDS_VERSION, "algorithm": algorithm, "files": files}
+
+def compare_records(previous_records: Dict, current_records: Dict) -> Tuple[bool, List[str], List[str], List[str]]:
+    """
+    Compare two files records, returning (has_changes, added, removed, changed) as in `check_folder_changes`.
+    Records hashed with different algorithms are compared by size and mtime_ns instead.
+    """
+    previous_files, current_files = previous_records["files"], current_records["files"]
+    if previous_records["algorithm"] == current_records["algorithm"]:
+        def differs(previous, current):
+            return previous["hash"] != current["hash"]
+    else:
+        def differs(previous, current):
+            return (previous.get("size"), previous.get("mtime_ns")) != (current["size"], current["mtime_ns"])
 
     # Determine added, removed, and changed files
-    added_files = [file for file in current_files if file not in previous_records]
-    removed_files = [file for file in previous_records if file not in current_files]
+    added_files = [file for file in current_files if file not in previous_files]
+    removed_files = [file for file in previous_files if file not in current_files]
     changed_files = [
         file for file in current_files
-        if file in previous_records and previous_records[file] != current_files[file]
+        if file in previous_files and differs(previous_files[file], current_files[file])
     ]
 
     # Determine if there are any changes
     has_changes = bool(added_files or removed_files or changed_files)
 
-    # Save current state to the record file
-    save_current_records(current_files, files_record_path)
-
-    return has_changes, added_files, removed_files
-
+    return has_changes, added_files, removed_files, changed_files
 
 def get_pdf_document_paths(doc_path: Path) -> List[Path]:
     """Get a list of PDF document paths from a specified directory."""
@@ -115,33 +385,58 @@ def get_pdf_document_paths(doc_path: Path) -> List[Path]:
         return []
     return [doc_path / doc_name for doc_name in os.listdir(doc_path) if doc_name.lower().endswith(".pdf")]
 
-def hash_file(file_path: Path) -> str:
-    """Calculate the MD5 hash of a file."""
+def hash_file(file_path: Path, algorithm: str = "md5") -> str:
+    """Calculate the hash of a file with one of HASH_ALGORITHMS (MD5 by default)."""
+    file_hash = new_hasher(algorithm)
     with open(file_path, 'rb') as f:
-        file_hash = hashlib.md5()
-        while chunk := f.read(8192):
+        while chunk := f.read(HASH_CHUNK_SIZE):
             file_hash.update(chunk)
     return file_hash.hexdigest()
 
-def load_previous_records(files_record_path: Path) -> Dict[str, str]:
-    """Load the previous records of file hashes from a JSON file."""
+def new_hasher(algorithm: str):
+    if algorithm not in HASH_ALGORITHMS:
+        raise ValueError(f"Unknown hash algorithm '{algorithm}', expected one of {HASH_ALGORITHMS}")
+    if algorithm == "xxh3_64":
+        if xxhash is None:
+            raise ValueError("The xxh3_64 hash algorithm requires the xxhash package")
+        return xxhash.xxh3_64()
+    return hashlib.new(algorithm)
+
+def empty_records(algorithm: str = HASH_ALGORITHM) -> Dict:
+    return {"version": RECORDS_VERSION, "algorithm": algorithm, "files": {}}
+
+def load_previous_records(files_record_path: Path) -> Dict:
+    """
+    Load the previous files record from a JSON file. Records in the original format
+    (a flat file path -> MD5 mapping) are migrated to the current format.
+    """
     if not files_record_path.exists():
-        return {}
+        return empty_records()
     with open(files_record_path, 'r', encoding='utf-8') as f:
-        return json.load(f)
+        records = json.load(f)
+    if records.get("version") != RECORDS_VERSION:
+        return {
+            "version": RECORDS_VERSION,
+            "algorithm": "md5",
+            "files": {file_path: {"hash": file_hash} for file_path, file_hash in records.items()},
+        }
+    return records
 
-def save_current_records(files_info: Dict[str, str], files_record_path: Path) -> None:
+def save_current_records(files_info: Dict, files_record_path: Path) -> None:
     """
-    Save the current records of file hashes to a JSON file.
+    Save the current files record to a JSON file.
 
     Args:
-        files_info: Dictionary of file paths and their corresponding MD5 hashes.
+        files_info: Record returned by `scan_folder`.
         files_record_path: Path to the JSON file for saving the records.
     """
     files_record_path.parent.mkdir(parents=True, exist_ok=True)
 
-    with open(files_record_path, 'w', encoding='utf-8') as f:
+    # 先寫入暫存檔再取代，避免同時讀取時看到寫到一半的檔案
+    tmp_path = files_record_path.with_suffix(".tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
         json.dump(files_info, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, files_record_path)
 
 
 # Example usage
@@ -150,8 +445,9 @@ if __name__ == "__main__":
     folder_path = AGENT_ROOT / "documents" / "system"
     record_file =  folder_path / "files_record.json"
 
-    changes, added, removed, current_files= check_folder_changes(folder_path, record_file)
+    changes, added, removed, changed = check_folder_changes(folder_path, record_file, save=False)
     print("Changes (New/Modified):", changes)
     print("Added Files:", added)
     print("Removed Files:", removed)
+    print("Changed Files:", changed)
 
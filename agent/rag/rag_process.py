@@ -1,23 +1,50 @@
 from pathlib import Path
-from typing import List
-from .load import check_folder_changes, pdf_loader
+from typing import Dict, List, Optional, Sequence, Tuple
+from .load import (
+    compare_records, get_pdf_document_paths, load_previous_records, pdf_loader, save_current_records, scan_folder
+)
+from .bm25 import BM25Index, BM25_INDEX_NAME, doc_key
+from .system_title_filter import extract_section_titles, TITLES_CACHE_NAME
+from .filters import MetadataFilter, build_where, normalize_filter
+from .compact_store import CompactVectorStore, COMPACT_STORE_NAME
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_chroma import Chroma
+import chromadb
+from chromadb.api import ClientAPI
+import os
 import shutil
+from functools import lru_cache
 from langchain_core.documents.base import Document
 
 FROCE_UPDATE = False
+EMBEDDING_MODEL = "ibm-granite/granite-embedding-278m-multilingual"
+# Reciprocal Rank Fusion 常數，越大則排名靠後的結果影響越大
+RRF_K = 60
+# chunk metadata 格式的版本，舊版本的資料庫會在載入時重建
+INDEX_VERSION = "2"
+INDEX_VERSION_NAME = "index_version"
+# 設為 "int8" 或 "float16" 時，另存量化向量並以其掃描取代 Chroma 的 HNSW 查詢，候選結果以 mmap 的 float16 向量重新計分 (見 compact_store)
+COMPACT_VECTORS = os.getenv("RAG_COMPACT_VECTORS", "")
 
-def init_rag_process(doc_path: Path, files_record_path: Path, db_path: Path) -> Chroma:
+@lru_cache(maxsize=None)
+def get_embeddings(model_name: str = EMBEDDING_MODEL) -> HuggingFaceEmbeddings:
+    """Load the embedding model once per process and share it between vectorstores."""
+    return HuggingFaceEmbeddings(model_name=model_name)
+
+def init_rag_process(
+    doc_path: Path, files_record_path: Path, db_path: Path, document_names: Optional[Dict[str, str]] = None
+) -> Chroma:
     """
-    Initializes the RAG (Retrieval-Augmented Generation) process. If no changes are detected 
-    in the files, it directly reads the existing database. Otherwise, it deletes the database 
-    and rebuilds it.
+    Initializes the RAG (Retrieval-Augmented Generation) process. If no changes are detected
+    in the files, it directly reads the existing database. Otherwise, only the chunks of added,
+    removed or changed files are updated in the database and in the BM25 index stored next to it.
+    The file record is saved only after the database has been updated.
 
     Args:
         doc_path (Path): Path to the directory containing the documents (PDF files) to process.
         files_record_path (Path): Path to the file that records the current state of the documents.
         db_path (Path): Path to the directory where the Chroma vector database is stored.
+        document_names (Optional[Dict[str, str]]): File name -> document name stored in chunk metadata.
 
     Returns:
         Chroma: The Chroma vector store object.
@@ -27,26 +54,87 @@ def init_rag_process(doc_path: Path, files_record_path: Path, db_path: Path) ->
         ValueError: If an unexpected error occurs during file processing.
     """
     # Check for changes in the document directory
-    changes, _, _ = check_folder_changes(doc_path, files_record_path)
+    previous_records = load_previous_records(files_record_path)
+    current_records = scan_folder(doc_path, previous_records)
+    _, added, removed, changed = compare_records(previous_records, current_records)
+
+    vectorstore = build_index(doc_path, db_path, document_names, added, removed, changed)
+    save_current_records(current_records, files_record_path)
+    return vectorstore
+
+def build_index(
+    doc_path: Path,
+    db_path: Path,
+    document_names: Optional[Dict[str, str]] = None,
+    added: Sequence[str] = (),
+    removed: Sequence[str] = (),
+    changed: Sequence[str] = (),
+) -> Chroma:
+    """
+    Bring the Chroma database and BM25 index in `db_path` up to date with the given file changes.
+    A missing or outdated database is rebuilt from every file in `doc_path`.
+
+    Args:
+        doc_path (Path): Path to the directory containing the documents (PDF files) to process.
+        db_path (Path): Path to the directory where the Chroma vector database is stored.
+        document_names (Optional[Dict[str, str]]): File name -> document name stored in chunk metadata.
+        added (Sequence[str]): Files to add to the database.
+        removed (Sequence[str]): Files whose chunks are deleted from the database.
+        changed (Sequence[str]): Files whose chunks are replaced.
+
+    Returns:
+        Chroma: The Chroma vector store object.
+    """
+    added, removed, changed = list(added), list(removed), list(changed)
 
     # Initialize the embedding model
-    embeddings = HuggingFaceEmbeddings(model_name="ibm-granite/granite-embedding-278m-multilingual")
+    embeddings = get_embeddings()
+    bm25_path = db_path / BM25_INDEX_NAME
+    version_path = db_path / INDEX_VERSION_NAME
 
-    if changes or FROCE_UPDATE:
-        # Changes detected, rebuild the database
+    if FROCE_UPDATE or index_outdated(db_path):
+        # Rebuild the database from scratch
         if db_path.exists():
             print(f"Changes detected, deleting the existing database: {db_path}")
             shutil.rmtree(db_path)
 
         # Reload documents and rebuild the database
-        filter_docs = pdf_loader(doc_path)
+        filter_docs = load_documents(doc_path, document_names=document_names)
         vectorstore = Chroma.from_documents(
             documents=filter_docs,
             embedding=embeddings,
             persist_directory=str(db_path)
         )
-       
+        bm25 = BM25Index()
+        bm25.add_documents(filter_docs)
+        bm25.save(bm25_path)
+        version_path.write_text(INDEX_VERSION)
+
         print("Database rebuilt and saved.")
+    elif added or removed or changed:
+        # Changes detected, update only the affected files
+        print(f"Changes detected, updating the existing database: {db_path}")
+        vectorstore = Chroma(
+            embedding_function=embeddings,
+            persist_directory=str(db_path)
+        )
+        bm25 = load_bm25_index(vectorstore, db_path)
+
+        # 新增的檔案也先刪除，重建紀錄後不會產生重複的 chunk
+        stale_files = removed + changed + added
+        if stale_files:
+            stale_ids = vectorstore.get(where={"source": {"$in": stale_files}}, include=[])["ids"]
+            if stale_ids:
+                vectorstore.delete(ids=stale_ids)
+            bm25.remove_sources(stale_files)
+
+        new_docs = load_documents(doc_path, files=added + changed, document_names=document_names)
+        if new_docs:
+            vectorstore.add_documents(new_docs)
+            bm25.add_documents(new_docs)
+        bm25.save(bm25_path)
+
+        print(f"Database updated: {len(added)} added, {len(changed)} changed, {len(removed)} removed.")
     else:
         # No changes detected, load the existing database
         print("No changes detected, loading the existing database.")
@@ -54,19 +142,152 @@ def init_rag_process(doc_path: Path, files_record_path: Path, db_path: Path) ->
             embedding_function=embeddings,
             persist_directory=str(db_path)
         )
+        if not compact_outdated(db_path):
+            return vectorstore
+
+    if COMPACT_VECTORS:
+        # The compact store is rewritten from the stored embeddings, no re-embedding needed
+        CompactVectorStore.from_chroma(vectorstore, db_path / COMPACT_STORE_NAME, COMPACT_VECTORS)
 
     return vectorstore
 
+def compact_outdated(db_path: Path) -> bool:
+    """Whether the compact vector store is enabled but missing from the database or in an older format."""
+    return bool(COMPACT_VECTORS) and not CompactVectorStore.built(db_path / COMPACT_STORE_NAME)
+
+def open_index(db_path: Path) -> Tuple[Chroma | CompactVectorStore, BM25Index, ClientAPI]:
+    """
+    Open a finished database for reading: the store used for dense search, the BM25 index
+    and the Chroma client they were opened with, which `close_index` releases.
+    With COMPACT_VECTORS set, dense search uses the memory-mapped compact store when the
+    database has one, otherwise the Chroma collection.
+    """
+    client = chromadb.PersistentClient(path=str(db_path))
+    vectorstore = Chroma(client=client, embedding_function=get_embeddings())
+    bm25 = load_bm25_index(vectorstore, db_path)
+    if COMPACT_VECTORS:
+        compact = CompactVectorStore.load(db_path / COMPACT_STORE_NAME, get_embeddings(), vectorstore)
+        if compact is not None:
+            return compact, bm25, client
+    return vectorstore, bm25, client
+
+def close_index(client: ClientAPI):
+    """
+    Stop the chromadb system of a client returned by `open_index`, releasing its SQLite
+    connections and HNSW segments. Chroma objects opened on it stop working.
+    A failure only leaves the database open, so it is reported and not raised.
+    """
+    try:
+        client._system.stop()
+        # chromadb 依路徑共用 system，移除已停止的 system，之後重新開啟同一路徑時才會建立新的
+        client._identifier_to_system.pop(client._identifier, None)
+    except Exception as e:
+        print(f"[Warning] Failed to close the Chroma client: {e}")
+
+def index_outdated(db_path: Path) -> bool:
+    """Whether the database is missing or was built with an older chunk metadata format."""
+    version_path = db_path / INDEX_VERSION_NAME
+    return not version_path.exists() or version_path.read_text().strip() != INDEX_VERSION
+
+def load_documents(
+    doc_path: Path, files: Optional[List[str]] = None, document_names: Optional[Dict[str, str]] = None
+) -> List[Document]:
+    """
+    Load and chunk PDF files, tagging every chunk with its document name, section and article.
+
+    Args:
+        doc_path (Path): Path to the directory containing the documents (PDF files).
+        files (Optional[List[str]]): Only load these files instead of the whole directory.
+        document_names (Optional[Dict[str, str]]): File name -> document name stored in chunk metadata.
+
+    Returns:
+        List[Document]: The chunks to index.
+    """
+    files = [str(file) for file in get_pdf_document_paths(doc_path)] if files is None else files
+    if not files:
+        return []
+    section_titles = extract_section_titles(files, cache_path=doc_path / TITLES_CACHE_NAME)
+    return pdf_loader(doc_path, files=files, section_titles=section_titles, document_names=document_names)
+
+def load_bm25_index(vectorstore: Chroma, db_path: Path) -> BM25Index:
+    """
+    Load the BM25 index stored with a Chroma database. Databases built before the
+    lexical index existed get one built from the chunks already in Chroma.
+
+    Args:
+        vectorstore (Chroma): The Chroma vector store of the same documents.
+        db_path (Path): Path to the directory where the Chroma vector database is stored.
+
+    Returns:
+        BM25Index: The lexical index of the collection.
+    """
+    bm25_path = db_path / BM25_INDEX_NAME
+    bm25 = BM25Index.load(bm25_path)
+    if bm25 is None:
+        stored = vectorstore.get(include=["documents", "metadatas"])
+        bm25 = BM25Index()
+        bm25.add_documents(
+            Document(page_content=content, metadata=metadata or {})
+            for content, metadata in zip(stored["documents"], stored["metadatas"])
+        )
+        bm25.save(bm25_path)
+    return bm25
+
+def hybrid_search(
+    vectorstore: Chroma | CompactVectorStore, bm25: BM25Index, query: str, k: int = 4, fetch_k: int = 20,
+    filters: Optional[MetadataFilter] = None,
+) -> List[Document]:
+    """
+    Search with both the dense vectorstore and the BM25 index and fuse the two
+    rankings with Reciprocal Rank Fusion, so exact terms such as law article
+    numbers are found even when the embedding similarity misses them.
+
+    Args:
+        vectorstore (Chroma | CompactVectorStore): The store used for dense search.
+        bm25 (BM25Index): The lexical index of the same documents.
+        query (str): The search query.
+        k (int): Number of documents to return.
+        fetch_k (int): Number of candidates taken from each ranking before fusion.
+        filters (Optional[MetadataFilter]): Metadata pre-filter applied to both rankings,
+            e.g. {"document": "船舶法"} or {"article": ["第3條", "第4條"]}.
+
+    Returns:
+        List[Document]: The fused top-k documents.
+    """
+    return [doc for doc, _ in hybrid_search_with_scores(vectorstore, bm25, query, k, fetch_k, filters)]
+
+def hybrid_search_with_scores(
+    vectorstore: Chroma | CompactVectorStore, bm25: BM25Index, query: str, k: int = 4, fetch_k: int = 20,
+    filters: Optional[MetadataFilter] = None,
+) -> List[Tuple[Document, float]]:
+    """Same as `hybrid_search`, returning each document with its fused RRF score."""
+    scores = {}
+    docs = {}
+    filters = normalize_filter(filters)
+
+    dense_docs = vectorstore.similarity_search(query, k=fetch_k, filter=build_where(filters))
+    for rank, doc in enumerate(dense_docs, start=1):
+        key = doc_key(doc)
+        docs.setdefault(key, doc)
+        scores[key] = scores.get(key, 0.0) + 1.0 / (RRF_K + rank)
+
+    for rank, (key, _) in enumerate(bm25.search(query, k=fetch_k, filters=filters), start=1):
+        if key not in docs:
+            docs[key] = bm25.get_document(key)
+        scores[key] = scores.get(key, 0.0) + 1.0 / (RRF_K + rank)
+
+    ranked = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [(docs[key], scores[key]) for key in ranked]
+
 if __name__ == '__main__':
     AGENT_ROOT = Path(__file__).resolve().parents[1]
     doc_path = AGENT_ROOT / "documents" / "law"
     CHROMA_DB_PATH = Path(__file__).resolve().parents[1] / "law_chroma_db"
-  
+
     files_record_path =  doc_path / "files_record.json"
     print(doc_path, files_record_path)
     print(CHROMA_DB_PATH)
     vector = init_rag_process(doc_path, files_record_path, CHROMA_DB_PATH)
-    print(vector.similarity_search("航運經驗定義"))
-
-
-
+    bm25 = load_bm25_index(vector, CHROMA_DB_PATH)
+    print(hybrid_search(vector, bm25, "航運經驗定義"))
+    print(hybrid_search(vector, bm25, "航運經驗定義", filters={"document": "boat_Code"}))
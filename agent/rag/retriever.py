@@ -0,0 +1,261 @@
+import json
+import time
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+from langchain_chroma import Chroma
+from chromadb.api import ClientAPI
+from langchain_core.documents.base import Document
+from .bm25 import BM25Index
+from .filters import MetadataFilter, normalize_filter
+from .compact_store import CompactVectorStore
+from .rag_process import close_index, hybrid_search_with_scores, open_index
+from .watcher import IndexVersions, IndexWatcher, POLL_INTERVAL, publish_new_version
+
+AGENT_ROOT = Path(__file__).resolve().parents[1]
+DOCUMENTS_ROOT = AGENT_ROOT / "documents"
+CORPORA_CONFIG_PATH = DOCUMENTS_ROOT / "corpora.json"
+
+def load_corpora_config(config_path: Path = CORPORA_CONFIG_PATH) -> Dict[str, Dict]:
+    """
+    Load the corpus definitions. Each entry maps a corpus name to its document
+    folder under agent/documents, the Chroma folder inside it, a description and
+    the display names of its files, stored as the `document` metadata of their chunks.
+
+    Args:
+        config_path (Path): Path to corpora.json.
+
+    Returns:
+        Dict[str, Dict]: Corpus name -> {"doc_path", "files_record_path", "db_path", "description", "documents"}.
+    """
+    with open(config_path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+
+    corpora = {}
+    for name, entry in config.items():
+        doc_path = DOCUMENTS_ROOT / entry.get("path", name)
+        corpora[name] = {
+            "doc_path": doc_path,
+            "files_record_path": doc_path / entry.get("files_record", "files_record.json"),
+            "db_path": doc_path / entry.get("db", f"{name}_chroma_db"),
+            "description": entry.get("description", ""),
+            "documents": entry.get("documents", {}),
+        }
+    return corpora
+
+class RetrievalBackend:
+    """
+    Holds the vectorstore and BM25 index of every configured corpus for the whole
+    process, and searches several corpora in parallel in a single call.
+
+    Searches only read published index versions. Document changes are picked up by
+    an `IndexWatcher` that builds the next version in the background, after which
+    the loaded index is swapped under the corpus lock. A replaced index is closed
+    once the searches still using it have finished.
+    """
+    def __init__(self, corpora: Dict[str, Dict]):
+        self.corpora = corpora
+        self.versions = {name: IndexVersions(corpus["db_path"]) for name, corpus in corpora.items()}
+        # corpus 名稱 -> (dense 搜尋用的 store, BM25 索引, 索引路徑, 開啟它們的 Chroma client)
+        self.indexes: Dict[str, Tuple[Chroma | CompactVectorStore, BM25Index, Path, ClientAPI]] = {}
+        self.locks = {name: threading.Lock() for name in corpora}
+        # 索引路徑 -> 使用中的搜尋數，被替換的索引在歸零後才關閉
+        self.in_use: Dict[Path, int] = {}
+        self.usage_lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max(len(corpora), 1), thread_name_prefix="retrieval")
+        self.watcher: Optional[IndexWatcher] = None
+
+    def get_index(self, name: str) -> Tuple[Chroma | CompactVectorStore, BM25Index]:
+        """Load the published index of a corpus on first use, building it if none exists yet."""
+        vectorstore, bm25, _, _ = self._load(name)
+        return vectorstore, bm25
+
+    @contextmanager
+    def use_index(self, name: str) -> Iterator[Tuple[Chroma | CompactVectorStore, BM25Index]]:
+        """The loaded index of a corpus, kept open until the block ends even if a new version is swapped in."""
+        index = self._load(name, hold=True)
+        index_path = index[2]
+        try:
+            yield index[0], index[1]
+        finally:
+            with self.usage_lock:
+                self.in_use[index_path] -= 1
+                if not self.in_use[index_path]:
+                    del self.in_use[index_path]
+            self._close_unused(index)
+
+    def _hold(self, index: Tuple) -> Tuple:
+        with self.usage_lock:
+            self.in_use[index[2]] = self.in_use.get(index[2], 0) + 1
+        return index
+
+    @staticmethod
+    def _open(index_path: Path) -> Tuple[Chroma | CompactVectorStore, BM25Index, Path, ClientAPI]:
+        vectorstore, bm25, client = open_index(index_path)
+        return vectorstore, bm25, index_path, client
+
+    def _load(self, name: str, hold: bool = False) -> Tuple[Chroma | CompactVectorStore, BM25Index, Path, ClientAPI]:
+        if name not in self.corpora:
+            raise ValueError(f"Unknown corpus '{name}', expected one of {list(self.corpora)}")
+        while True:
+            with self.locks[name]:
+                if name in self.indexes:
+                    return self._hold(self.indexes[name]) if hold else self.indexes[name]
+            # 建立、等待與開啟索引都不持有 corpus 鎖，不會擋住其他搜尋或版本切換
+            index_path = self.versions[name].current()
+            if index_path is None:
+                # 第一次使用且尚無索引：自己建立，或等待其他程序建立完成
+                index_path = publish_new_version(self.corpora[name], self.versions[name], force=True)
+                if index_path is None:
+                    time.sleep(1)
+                    continue
+            index = self._open(index_path)
+            with self.locks[name]:
+                loaded = self.indexes.setdefault(name, index)
+                result = self._hold(loaded) if hold else loaded
+            if loaded is not index and loaded[2] != index_path:
+                # 其他執行緒已先載入較新的版本
+                self._close_unused(index)
+            return result
+
+    def _close_unused(self, index: Tuple):
+        """Close an index that is neither loaded nor used by a running search."""
+        index_path = index[2]
+        with self.usage_lock:
+            if self.in_use.get(index_path) or any(loaded[2] == index_path for loaded in self.indexes.values()):
+                return
+            close_index(index[3])
+
+    def refresh(self, name: str):
+        """Switch a loaded corpus to the newest published version; searches in flight keep the old one."""
+        index_path = self.versions[name].current()
+        loaded = self.indexes.get(name)
+        if loaded is None or index_path is None or loaded[2] == index_path:
+            return
+        index = self._open(index_path)
+        with self.locks[name]:
+            self.indexes[name] = index
+        self._close_unused(loaded)
+        print(f"[Info] {name} index switched to {index_path}")
+
+    def reload(self, name: Optional[str] = None):
+        """Drop loaded indexes so the next search opens the published versions again."""
+        for corpus_name in ([name] if name else list(self.corpora)):
+            with self.locks[corpus_name]:
+                loaded = self.indexes.pop(corpus_name, None)
+            if loaded is not None:
+                self._close_unused(loaded)
+
+    def preload(self):
+        """Open every corpus index now instead of on the first search."""
+        for name in self.corpora:
+            self.get_index(name)
+
+    def after_fork(self):
+        """
+        Make a backend inherited from a pre-fork master usable in a worker process.
+
+        Threads and SQLite connections do not survive fork, so the executor, locks and
+        watcher are recreated and the indexes are reopened in the background. The
+        embedding model loaded before fork stays shared copy-on-write.
+        """
+        try:
+            from chromadb.api.client import SharedSystemClient
+            SharedSystemClient.clear_system_cache()
+        except ImportError:
+            pass
+        self.indexes = {}
+        self.locks = {name: threading.Lock() for name in self.corpora}
+        self.in_use = {}
+        self.usage_lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max(len(self.corpora), 1), thread_name_prefix="retrieval")
+        interval = self.watcher.interval if self.watcher is not None else 0
+        self.watcher = None
+        self.start_watcher(interval)
+        threading.Thread(target=self.preload, name="preload-retrieval", daemon=True).start()
+
+    def shutdown(self, timeout: Optional[float] = None):
+        """Stop the watcher, letting an index build in progress finish, and wait for running searches."""
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher.join(timeout)
+        self.executor.shutdown(wait=True)
+
+    def start_watcher(self, interval: float = POLL_INTERVAL) -> Optional[IndexWatcher]:
+        """Start watching the document folders in the background. An interval of 0 disables it."""
+        if self.watcher is None and interval > 0:
+            self.watcher = IndexWatcher(self.corpora, self.versions, self.refresh, interval)
+            self.watcher.start()
+        return self.watcher
+
+    def documents(self) -> Dict[str, List[str]]:
+        """Corpus name -> names of the documents it holds, as accepted by the `document` filter."""
+        return {name: list(corpus["documents"].values()) for name, corpus in self.corpora.items()}
+
+    def search_corpus(
+        self, name: str, question: str, k: int, filters: Optional[MetadataFilter] = None
+    ) -> List[Tuple[Document, float]]:
+        with self.use_index(name) as (vectorstore, bm25):
+            results = hybrid_search_with_scores(vectorstore, bm25, question, k=k, filters=filters)
+        for doc, _ in results:
+            doc.metadata["corpus"] = name
+        return results
+
+    def search(
+        self, question: str, corpora: Optional[List[str]] = None, k: int = 4,
+        filters: Optional[MetadataFilter] = None,
+    ) -> List[Document]:
+        """
+        Search one or more corpora concurrently and merge their results.
+
+        Args:
+            question (str): The search query.
+            corpora (Optional[List[str]]): Corpus names to search, all corpora if None.
+            k (int): Number of documents to return in total.
+            filters (Optional[MetadataFilter]): Metadata pre-filter such as {"document": "臺馬之星"};
+                corpora that hold none of the requested documents are not searched at all.
+
+        Returns:
+            List[Document]: The top-k documents across the searched corpora.
+        """
+        filters = normalize_filter(filters)
+        names = list(dict.fromkeys(corpora or self.corpora))
+        if "document" in filters:
+            documents = self.documents()
+            names = [name for name in names if set(filters["document"]) & set(documents[name])]
+        futures = [self.executor.submit(self.search_corpus, name, question, k, filters) for name in names]
+        results = [result for future in futures for result in future.result()]
+        results.sort(key=lambda result: result[1], reverse=True)
+        return [doc for doc, _ in results[:k]]
+
+_backend: Optional[RetrievalBackend] = None
+_backend_lock = threading.Lock()
+
+def get_backend() -> RetrievalBackend:
+    """The process-wide retrieval backend, created from corpora.json on first use with its watcher running."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = RetrievalBackend(load_corpora_config())
+            _backend.start_watcher()
+        return _backend
+
+def after_fork():
+    """Reset the process-wide backend, if the master created one, in a forked worker."""
+    global _backend_lock
+    _backend_lock = threading.Lock()
+    if _backend is not None:
+        _backend.after_fork()
+
+def shutdown(timeout: Optional[float] = None):
+    if _backend is not None:
+        _backend.shutdown(timeout)
+
+if __name__ == "__main__":
+    backend = get_backend()
+    for doc in backend.search("臺馬之星失去動力的原因與船舶法相關規定", k=6):
+        print(doc.metadata.get("corpus"), doc.metadata.get("source"), doc.page_content[:80])
+    for doc in backend.search("主機故障", filters={"document": "臺馬之星"}):
+        print(doc.metadata.get("document"), doc.metadata.get("section_path"), doc.page_content[:80])
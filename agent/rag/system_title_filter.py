@@ -1,78 +1,107 @@
 import os
+import json
+import multiprocessing
 from pathlib import Path
-from load import get_pdf_document_paths
-from pdfminer.high_level import extract_pages
-from pdfminer.layout import LTTextBoxHorizontal, LTTextLineHorizontal, LTChar
+from typing import Dict, List, Optional
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from .load import get_pdf_document_paths, hash_file
 import pdfplumber
 
-def extract_bold_titles_with_comma_merge(pdf_path):
+# 每個文件資料夾內的標題快取檔
+TITLES_CACHE_NAME = "titles_cache.json"
+
+def _inside(line: Dict, bbox) -> bool:
+    """判斷文字行的中心點是否落在表格範圍內。"""
+    x0, top, x1, bottom = bbox
+    center_x = (line["x0"] + line["x1"]) / 2
+    center_y = (line["top"] + line["bottom"]) / 2
+    return x0 <= center_x <= x1 and top <= center_y <= bottom
+
+def extract_layout(pdf_path) -> Dict[str, list]:
     """
-    從 PDF 中提取粗體字標題，基於字體大小組合標題，並合併逗號結尾行與下一行。
+    逐頁走訪 PDF 版面一次，同時取得粗體標題、表格與一般文字區塊。
+    標題基於字體大小組合，並合併逗號結尾行與下一行；表格內的文字不視為標題。
+
     :param pdf_path: PDF 文件路徑
-    :return: 包含完整標題的列表
+    :return: {"titles": 標題列表, "tables": 表格列表, "text_blocks": 文字區塊列表}
     """
     bold_titles = []
+    all_tables = []  # 存儲所有頁面的表格
+    text_blocks = []
     temp_title = ""  # 臨時存儲多行標題
+    temp_block = []  # 臨時存儲一般文字行
     prev_font_size = None  # 上一行的字體大小
     merge_next = False  # 是否將下一行合併到當前行
 
-    for page_layout in extract_pages(pdf_path):
-        for element in page_layout:
-            if isinstance(element, LTTextBoxHorizontal):
-                for text_line in element:
-                    if isinstance(text_line, LTTextLineHorizontal):
-                        is_bold = False
-                        line_text = ""
-                        font_size = None  # 當前行的字體大小
-
-                        for char in text_line:
-                            if isinstance(char, LTChar):
-                                # 設置當前字體大小
-                                if font_size is None:
-                                    font_size = round(char.size, 2)  # 四捨五入保留2位小數
-                                # 判斷是否為粗體
-                                if "Bold" in char.fontname:
-                                    is_bold = True
-                                line_text += char.get_text()
-
-                        # 如果當前行是粗體，處理標題組合
-                        if is_bold:
-                            line_text = line_text.strip()  # 去除首尾空白
-
-                            if merge_next:
-                                # 合併上一行逗號結尾與當前行
-                                temp_title += " " + line_text
-                                merge_next = False
-                            elif prev_font_size is None or font_size == prev_font_size:
-                                # 字體大小相同，合併為一段
-                                temp_title += " " + line_text if temp_title else line_text
-                            else:
-                                # 字體大小不同，存儲上一段標題
-                                if temp_title:
-                                    bold_titles.append(temp_title.strip())
-                                temp_title = line_text
-
-                            # 如果當前行以逗號結尾，標記與下一行合併
-                            if line_text.endswith(","):
-                                merge_next = True
-
-                            prev_font_size = font_size  # 更新上一行字體大小
-                        else:
-                            # 遇到非粗體行，存儲已完成的標題
-                            if temp_title:
-                                bold_titles.append(temp_title.strip())
-                                temp_title = ""
-                            prev_font_size = None
+    def flush_block():
+        if temp_block:
+            text_blocks.append("\n".join(temp_block))
+            temp_block.clear()
+
+    with pdfplumber.open(pdf_path) as pdf:
+        for page in pdf.pages:
+            tables = page.find_tables()
+            for table in tables:
+                # 過濾掉表格中的 None 和空字符串，僅保留有數據的行與單元格
+                filtered_table = [
+                    [cell for cell in row if cell]
+                    for row in table.extract()
+                    if any(cell for cell in row)
+                ]
+                if filtered_table:
+                    all_tables.append(filtered_table)
+
+            for text_line in page.extract_text_lines(return_chars=True):
+                chars = text_line["chars"]
+                line_text = text_line["text"].strip()
+                if not chars or not line_text:
+                    continue
+
+                in_table = any(_inside(text_line, table.bbox) for table in tables)
+                is_bold = not in_table and any("Bold" in char["fontname"] for char in chars)
+                font_size = round(chars[0]["size"], 2)  # 四捨五入保留2位小數
+
+                # 如果當前行是粗體，處理標題組合
+                if is_bold:
+                    flush_block()
+                    if merge_next:
+                        # 合併上一行逗號結尾與當前行
+                        temp_title += " " + line_text
+                        merge_next = False
+                    elif prev_font_size is None or font_size == prev_font_size:
+                        # 字體大小相同，合併為一段
+                        temp_title += " " + line_text if temp_title else line_text
+                    else:
+                        # 字體大小不同，存儲上一段標題
+                        if temp_title:
+                            bold_titles.append(temp_title.strip())
+                        temp_title = line_text
+
+                    # 如果當前行以逗號結尾，標記與下一行合併
+                    if line_text.endswith(","):
+                        merge_next = True
+
+                    prev_font_size = font_size  # 更新上一行字體大小
+                else:
+                    # 遇到非粗體行，存儲已完成的標題
+                    if temp_title:
+                        bold_titles.append(temp_title.strip())
+                        temp_title = ""
+                    prev_font_size = None
+                    if not in_table:
+                        temp_block.append(line_text)
+            flush_block()
 
     # 添加最後的臨時標題
     if temp_title:
         bold_titles.append(temp_title.strip())
 
-    return bold_titles
+    titles = clean_titles(merge_title(bold_titles), all_tables)
+    return {"titles": titles, "tables": all_tables, "text_blocks": text_blocks}
 
 def merge_title(bold_titles):
     index = 0
-        
+
     while index < len(bold_titles) - 1:
         if bold_titles[index].endswith(","):
             # 合併當前標題與下一標題，並取代當前標題
@@ -80,36 +109,16 @@ def merge_title(bold_titles):
             del bold_titles[index + 1]  # 刪除已合併的下一標題
         else:
             index += 1
-    
-    return bold_titles
 
-def extract_table_with_pdfplumber_to_list(pdf_path):
-    all_tables = []  # 存儲所有頁面的表格
-
-    with pdfplumber.open(pdf_path) as pdf:
-        for i, page in enumerate(pdf.pages):
-            print(f"正在處理第 {i+1} 頁...")
-            table = page.extract_table()  # 提取表格
-            if table:
-                # 過濾掉表格中的 None 和空字符串
-                filtered_table = [
-                    [cell for cell in row if cell]  # 僅保留有數據的單元格
-                    for row in table
-                    if any(cell for cell in row)  # 僅保留有數據的行
-                ]
-
-                # 如果表格還有內容，才加入列表
-                if filtered_table:
-                    all_tables.append(filtered_table)
-                    print(f"第 {i+1} 頁表格（過濾後）:\n{filtered_table}\n")
-
-    return all_tables  # 返回純淨的表格列表
+    return bold_titles
 
 def clean_titles(titles, tables):
     """
     從 titles 中移除出現在 tables 中的內容。
     tables 的文字會去除空格並合併，作為過濾基準。
     titles 中的內容如果包含表格的任何文字（子集合檢查），則移除。
+    檢查時只取出標題中長度等於某個表格文字長度的子字串查詢集合，
+    不需對每個標題掃描所有表格文字。
 
     :param titles: 原始粗體標題列表 (1D list)
     :param tables: 表格數據 (嵌套列表形式的表格)
@@ -131,29 +140,87 @@ def clean_titles(titles, tables):
         for row in table
         for cell in row if cell
     )
+    table_texts.discard("")
+    lengths = sorted({len(text) for text in table_texts})
 
     # 過濾 titles 中出現在表格內容的部分
     filtered_titles = []
     for title in titles:
         # 移除空格，並檢查是否包含表格文字
-        if not any(table_text in title.replace(" ", "") for table_text in table_texts):
+        title_text = title.replace(" ", "")
+        contains_table_text = any(
+            title_text[start:start + length] in table_texts
+            for length in lengths if length <= len(title_text)
+            for start in range(len(title_text) - length + 1)
+        )
+        if not contains_table_text:
             filtered_titles.append(title)
 
     return filtered_titles
 
 def filter_titles(file_path):
-    titles = extract_bold_titles_with_comma_merge(file_path)
-    titles = merge_title(titles)
-    tables = extract_table_with_pdfplumber_to_list(file_path)
-    filtered_titles = clean_titles(titles, tables)
-    return filtered_titles
+    return extract_layout(file_path)["titles"]
+
+def extract_layouts(
+    files: List, cache_path: Optional[Path] = None, processes: bool = False
+) -> Dict[str, Dict[str, list]]:
+    """
+    平行擷取多個 PDF 的版面，結果依檔案內容的 hash 快取於 cache_path，
+    未變更的檔案直接讀取快取。
+
+    預設使用執行緒：伺服器內 (多執行緒且已載入 torch) fork 子行程可能死結。
+    離線執行時可改用 spawn 啟動的子行程，才能使用多個 CPU。
+
+    :param files: PDF 文件路徑列表
+    :param cache_path: 快取 JSON 檔案路徑，None 表示不使用快取
+    :param processes: 是否以 spawn 子行程擷取 (僅限離線執行)
+    :return: 檔案路徑 -> extract_layout 的結果
+    """
+    cache = {}
+    if cache_path is not None and cache_path.exists():
+        with open(cache_path, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+
+    layouts, pending = {}, {}
+    for file_path in map(str, files):
+        file_hash = hash_file(Path(file_path))
+        entry = cache.get(file_path)
+        if entry is not None and entry["hash"] == file_hash:
+            layouts[file_path] = entry["layout"]
+        else:
+            pending[file_path] = file_hash
+
+    if pending:
+        max_workers = min(len(pending), os.cpu_count() or 1)
+        if processes:
+            executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+        else:
+            executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="layout")
+        with executor:
+            for file_path, layout in zip(pending, executor.map(extract_layout, pending)):
+                layouts[file_path] = layout
+                cache[file_path] = {"hash": pending[file_path], "layout": layout}
+
+        if cache_path is not None:
+            # 先寫入暫存檔再取代，中斷或同時讀取時不會看到寫到一半的快取
+            tmp_path = cache_path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(cache, f, ensure_ascii=False)
+            os.replace(tmp_path, cache_path)
+
+    return layouts
+
+def extract_section_titles(files: List, cache_path: Optional[Path] = None) -> Dict[str, List[str]]:
+    """回傳 檔案路徑 -> 標題列表，供 pdf_loader 標註 chunk 所屬章節。"""
+    return {file_path: layout["titles"] for file_path, layout in extract_layouts(files, cache_path).items()}
 
 if __name__ == '__main__':
+    # python -m agent.rag.system_title_filter
     AGENT_ROOT = Path(__file__).resolve().parents[1]
     folder_path = AGENT_ROOT / "documents" / "system"
     pdf_files = get_pdf_document_paths(folder_path)
-    test_file = pdf_files[1]
-    filtered_titles = filter_titles(test_file)
-    print("Filtered Titles:",  filtered_titles)
-    
-
+    layouts = extract_layouts(pdf_files, folder_path / TITLES_CACHE_NAME, processes=True)
+    for file_path, layout in layouts.items():
+        print(file_path)
+        print("Filtered Titles:", layout["titles"])
+        print(f"{len(layout['tables'])} tables, {len(layout['text_blocks'])} text blocks")
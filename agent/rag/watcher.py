@@ -0,0 +1,223 @@
+import os
+import json
+import time
+import shutil
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+from .load import compare_records, load_previous_records, save_current_records, scan_folder
+from .rag_process import build_index, compact_outdated, index_outdated
+
+# 檢查文件資料夾的間隔秒數，設為 0 則不啟動背景監看
+POLL_INTERVAL = float(os.getenv("RAG_WATCH_INTERVAL", "30"))
+# 保留的索引版本數 (含目前版本)，舊版本可能仍被其他程序開啟，不立即刪除
+KEEP_VERSIONS = 2
+# 被取代超過此秒數的版本才刪除：其他程序每 POLL_INTERVAL 切換一次版本，並讓進行中的搜尋結束
+PRUNE_GRACE_SECONDS = float(os.getenv("RAG_PRUNE_GRACE", str(2 * POLL_INTERVAL + 60)))
+# 超過此秒數的建置鎖視為中斷的建置留下的，可以移除
+STALE_LOCK_SECONDS = 3600
+
+class IndexVersions:
+    """
+    Versioned index directories of one corpus.
+
+    Every build writes a complete index into a new `v<time>` directory under
+    `<db_path>.versions/` and then atomically replaces the `CURRENT` pointer file,
+    so readers always open a finished index. A database from before versioning
+    (the plain `db_path` folder) is served until the first version is published.
+
+    Publish times are kept in `PUBLISHED`, so a replaced version is only deleted
+    after every process has had PRUNE_GRACE_SECONDS to switch away from it.
+    """
+    def __init__(self, db_path: Path):
+        self.db_path = db_path
+        self.root = db_path.parent / f"{db_path.name}.versions"
+        self.pointer = self.root / "CURRENT"
+        self.lock_path = self.root / "build.lock"
+        self.published_path = self.root / "PUBLISHED"
+
+    def current(self) -> Optional[Path]:
+        """Directory of the published index, or None if nothing has been built yet."""
+        if self.pointer.exists():
+            version = self.pointer.read_text(encoding="utf-8").strip()
+            if version and (self.root / version).exists():
+                return self.root / version
+        return self.db_path if self.db_path.exists() else None
+
+    def new_version(self) -> Path:
+        """A fresh, not yet existing directory for the next build."""
+        self.root.mkdir(parents=True, exist_ok=True)
+        return self.root / f"v{time.time_ns()}"
+
+    def publish(self, version_path: Path):
+        """Point readers at a finished build and delete old versions past their grace period."""
+        published = self.published_times()
+        published[version_path.name] = time.time()
+        self._write(self.published_path, json.dumps(published))
+        self._write(self.pointer, version_path.name)
+        self.prune()
+
+    def _write(self, path: Path, text: str):
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text(text, encoding="utf-8")
+        os.replace(tmp_path, path)
+
+    def published_times(self) -> Dict[str, float]:
+        """Version name -> time it became the current version."""
+        try:
+            return json.loads(self.published_path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def prune(self):
+        """
+        Delete versions beyond the newest KEEP_VERSIONS that were replaced more than
+        PRUNE_GRACE_SECONDS ago. Call it while holding the build lock.
+        """
+        current = self.current()
+        if current is None or current.parent != self.root:
+            return
+
+        def number(path: Path) -> int:
+            return int(path.name[1:]) if path.name[1:].isdigit() else 0
+
+        versions = sorted(
+            (path for path in self.root.iterdir() if path.is_dir() and path.name.startswith("v")),
+            key=number, reverse=True,
+        )
+        published = self.published_times()
+        now = time.time()
+        kept = 0
+        replaced_at: Optional[float] = None  # 較新一個已發布版本的發布時間
+        for path in versions:
+            if number(path) > number(current):
+                continue  # 其他程序建置中、尚未發布的版本
+            if kept < KEEP_VERSIONS or replaced_at is None or now - replaced_at < PRUNE_GRACE_SECONDS:
+                kept += 1
+            else:
+                # 其他程序可能仍開啟舊版本 (Windows 會拒絕刪除)，刪不掉就留到下次
+                shutil.rmtree(path, ignore_errors=True)
+                if not path.exists():
+                    published.pop(path.name, None)
+            replaced_at = published.get(path.name, replaced_at)
+        self._write(self.published_path, json.dumps(published))
+
+    def acquire(self) -> bool:
+        """
+        Take the build lock shared by every process serving this corpus.
+
+        Returns:
+            bool: False if another build is already running.
+        """
+        self.root.mkdir(parents=True, exist_ok=True)
+        try:
+            if time.time() - self.lock_path.stat().st_mtime > STALE_LOCK_SECONDS:
+                self.lock_path.unlink()
+        except FileNotFoundError:
+            pass
+        try:
+            fd = os.open(self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, "w") as f:
+            f.write(str(os.getpid()))
+        return True
+
+    def release(self):
+        self.lock_path.unlink(missing_ok=True)
+
+def publish_new_version(corpus: Dict, versions: IndexVersions, force: bool = False) -> Optional[Path]:
+    """
+    Build a new index version if the corpus files changed since the published one,
+    or if the published index was built with an older chunk metadata format or lacks
+    the compact vector store that has been enabled.
+
+    The published index is copied into a new version directory and only the changed
+    files are re-indexed there; the file record is saved after the new version is live.
+
+    Args:
+        corpus (Dict): Corpus entry from `load_corpora_config`.
+        versions (IndexVersions): Versions of the corpus index.
+        force (bool): Build even if no file changed, e.g. when no index exists yet.
+
+    Returns:
+        Optional[Path]: The published version, or None if nothing changed or another
+        process is building.
+    """
+    previous_records = load_previous_records(corpus["files_record_path"])
+    current_records = scan_folder(corpus["doc_path"], previous_records)
+    has_changes, added, removed, changed = compare_records(previous_records, current_records)
+    current = versions.current()
+    stale = current is None or index_outdated(current) or compact_outdated(current)
+    if not (has_changes or force or stale):
+        return None
+
+    if not versions.acquire():
+        return None
+    version_path = None
+    try:
+        current = versions.current()
+        version_path = versions.new_version()
+        if current is not None:
+            shutil.copytree(current, version_path)
+        else:
+            # 沒有可沿用的索引，所有文件都要重新建立
+            added, removed, changed = list(current_records["files"]), [], []
+        build_index(
+            corpus["doc_path"], version_path, corpus["documents"],
+            added=added, removed=removed, changed=changed,
+        )
+        versions.publish(version_path)
+        save_current_records(current_records, corpus["files_record_path"])
+        return version_path
+    except Exception:
+        if version_path is not None:
+            shutil.rmtree(version_path, ignore_errors=True)
+        raise
+    finally:
+        versions.release()
+
+def prune_versions(versions: IndexVersions):
+    """Delete versions whose grace period ended since the last publish, unless a build is running."""
+    if versions.root.exists() and versions.acquire():
+        try:
+            versions.prune()
+        finally:
+            versions.release()
+
+class IndexWatcher(threading.Thread):
+    """
+    Background thread that polls the document folders, builds new index versions
+    when files change, and tells the backend to switch to the newest published
+    version (including versions published by other processes).
+    """
+    def __init__(
+        self,
+        corpora: Dict[str, Dict],
+        versions: Dict[str, IndexVersions],
+        on_publish: Callable[[str], None],
+        interval: float = POLL_INTERVAL,
+    ):
+        super().__init__(name="rag-watcher", daemon=True)
+        self.corpora = corpora
+        self.versions = versions
+        self.on_publish = on_publish
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def check(self, names: Optional[List[str]] = None):
+        """Check the given corpora (all by default) once."""
+        for name in names or list(self.corpora):
+            try:
+                publish_new_version(self.corpora[name], self.versions[name])
+                self.on_publish(name)
+                prune_versions(self.versions[name])
+            except Exception as e:
+                print(f"[Warning] Failed to update the {name} index: {e}")
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.check()
+
+    def stop(self):
+        self.stopped.set()
@@ -0,0 +1,269 @@
+import csv
+import sqlite3
+import threading
+from difflib import SequenceMatcher
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+AGENT_ROOT = Path(__file__).resolve().parents[1]
+DATA_PATH = AGENT_ROOT / "data"
+CATALOG_CSV_PATH = DATA_PATH / "components.csv"
+CATALOG_DB_PATH = DATA_PATH / "components.db"
+
+# 模糊比對的最低相似度與候選數
+FUZZY_THRESHOLD = 0.5
+FUZZY_CANDIDATES = 200
+# 模糊比對只以查詢中最少見的幾個 trigram 取候選，避免常見字串命中大半個型錄
+FUZZY_TRIGRAMS = 6
+# 查詢的 trigram 都不在型錄中時 (短字拼錯，例如 "Wahser")，直接比對的最多列數
+FUZZY_SCAN_ROWS = 5000
+# CSV 中 aliases 欄位的分隔符號
+ALIAS_SEPARATOR = "|"
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS components (
+    id INTEGER PRIMARY KEY,
+    sku TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL COLLATE NOCASE,
+    name_zh TEXT,
+    aliases TEXT,
+    size TEXT,
+    manufacturer TEXT,
+    stock INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_components_name ON components(name COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_components_name_zh ON components(name_zh);
+-- 每個別名一列，完全比對別名時可使用索引
+CREATE TABLE IF NOT EXISTS component_aliases (
+    alias TEXT NOT NULL COLLATE NOCASE,
+    component_id INTEGER NOT NULL REFERENCES components(id)
+);
+CREATE INDEX IF NOT EXISTS idx_component_aliases_alias ON component_aliases(alias COLLATE NOCASE);
+-- 名稱、中文名與別名的 trigram 索引，支援任意位置的子字串與模糊比對
+CREATE VIRTUAL TABLE IF NOT EXISTS components_fts USING fts5(
+    name, name_zh, aliases, content='components', content_rowid='id', tokenize='trigram'
+);
+-- 每個 trigram 出現在幾個零件中
+CREATE VIRTUAL TABLE IF NOT EXISTS components_vocab USING fts5vocab(components_fts, 'row');
+"""
+
+def normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+def trigrams(text: str) -> List[str]:
+    text = normalize(text)
+    return [text[i:i + 3] for i in range(len(text) - 2)]
+
+def fts_phrase(text: str) -> str:
+    return '"' + text.replace('"', '""') + '"'
+
+def build_catalog(csv_path: Path = CATALOG_CSV_PATH, db_path: Path = CATALOG_DB_PATH):
+    """
+    (Re)build the catalog database from a CSV file with the columns
+    sku, name, name_zh, aliases, size, manufacturer, stock (aliases separated by "|").
+    The new database is written next to the old one and swapped in when complete.
+
+    Args:
+        csv_path (Path): Catalog CSV file.
+        db_path (Path): SQLite database to create.
+    """
+    tmp_path = db_path.with_suffix(".tmp")
+    tmp_path.unlink(missing_ok=True)
+    with open(csv_path, "r", encoding="utf-8-sig", newline="") as f, sqlite3.connect(tmp_path) as conn:
+        conn.executescript(SCHEMA_SQL)
+        rows = (
+            (
+                row["sku"].strip(), row["name"].strip(), row.get("name_zh", "").strip(),
+                row.get("aliases", "").strip(), row.get("size", "").strip(),
+                row.get("manufacturer", "").strip(), int(row["stock"]) if row.get("stock") else None,
+            )
+            for row in csv.DictReader(f)
+        )
+        conn.executemany(
+            "INSERT INTO components (sku, name, name_zh, aliases, size, manufacturer, stock) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        conn.executemany(
+            "INSERT INTO component_aliases (alias, component_id) VALUES (?, ?)",
+            (
+                (alias.strip(), component_id)
+                for component_id, aliases in conn.execute("SELECT id, aliases FROM components WHERE aliases != ''")
+                for alias in aliases.split(ALIAS_SEPARATOR) if alias.strip()
+            ),
+        )
+        conn.execute("INSERT INTO components_fts(components_fts) VALUES ('rebuild')")
+        conn.commit()
+    tmp_path.replace(db_path)
+
+class ComponentCatalog:
+    """
+    Read-only component lookup over the SQLite catalog.
+
+    One `lookup` tries, in order: exact name / Chinese name / alias, English name
+    prefix, substring via the trigram index, and finally fuzzy matching that ranks
+    trigram candidates by string similarity, so misspellings still resolve without
+    another round trip through the agent.
+    """
+    def __init__(self, db_path: Path = CATALOG_DB_PATH, csv_path: Optional[Path] = CATALOG_CSV_PATH):
+        self.db_path = db_path
+        if csv_path is not None and csv_path.exists() and (
+            not db_path.exists() or db_path.stat().st_mtime < csv_path.stat().st_mtime
+        ):
+            build_catalog(csv_path, db_path)
+        self.local = threading.local()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        # SQLite 連線不能跨執行緒共用，每個執行緒各自開啟唯讀連線
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"{self.db_path.as_uri()}?mode=ro", uri=True)
+            conn.row_factory = sqlite3.Row
+            self.local.conn = conn
+        return conn
+
+    def _rows(self, sql: str, params: Iterable) -> List[sqlite3.Row]:
+        return self.conn.execute(sql, tuple(params)).fetchall()
+
+    def exact(self, query: str, limit: int = 5) -> List[sqlite3.Row]:
+        return self._rows(
+            "SELECT * FROM components WHERE name = ? OR name_zh = ? "
+            "OR id IN (SELECT component_id FROM component_aliases WHERE alias = ?) LIMIT ?",
+            (query, query, query, limit),
+        )
+
+    def prefix(self, query: str, limit: int = 5) -> List[sqlite3.Row]:
+        # name 使用 NOCASE 排序規則，範圍查詢可以使用 idx_components_name
+        return self._rows(
+            "SELECT * FROM components WHERE name >= ? AND name < ? ORDER BY name LIMIT ?",
+            (query, query + "￿", limit),
+        )
+
+    def substring(self, query: str, limit: int = 5) -> List[sqlite3.Row]:
+        if len(query) < 3:
+            # trigram 無法索引少於三個字的查詢 (例如「螺帽」)
+            return self._rows(
+                "SELECT * FROM components WHERE name_zh LIKE ? OR aliases LIKE ? LIMIT ?",
+                (f"%{query}%", f"%{query}%", limit),
+            )
+        return self._rows(
+            "SELECT components.* FROM components_fts JOIN components ON components.id = components_fts.rowid "
+            "WHERE components_fts MATCH ? ORDER BY rank LIMIT ?",
+            (fts_phrase(query), limit),
+        )
+
+    def fuzzy(self, query: str, limit: int = 5) -> List[sqlite3.Row]:
+        grams = list(dict.fromkeys(trigrams(query)))
+        # 拼錯處的 trigram 通常不存在於型錄中，其餘依出現次數由少到多取前幾個
+        counts = self._rows(
+            f"SELECT term, doc FROM components_vocab WHERE term IN ({', '.join('?' * len(grams))}) ORDER BY doc LIMIT ?",
+            (*grams, FUZZY_TRIGRAMS),
+        ) if grams else []
+        grams = [row["term"] for row in counts]
+        if grams:
+            # 候選會再以相似度重新排序，不需要 bm25 排名 (排名需對所有命中列計分)
+            candidates = self._rows(
+                "SELECT components.* FROM components_fts JOIN components ON components.id = components_fts.rowid "
+                "WHERE components_fts MATCH ? LIMIT ?",
+                (" OR ".join(fts_phrase(gram) for gram in grams), FUZZY_CANDIDATES),
+            )
+        else:
+            candidates = self._rows("SELECT * FROM components LIMIT ?", (FUZZY_SCAN_ROWS,))
+        query = normalize(query)
+
+        def similarity(row: sqlite3.Row) -> float:
+            names = [row["name"], row["name_zh"] or "", *(row["aliases"] or "").split(ALIAS_SEPARATOR)]
+            return max(SequenceMatcher(None, query, normalize(name)).ratio() for name in names if name)
+
+        scored = sorted(((similarity(row), row) for row in candidates), key=lambda item: item[0], reverse=True)
+        return [row for score, row in scored[:limit] if score >= FUZZY_THRESHOLD]
+
+    def lookup(self, query: str, limit: int = 5) -> Dict:
+        """
+        Find a component by English name, Chinese name or alias, tolerating prefixes and typos.
+
+        Args:
+            query (str): Component name as typed by the user.
+            limit (int): Maximum number of suggestions when there is no single match.
+
+        Returns:
+            Dict: {"match": exact|prefix|substring|fuzzy|none, "components": [component dicts]}.
+        """
+        query = query.strip()
+        if not query:
+            return {"match": "none", "components": []}
+        for match, finder in (
+            ("exact", lambda: self.exact(query, limit)),
+            ("prefix", lambda: self.prefix(query, limit)),
+            ("substring", lambda: self.substring(query, limit)),
+            ("fuzzy", lambda: self.fuzzy(query, limit)),
+        ):
+            rows = finder()
+            if rows:
+                return {"match": match, "components": [to_component(row) for row in rows]}
+        return {"match": "none", "components": []}
+
+    def by_skus(self, skus: List[str]) -> Dict[str, Dict]:
+        if not skus:
+            return {}
+        rows = self._rows(f"SELECT * FROM components WHERE sku IN ({', '.join('?' * len(skus))})", skus)
+        return {row["sku"]: to_component(row) for row in rows}
+
+    def lookup_many(self, queries: List[str], limit: int = 5) -> Dict[str, Dict]:
+        return {query: self.lookup(query, limit) for query in dict.fromkeys(queries)}
+
+def to_component(row: sqlite3.Row) -> Dict:
+    return {
+        "SKU": row["sku"],
+        "Name": row["name"],
+        "Chinese Name": row["name_zh"],
+        "Size": row["size"],
+        "Manufacturer": row["manufacturer"],
+        "Stock": row["stock"],
+    }
+
+_catalog: Optional[ComponentCatalog] = None
+_catalog_lock = threading.Lock()
+
+def get_catalog() -> ComponentCatalog:
+    """The process-wide catalog, built from components.csv when the CSV is newer than the database."""
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = ComponentCatalog()
+        return _catalog
+
+if __name__ == "__main__":
+    # python -m agent.tools.component_catalog
+    # 以 10 萬筆合成零件測試查詢延遲
+    import random
+    import tempfile
+    import time
+
+    random.seed(0)
+    kinds = [("Hex Bolt", "六角螺栓"), ("Hex Nut", "六角螺帽"), ("Washer", "平墊圈"), ("Carriage Bolt", "馬車螺栓"),
+             ("Split Lock Washer", "彈簧墊圈"), ("R Clip", "R型插銷"), ("Flange Nut", "凸緣螺帽"), ("Stud Bolt", "雙頭螺栓")]
+    materials = ["Steel", "Stainless", "Brass", "Zinc Plated", "Galvanized", "Nylon"]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_path = Path(tmp_dir) / "components.csv"
+        with open(csv_path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["sku", "name", "name_zh", "aliases", "size", "manufacturer", "stock"])
+            for i in range(100_000):
+                name, name_zh = random.choice(kinds)
+                material = random.choice(materials)
+                size = random.choice(range(4, 64, 2))
+                writer.writerow([f"SKU-{i:06d}", f"{material} {name} M{size}-{i}", f"{name_zh}{i}",
+                                 f"{material} {name}", f"{size} mm", "BenchCo", random.randint(0, 500)])
+
+        start_time = time.perf_counter()
+        catalog = ComponentCatalog(Path(tmp_dir) / "components.db", csv_path)
+        print(f"Built 100k catalog in {time.perf_counter() - start_time:.2f}s")
+
+        queries = ["Steel Hex Bolt M12-42", "Brass Hex", "Galvanised Wahser", "六角螺帽77", "凸緣螺帽", "Nylon R Clp"]
+        for query in queries:
+            start_time = time.perf_counter()
+            result = catalog.lookup(query)
+            elapsed = (time.perf_counter() - start_time) * 1000
+            names = [component["Name"] for component in result["components"][:3]]
+            print(f"{query!r:28} {result['match']:<10} {elapsed:7.2f} ms {names}")
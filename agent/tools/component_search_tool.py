@@ -1,62 +1,52 @@
 from langchain_core.tools import tool
-from typing import Dict
+from pathlib import Path
+from typing import Dict, List
+import sys
 
-# Hash Table
-component_catalog = {
-    "Carriage Bolt": {
-        "Size": "40 mm",
-        "Manufacturer": "BoltTech",
-        "Stock": 200
-    },
-    "Hex Bolt": {
-        "Size": "38 mm",
-        "Manufacturer": "FastenCo",
-        "Stock": 175
-    },
-    "Hex Nut": {
-        "Size": "32 mm",
-        "Manufacturer": "Gamma Supplies",
-        "Stock": 149
-    },
-    "R Clip": {
-        "Size": "28 mm",
-        "Manufacturer": "SecureFast",
-        "Stock": 300
-    },
-    "Split Lock Washer": {
-        "Size": "34 mm",
-        "Manufacturer": "Gamma Supplies",
-        "Stock": 317
-    },
-    "Washer": {
-        "Size": "36 mm",
-        "Manufacturer": "FastenCo",
-        "Stock": 250
-    }
-}
+FILE = Path(__file__).resolve()
+AGENT_ROOT = FILE.parents[1]
+sys.path.insert(0, str(AGENT_ROOT))  # for import modules
+
+from tools.component_catalog import get_catalog
+from tools.ware_house import get_warehouse
 
 @tool
-def get_component_log(component_name: str) -> Dict[str, str]:
+def get_component_log(component_names: List[str]) -> Dict[str, Dict]:
     """
-    查詢零件型錄資訊，以英文作為輸入。
-    
+    查詢零件型錄資訊，一次可查詢多個零件。
+    零件名稱可使用英文、中文或別名，也接受名稱的開頭、部分字串或拼錯的名稱。
+
     Args:
-        component_name: 零件名稱，例如 "Hex Bolt"。
-    
+        component_names: 零件名稱列表，例如 ["Hex Bolt", "六角螺帽", "washer"]。
+
     Returns:
-        dict: 包含該零件的尺寸、製造商與庫存數量。
+        dict: 以輸入名稱為鍵，值包含比對方式 (match) 與符合的零件 (components，含料號、尺寸、製造商、可用庫存與預留數量)；
+        若名稱不是完全比對，components 為建議的零件，查無結果時包含 Error。
     """
-    component_name =component_name.strip()
-    if component_name in component_catalog:
-        return component_catalog[component_name]
-    else:
-        return {"Error": "查無此零件，請輸入正確的零件名稱。"}
+    if isinstance(component_names, str):
+        component_names = [component_names]
+    names = [name.strip() for name in component_names if name and name.strip()]
+    if not names:
+        return {"Error": "請輸入至少一個零件名稱。"}
+
+    results = get_catalog().lookup_many(names)
+    # 型錄的 Stock 只是初始值，改以倉庫的即時可用數量顯示
+    stock_levels = get_warehouse().stock_levels(
+        list({component["SKU"] for result in results.values() for component in result["components"]})
+    )
+    for result in results.values():
+        for component in result["components"]:
+            stock = stock_levels.get(component["SKU"])
+            if stock is not None:
+                component["Stock"] = stock["Available"]
+                component["Reserved"] = stock["Reserved"]
+        if result["match"] == "none":
+            result["Error"] = "查無此零件，請輸入正確的零件名稱。"
+        elif result["match"] != "exact":
+            result["Note"] = "未完全符合，以下為最接近的零件，請確認是否為所需零件。"
+    return results
 
 if __name__=="__main__":
-    print(get_component_log("Hex Bolt"))
-    print(get_component_log("Hex Nut"))
-    print(get_component_log("Washer"))
-    print(get_component_log("R Clip"))
-    print(get_component_log("Split Lock Washer"))
-    print(get_component_log("Carriage Bolt"))
-    print(get_component_log("Hex Nut"))
\ No newline at end of file
+    print(get_component_log.invoke({"component_names": ["Hex Bolt", "六角螺帽", "hexagon bolt"]}))
+    print(get_component_log.invoke({"component_names": ["Split Lock", "Wahser", "R Clp"]}))
+    print(get_component_log.invoke({"component_names": ["Carriage Bolt", "Flux Capacitor"]}))
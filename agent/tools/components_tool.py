@@ -0,0 +1,92 @@
+from langchain_core.tools import tool
+from pathlib import Path
+from typing import Dict, Optional
+import sys
+
+FILE = Path(__file__).resolve()
+AGENT_ROOT = FILE.parents[1]
+sys.path.insert(0, str(AGENT_ROOT))  # for import modules
+
+from tools.component_catalog import get_catalog
+from tools.ware_house import InventoryError, get_warehouse
+
+def resolve_sku(component_name: str) -> Dict:
+    """Resolve a component name to exactly one catalog entry, or an error with suggestions."""
+    result = get_catalog().lookup(component_name)
+    components = result["components"]
+    if result["match"] == "exact" and len(components) == 1:
+        return components[0]
+    if not components:
+        return {"Error": f"查無零件「{component_name}」，請輸入正確的零件名稱。"}
+    return {
+        "Error": f"零件「{component_name}」無法唯一對應，請從建議中選擇正確的名稱或料號後再試一次。",
+        "Suggestions": [f"{component['Name']} ({component['SKU']})" for component in components],
+    }
+
+@tool
+def reserve_components(component_name: str, quantity: int, maintenance_log_id: Optional[str] = None) -> Dict:
+    """
+    為維修工作預留倉庫中的零件，預留後其他人無法領用這些數量。
+    零件使用完畢後呼叫 complete_reservation 領用，未使用則取消預留。
+
+    Args:
+        component_name: 零件名稱 (英文、中文或別名皆可) 或料號 (SKU)。
+        quantity: 預留數量。
+        maintenance_log_id: 相關的維修紀錄編號 (若有)。
+
+    Returns:
+        dict: 預留編號 (Reservation ID) 與預留後的庫存，庫存不足時包含 Error。
+    """
+    warehouse = get_warehouse()
+    sku = component_name.strip() if warehouse.get(component_name.strip()) else None
+    component = {"SKU": sku} if sku else resolve_sku(component_name)
+    if "Error" in component:
+        return component
+    try:
+        reservation_id = warehouse.reserve(component["SKU"], quantity, maintenance_log_id)
+    except InventoryError as e:
+        return {"Error": str(e), "Stock": warehouse.get(component["SKU"])}
+    return {"Reservation ID": reservation_id, "Stock": warehouse.get(component["SKU"])}
+
+@tool
+def complete_reservation(reservation_id: int, used: bool = True) -> Dict:
+    """
+    結束零件預留：零件已使用則從庫存扣除 (used=True)，未使用則歸還可用庫存 (used=False)。
+
+    Args:
+        reservation_id: reserve_components 回傳的預留編號。
+        used: 零件是否已使用。
+
+    Returns:
+        dict: 更新後的庫存，或 Error。
+    """
+    warehouse = get_warehouse()
+    try:
+        stock = warehouse.consume(reservation_id) if used else warehouse.release(reservation_id)
+    except InventoryError as e:
+        return {"Error": str(e)}
+    return {"Message": "零件已領用。" if used else "已取消預留。", "Stock": stock}
+
+@tool
+def get_low_stock_components() -> Dict:
+    """
+    列出可用庫存 (庫存減去預留) 已達補貨門檻的零件，可用數量最少者優先。
+
+    Returns:
+        dict: 低庫存零件列表，含名稱、可用數量與補貨門檻。
+    """
+    low_stock = get_warehouse().low_stock()
+    components = get_catalog().by_skus([stock["SKU"] for stock in low_stock])
+    return {
+        "Low Stock": [
+            {"Name": components.get(stock["SKU"], {}).get("Name", stock["SKU"]), **stock} for stock in low_stock
+        ]
+    }
+
+if __name__ == "__main__":
+    reservation = reserve_components.invoke({"component_name": "六角螺栓", "quantity": 5, "maintenance_log_id": "test"})
+    print(reservation)
+    if "Reservation ID" in reservation:
+        print(complete_reservation.invoke({"reservation_id": reservation["Reservation ID"], "used": False}))
+    print(reserve_components.invoke({"component_name": "Washr", "quantity": 1}))
+    print(get_low_stock_components.invoke({}))
@@ -1,17 +1,19 @@
-import os
-import datetime
-import json
 from langchain_core.tools import tool
+from pathlib import Path
 from typing import Dict
+import sys
 
-# 設定維修日誌存放的資料夾
-LOGS_DIR = "maintenance_logs"
-os.makedirs(LOGS_DIR, exist_ok=True)
+FILE = Path(__file__).resolve()
+AGENT_ROOT = FILE.parents[1]
+sys.path.insert(0, str(AGENT_ROOT))  # for import modules
+
+from tools.maintenance_store import get_store
+from tools.maintenance_search import get_search
 
 @tool
 def fill_maintenance_log(name: str, employee_id: str, description: str) -> Dict[str, str]:
     """
-    填寫維修紀錄表單，並將記錄存入 maintenance_logs 資料夾，以時間命名檔案。
+    填寫維修紀錄表單，並將紀錄存入維修紀錄資料庫。
 
     Args:
         name: 維修人員姓名
@@ -19,30 +21,19 @@ def fill_maintenance_log(name: str, employee_id: str, description: str) -> Dict[
         description: 維修描述
     
     Returns:
-        dict: 紀錄填寫結果，包括存檔路徑與內容
+        dict: 紀錄填寫結果，包括紀錄編號 (Log ID) 與內容
     """
-    # 取得當前時間
-    current_time = datetime.datetime.now()
-    formatted_date = current_time.strftime("%Y-%m-%d %H:%M:%S")
-    filename = current_time.strftime("%Y%m%d_%H%M%S") + ".json"
-    file_path = os.path.join(LOGS_DIR, filename)
-
-    # 建立維修紀錄內容
-    maintenance_record = {
-        "Name": name,
-        "Employee ID": employee_id,
-        "Date": formatted_date,
-        "Description": description
-    }
-
-    # 儲存 JSON 檔案
-    with open(file_path, "w", encoding="utf-8") as file:
-        json.dump(maintenance_record, file, ensure_ascii=False, indent=4)
+    record = get_store().append(name.strip(), employee_id.strip(), description.strip())
+    # 寫入後立即加入向量索引；失敗時紀錄仍已保存，下次搜尋時會補上
+    try:
+        get_search().sync()
+    except Exception as e:
+        print(f"[Warning] Maintenance log {record['Log ID']} not indexed yet: {e}")
 
     return {
         "Message": "維修紀錄已成功填寫並儲存。",
-        "File Path": file_path,
-        "Record": maintenance_record
+        "Log ID": record["Log ID"],
+        "Record": record
     }
 
 if __name__ == "__main__":
@@ -51,4 +42,4 @@ if __name__ == "__main__":
         "name": "張偉",
         "employee_id": "E12345",
         "description": "更換機械臂液壓缸"
-    }))
\ No newline at end of file
+    }))
@@ -0,0 +1,78 @@
+from langchain_core.tools import tool
+from pathlib import Path
+from typing import Dict, Optional
+import sys
+
+FILE = Path(__file__).resolve()
+AGENT_ROOT = FILE.parents[1]
+sys.path.insert(0, str(AGENT_ROOT))  # for import modules
+
+from tools.maintenance_store import DEFAULT_PAGE_SIZE, get_store
+from tools.maintenance_search import get_search
+
+@tool
+def query_maintenance_logs(
+    employee_id: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    cursor: Optional[str] = None,
+    page_size: int = DEFAULT_PAGE_SIZE,
+) -> Dict:
+    """
+    查詢維修紀錄，可依員工編號與日期範圍篩選，結果由新到舊排列並分頁。
+    若回傳的 Next Cursor 不是 null，表示還有更多紀錄，將其作為 cursor 再次呼叫即可取得下一頁。
+
+    Args:
+        employee_id: 員工編號，例如 "E12345"。
+        start_date: 起始日期 (含)，格式 "YYYY-MM-DD"。
+        end_date: 結束日期 (含)，格式 "YYYY-MM-DD"。
+        cursor: 上一頁回傳的 Next Cursor，查詢第一頁時不需提供。
+        page_size: 每頁筆數，最多 50 筆。
+
+    Returns:
+        dict: Records (維修紀錄列表，含紀錄編號、姓名、員工編號、日期與描述) 與 Next Cursor。
+    """
+    try:
+        return get_store().query(employee_id, start_date, end_date, cursor, page_size)
+    except ValueError as e:
+        return {"Error": f"查詢條件格式錯誤：{e}。日期請使用 YYYY-MM-DD。"}
+
+@tool
+def search_maintenance_logs(
+    question: str,
+    employee_id: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+) -> Dict:
+    """
+    以關鍵字與語意搜尋公司過去的維修紀錄，例如「液壓缸是否曾經故障」、「平墊圈腐蝕的處理方式」。
+    詢問過去的維修經驗、故障歷史或處理方式時，請優先使用此工具查詢內部紀錄，不需要網路搜尋。
+    可依員工編號與日期範圍篩選。
+
+    Args:
+        question: 要搜尋的內容，例如 "液壓缸漏油"。
+        employee_id: 員工編號，只搜尋該員工的紀錄。
+        start_date: 起始日期 (含)，格式 "YYYY-MM-DD"。
+        end_date: 結束日期 (含)，格式 "YYYY-MM-DD"。
+
+    Returns:
+        dict: Records (相關程度由高到低的維修紀錄，含紀錄編號、姓名、員工編號、日期與描述)。
+    """
+    print('[Info] call search_maintenance_logs')
+    print('[Question]: ', question, employee_id, start_date, end_date)
+    try:
+        records = get_search().search(question, employee_id, start_date, end_date)
+    except ValueError as e:
+        return {"Error": f"查詢條件格式錯誤：{e}。日期請使用 YYYY-MM-DD。"}
+    if not records:
+        return {"Records": [], "Message": "查無相關的維修紀錄。"}
+    return {"Records": records}
+
+if __name__ == "__main__":
+    first_page = query_maintenance_logs.invoke({"page_size": 2})
+    print(first_page)
+    if first_page.get("Next Cursor"):
+        print(query_maintenance_logs.invoke({"page_size": 2, "cursor": first_page["Next Cursor"]}))
+    print(query_maintenance_logs.invoke({"employee_id": "R186", "start_date": "2025-02-01", "end_date": "2025-02-28"}))
+    print(search_maintenance_logs.invoke({"question": "液壓缸故障"}))
+    print(search_maintenance_logs.invoke({"question": "腐蝕", "start_date": "2025-02-01", "end_date": "2025-02-28"}))
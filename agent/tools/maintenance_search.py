@@ -0,0 +1,172 @@
+import datetime
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+import sys
+
+FILE = Path(__file__).resolve()
+AGENT_ROOT = FILE.parents[1]
+sys.path.insert(0, str(AGENT_ROOT))  # for import modules
+
+import chromadb
+from langchain_chroma import Chroma
+from rag.rag_process import RRF_K, close_index, get_embeddings
+from tools.maintenance_store import DATA_PATH, DATE_FORMAT, MaintenanceLogStore, get_store, parse_date
+
+MAINTENANCE_CHROMA_PATH = DATA_PATH / "maintenance_chroma_db"
+COLLECTION_NAME = "maintenance_logs"
+# 每次寫入向量索引的紀錄數
+SYNC_BATCH_SIZE = 256
+# 寫入租約的秒數，每次同步時續約；寫入程序閒置超過此時間後，由下一個同步的程序接手
+WRITER_LEASE_SECONDS = float(os.getenv("MAINTENANCE_WRITER_LEASE", "120"))
+
+def to_epoch(created_at: str) -> int:
+    # Chroma 的範圍條件只支援數值，日期另存為 epoch 秒
+    return int(datetime.datetime.strptime(created_at, DATE_FORMAT).timestamp())
+
+class MaintenanceSearch:
+    """
+    Hybrid search over the maintenance log: the store's FTS index and a Chroma
+    collection of the same records, fused with Reciprocal Rank Fusion like
+    `rag_process.hybrid_search`.
+
+    The Chroma collection follows the store incrementally: `sync` embeds only the
+    records after the last synced id, which is kept in the store, so a record
+    missed because the process stopped before embedding it is picked up by the
+    next sync.
+
+    Chroma is not safe to write from several processes, and a process that has the
+    collection open does not see vectors another process adds. So only the process
+    holding the writer lease in the store adds vectors; the lease is renewed on every
+    sync and taken over by the next process that syncs once it expires. The other
+    processes only read, and reopen the collection when the synced id in the store
+    has moved since they opened it. Until the writer has synced a record, readers do
+    not open the collection at all, so only the writer creates the Chroma database.
+    """
+    def __init__(self, store: MaintenanceLogStore, persist_path: Path = MAINTENANCE_CHROMA_PATH):
+        self.store = store
+        self.persist_path = persist_path
+        self.client = None
+        self.vectorstore: Optional[Chroma] = None
+        # 開啟 (或本程序上次寫入) 時的 synced id，與 store 不同時表示其他程序寫入過
+        self.opened_id = -1
+        self.lock = threading.Lock()
+
+    def _refresh(self, writer: bool = False):
+        """Reopen the collection if another process added vectors since it was opened. Call it under `lock`."""
+        synced_id = self.store.synced_id(COLLECTION_NAME)
+        # 多個程序同時建立新的 Chroma 資料庫會衝突，尚無向量時只由寫入程序開啟 (建立)
+        if synced_id == self.opened_id or not (synced_id or writer):
+            return
+        if self.client is not None:
+            close_index(self.client)
+        self.client = chromadb.PersistentClient(path=str(self.persist_path))
+        self.vectorstore = Chroma(
+            client=self.client, collection_name=COLLECTION_NAME, embedding_function=get_embeddings()
+        )
+        self.opened_id = synced_id
+
+    def sync(self) -> int:
+        """
+        Embed the records not in the vector index yet if this process holds the writer
+        lease, otherwise only pick up what the writer added.
+
+        Returns:
+            int: Number of records this process added.
+        """
+        added = 0
+        with self.lock:
+            self._refresh()
+            while self.store.claim_writer(COLLECTION_NAME, str(os.getpid()), WRITER_LEASE_SECONDS):
+                # 剛接手時，前一個寫入程序的紀錄要先重新開啟才看得到
+                self._refresh(writer=True)
+                records = self.store.records_after(self.opened_id, SYNC_BATCH_SIZE)
+                if not records:
+                    return added
+                # 以紀錄 id 作為向量 id，重複寫入同一筆紀錄只會覆蓋
+                self.vectorstore.add_texts(
+                    texts=[record["Description"] for record in records],
+                    metadatas=[
+                        {
+                            "log_id": record["Log ID"],
+                            "employee_id": record["Employee ID"],
+                            "created_at": record["Date"],
+                            "created_ts": to_epoch(record["Date"]),
+                        }
+                        for record in records
+                    ],
+                    ids=[str(record["Log ID"]) for record in records],
+                )
+                self.store.set_synced_id(COLLECTION_NAME, records[-1]["Log ID"])
+                self.opened_id = records[-1]["Log ID"]
+                added += len(records)
+            return added
+
+    @staticmethod
+    def build_where(employee_id: Optional[str], start: Optional[str], end: Optional[str]) -> Optional[Dict]:
+        clauses = []
+        if employee_id:
+            clauses.append({"employee_id": employee_id.strip()})
+        if start:
+            clauses.append({"created_ts": {"$gte": to_epoch(parse_date(start))}})
+        if end:
+            operator = "$lt" if len(end.strip()) == 10 else "$lte"
+            clauses.append({"created_ts": {operator: to_epoch(parse_date(end, end=True))}})
+        if not clauses:
+            return None
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+    def search(self, question: str, employee_id: Optional[str] = None, start: Optional[str] = None,
+               end: Optional[str] = None, k: int = 5, fetch_k: int = 20) -> List[Dict]:
+        """
+        Maintenance records relevant to the question, best first.
+
+        Args:
+            question (str): What to look for, e.g. "液壓缸漏油".
+            employee_id (Optional[str]): Only records of this employee.
+            start (Optional[str]): Earliest date, "YYYY-MM-DD".
+            end (Optional[str]): Latest date, "YYYY-MM-DD" (inclusive).
+            k (int): Number of records to return.
+            fetch_k (int): Candidates taken from each ranking before fusion.
+
+        Returns:
+            List[Dict]: Records with their fused "Score".
+
+        Raises:
+            ValueError: If a date is malformed.
+        """
+        where = self.build_where(employee_id, start, end)
+        self.sync()
+        scores: Dict[int, float] = {}
+        records: Dict[int, Dict] = {}
+
+        for rank, record in enumerate(self.store.search_text(question, employee_id, start, end, fetch_k), start=1):
+            records[record["Log ID"]] = record
+            scores[record["Log ID"]] = scores.get(record["Log ID"], 0.0) + 1.0 / (RRF_K + rank)
+
+        # 其他執行緒重新開啟 collection 時會關閉舊的 client，查詢時持有鎖
+        with self.lock:
+            docs = self.vectorstore.similarity_search(question, k=fetch_k, filter=where) if self.vectorstore else []
+        for rank, doc in enumerate(docs, start=1):
+            log_id = doc.metadata["log_id"]
+            if log_id not in records:
+                record = self.store.get(log_id)
+                if record is None:
+                    continue
+                records[log_id] = record
+            scores[log_id] = scores.get(log_id, 0.0) + 1.0 / (RRF_K + rank)
+
+        ranked = sorted(scores, key=scores.get, reverse=True)[:k]
+        return [{**records[log_id], "Score": round(scores[log_id], 4)} for log_id in ranked]
+
+_search: Optional[MaintenanceSearch] = None
+_search_lock = threading.Lock()
+
+def get_search() -> MaintenanceSearch:
+    """The process-wide maintenance log search, on top of `get_store()`."""
+    global _search
+    with _search_lock:
+        if _search is None:
+            _search = MaintenanceSearch(get_store())
+        return _search
@@ -0,0 +1,342 @@
+import datetime
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+AGENT_ROOT = Path(__file__).resolve().parents[1]
+DATA_PATH = AGENT_ROOT / "data"
+MAINTENANCE_DB_PATH = DATA_PATH / "maintenance.db"
+# 舊版每筆紀錄一個 JSON 檔的資料夾 (專案根目錄下)
+LEGACY_LOGS_DIR = AGENT_ROOT.parent / "maintenance_logs"
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+DEFAULT_PAGE_SIZE = 10
+MAX_PAGE_SIZE = 50
+BUSY_TIMEOUT_MS = 5000
+# 全文檢索每次最多使用的查詢 trigram 數
+TEXT_SEARCH_TRIGRAMS = 32
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS maintenance_logs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    employee_id TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    description TEXT NOT NULL,
+    source TEXT UNIQUE  -- 由舊版 JSON 檔匯入時的檔名，避免重複匯入
+);
+-- 「某位員工某段期間的紀錄」與「某段期間的紀錄」的查詢與分頁排序都可使用索引
+CREATE INDEX IF NOT EXISTS idx_maintenance_logs_employee ON maintenance_logs(employee_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_maintenance_logs_created ON maintenance_logs(created_at);
+-- 紀錄只能新增，不能修改或刪除
+CREATE TRIGGER IF NOT EXISTS maintenance_logs_no_update BEFORE UPDATE ON maintenance_logs
+BEGIN SELECT RAISE(ABORT, 'maintenance logs are append-only'); END;
+CREATE TRIGGER IF NOT EXISTS maintenance_logs_no_delete BEFORE DELETE ON maintenance_logs
+BEGIN SELECT RAISE(ABORT, 'maintenance logs are append-only'); END;
+"""
+
+# 描述與姓名的 trigram 全文索引，新增紀錄時由 trigger 同步寫入
+FTS_SQL = """
+CREATE VIRTUAL TABLE IF NOT EXISTS maintenance_logs_fts USING fts5(
+    description, name, content='maintenance_logs', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS maintenance_logs_fts_insert AFTER INSERT ON maintenance_logs
+BEGIN
+    INSERT INTO maintenance_logs_fts(rowid, description, name) VALUES (new.id, new.description, new.name);
+END;
+INSERT INTO maintenance_logs_fts(maintenance_logs_fts) VALUES ('rebuild');
+-- 已寫入向量索引的最大紀錄 id
+CREATE TABLE IF NOT EXISTS vector_sync (
+    collection TEXT PRIMARY KEY,
+    last_id INTEGER NOT NULL
+);
+"""
+
+# 唯一可寫入向量索引的程序 (租約)，到期未續約時由其他程序接手
+WRITER_SQL = """
+CREATE TABLE IF NOT EXISTS vector_writer (
+    collection TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires REAL NOT NULL
+);
+"""
+
+def parse_date(value: str, end: bool = False) -> str:
+    """
+    Normalize a "YYYY-MM-DD" or "YYYY-MM-DD HH:MM:SS" bound to a `created_at` string.
+    A date-only upper bound covers the whole day.
+
+    Raises:
+        ValueError: If the value is not in one of the two formats.
+    """
+    value = value.strip()
+    try:
+        return datetime.datetime.strptime(value, DATE_FORMAT).strftime(DATE_FORMAT)
+    except ValueError:
+        day = datetime.datetime.strptime(value, "%Y-%m-%d")
+    return (day + datetime.timedelta(days=1) if end else day).strftime(DATE_FORMAT)
+
+def date_range_sql(start: Optional[str], end: Optional[str], column: str = "created_at") -> Tuple[List[str], List[str]]:
+    """WHERE clauses and parameters for an inclusive date range (see `parse_date`)."""
+    clauses, params = [], []
+    if start:
+        clauses.append(f"{column} >= ?")
+        params.append(parse_date(start))
+    if end:
+        clauses.append(f"{column} < ?" if len(end.strip()) == 10 else f"{column} <= ?")
+        params.append(parse_date(end, end=True))
+    return clauses, params
+
+def text_query(text: str) -> str:
+    """
+    FTS5 query matching any trigram of the text, so Chinese phrases without spaces
+    and partial wording still match; bm25 ranks records sharing more trigrams first.
+    """
+    text = " ".join(text.split())
+    grams = list(dict.fromkeys(text[i:i + 3] for i in range(len(text) - 2) if " " not in text[i:i + 3]))
+    return " OR ".join('"' + gram.replace('"', '""') + '"' for gram in grams[:TEXT_SEARCH_TRIGRAMS])
+
+def encode_cursor(row: sqlite3.Row) -> str:
+    return f"{row['created_at']}|{row['id']}"
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    try:
+        created_at, log_id = cursor.rsplit("|", 1)
+        return created_at, int(log_id)
+    except ValueError:
+        raise ValueError(f"Invalid cursor '{cursor}'")
+
+class MaintenanceLogStore:
+    """
+    Append-only maintenance log in SQLite.
+
+    Records get an increasing id instead of a file name derived from the time, so
+    two logs written in the same second no longer overwrite each other, and queries
+    by employee and date range use the indexes instead of reading every file.
+    Results are paginated with a keyset cursor ("created_at|id" of the last row),
+    so later pages cost the same as the first one.
+    """
+    def __init__(self, db_path: Path = MAINTENANCE_DB_PATH, legacy_dir: Optional[Path] = LEGACY_LOGS_DIR):
+        self.db_path = db_path
+        self.local = threading.local()
+        self.conn.executescript(SCHEMA_SQL)
+        # 依 PRAGMA user_version 執行尚未套用的遷移，每個版本只執行一次
+        migrations = [
+            lambda: legacy_dir is not None and self.migrate_json_logs(legacy_dir),
+            lambda: self.conn.executescript(FTS_SQL),
+            lambda: self.conn.executescript(WRITER_SQL),
+        ]
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        for number, migrate in enumerate(migrations[version:], start=version + 1):
+            migrate()
+            self.conn.execute(f"PRAGMA user_version = {number}")
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        # SQLite 連線不能跨執行緒共用，每個執行緒各自開啟連線
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def append(self, name: str, employee_id: str, description: str,
+               created_at: Optional[str] = None, source: Optional[str] = None) -> Dict:
+        """
+        Add a maintenance record.
+
+        Args:
+            name (str): Name of the technician.
+            employee_id (str): Employee ID of the technician.
+            description (str): What was repaired.
+            created_at (Optional[str]): "YYYY-MM-DD HH:MM:SS", the current time if None.
+            source (Optional[str]): Legacy file the record was imported from.
+
+        Returns:
+            Dict: The stored record, including its "Log ID".
+        """
+        created_at = created_at or datetime.datetime.now().strftime(DATE_FORMAT)
+        log_id = self.conn.execute(
+            "INSERT INTO maintenance_logs (name, employee_id, created_at, description, source) VALUES (?, ?, ?, ?, ?)",
+            (name, employee_id, created_at, description, source),
+        ).lastrowid
+        return self.get(log_id)
+
+    def get(self, log_id: int) -> Optional[Dict]:
+        row = self.conn.execute("SELECT * FROM maintenance_logs WHERE id = ?", (log_id,)).fetchone()
+        return to_record(row) if row else None
+
+    def query(self, employee_id: Optional[str] = None, start: Optional[str] = None, end: Optional[str] = None,
+              cursor: Optional[str] = None, page_size: int = DEFAULT_PAGE_SIZE) -> Dict:
+        """
+        Records matching the filters, newest first.
+
+        Args:
+            employee_id (Optional[str]): Only records of this employee.
+            start (Optional[str]): Earliest date, "YYYY-MM-DD" or "YYYY-MM-DD HH:MM:SS".
+            end (Optional[str]): Latest date (a date-only value includes that whole day).
+            cursor (Optional[str]): "Next Cursor" of the previous page.
+            page_size (int): Records per page, at most MAX_PAGE_SIZE.
+
+        Returns:
+            Dict: {"Records": [...], "Next Cursor": str or None}.
+
+        Raises:
+            ValueError: If a date or the cursor is malformed.
+        """
+        page_size = max(1, min(int(page_size), MAX_PAGE_SIZE))
+        clauses, params = [], []
+        if employee_id:
+            clauses.append("employee_id = ?")
+            params.append(employee_id.strip())
+        date_clauses, date_params = date_range_sql(start, end)
+        clauses += date_clauses
+        params += date_params
+        if cursor:
+            clauses.append("(created_at, id) < (?, ?)")
+            params.extend(decode_cursor(cursor))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        # 多取一筆判斷是否還有下一頁
+        rows = self.conn.execute(
+            f"SELECT * FROM maintenance_logs {where} ORDER BY created_at DESC, id DESC LIMIT ?",
+            (*params, page_size + 1),
+        ).fetchall()
+        return {
+            "Records": [to_record(row) for row in rows[:page_size]],
+            "Next Cursor": encode_cursor(rows[page_size - 1]) if len(rows) > page_size else None,
+        }
+
+    def search_text(self, text: str, employee_id: Optional[str] = None, start: Optional[str] = None,
+                    end: Optional[str] = None, limit: int = 20) -> List[Dict]:
+        """
+        Full-text search over descriptions and names, best match first.
+
+        Raises:
+            ValueError: If a date is malformed.
+        """
+        clauses, params = date_range_sql(start, end, "maintenance_logs.created_at")
+        if employee_id:
+            clauses.append("maintenance_logs.employee_id = ?")
+            params.append(employee_id.strip())
+        filters = "".join(f" AND {clause}" for clause in clauses)
+        match = text_query(text)
+        if match:
+            rows = self.conn.execute(
+                "SELECT maintenance_logs.* FROM maintenance_logs_fts "
+                "JOIN maintenance_logs ON maintenance_logs.id = maintenance_logs_fts.rowid "
+                f"WHERE maintenance_logs_fts MATCH ?{filters} ORDER BY rank LIMIT ?",
+                (match, *params, limit),
+            ).fetchall()
+        else:
+            # trigram 無法索引少於三個字的查詢
+            rows = self.conn.execute(
+                f"SELECT * FROM maintenance_logs WHERE (description LIKE ? OR name LIKE ?){filters} "
+                "ORDER BY created_at DESC LIMIT ?",
+                (f"%{text.strip()}%", f"%{text.strip()}%", *params, limit),
+            ).fetchall()
+        return [to_record(row) for row in rows]
+
+    def records_after(self, log_id: int, limit: int = 500) -> List[Dict]:
+        rows = self.conn.execute(
+            "SELECT * FROM maintenance_logs WHERE id > ? ORDER BY id LIMIT ?", (log_id, limit)
+        ).fetchall()
+        return [to_record(row) for row in rows]
+
+    def synced_id(self, collection: str) -> int:
+        row = self.conn.execute("SELECT last_id FROM vector_sync WHERE collection = ?", (collection,)).fetchone()
+        return row[0] if row else 0
+
+    def set_synced_id(self, collection: str, log_id: int):
+        self.conn.execute(
+            "INSERT INTO vector_sync (collection, last_id) VALUES (?, ?) "
+            "ON CONFLICT(collection) DO UPDATE SET last_id = MAX(last_id, excluded.last_id)",
+            (collection, log_id),
+        )
+
+    def claim_writer(self, collection: str, owner: str, lease_seconds: float) -> bool:
+        """
+        Take or renew the lease on writing a vector collection. The lease goes to
+        `owner` if nobody holds it, `owner` already holds it or it has expired.
+
+        Returns:
+            bool: Whether `owner` holds the lease for the next `lease_seconds`.
+        """
+        now = time.time()
+        cursor = self.conn.execute(
+            "INSERT INTO vector_writer (collection, owner, expires) VALUES (?, ?, ?) "
+            "ON CONFLICT(collection) DO UPDATE SET owner = excluded.owner, expires = excluded.expires "
+            "WHERE vector_writer.owner = excluded.owner OR vector_writer.expires < ?",
+            (collection, owner, now + lease_seconds, now),
+        )
+        return cursor.rowcount > 0
+
+    def migrate_json_logs(self, logs_dir: Path = LEGACY_LOGS_DIR) -> int:
+        """
+        Import the one-file-per-record JSON logs written by earlier versions.
+        Files already imported are skipped, so running it again is harmless.
+
+        Returns:
+            int: Number of records imported.
+        """
+        if not logs_dir.is_dir():
+            return 0
+        rows = []
+        for path in sorted(logs_dir.glob("*.json")):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    record = json.load(f)
+                rows.append((record["Name"], record["Employee ID"], record["Date"], record["Description"], path.name))
+            except (OSError, ValueError, KeyError) as e:
+                print(f"[Warning] Skipping maintenance log {path}: {e}")
+        conn = self.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            imported = sum(
+                conn.execute(
+                    "INSERT OR IGNORE INTO maintenance_logs (name, employee_id, created_at, description, source) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    row,
+                ).rowcount
+                for row in rows
+            )
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return imported
+
+def to_record(row: sqlite3.Row) -> Dict:
+    return {
+        "Log ID": row["id"],
+        "Name": row["name"],
+        "Employee ID": row["employee_id"],
+        "Date": row["created_at"],
+        "Description": row["description"],
+    }
+
+_store: Optional[MaintenanceLogStore] = None
+_store_lock = threading.Lock()
+
+def get_store() -> MaintenanceLogStore:
+    """The process-wide store; the legacy JSON logs are imported the first time the database is created."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = MaintenanceLogStore()
+        return _store
+
+if __name__ == "__main__":
+    # python -m agent.tools.maintenance_store [logs_dir]
+    # 手動匯入舊版 JSON 紀錄 (重複執行不會重複匯入)
+    import sys
+
+    store = get_store()
+    logs_dir = Path(sys.argv[1]) if len(sys.argv) > 1 else LEGACY_LOGS_DIR
+    print(f"Imported {store.migrate_json_logs(logs_dir)} record(s) from {logs_dir}")
+    print(json.dumps(store.query(page_size=5), ensure_ascii=False, indent=4))
@@ -1,17 +1,17 @@
 from langchain_core.documents.base import Document
 from langchain_core.tools import tool
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 import sys
 
 FILE = Path(__file__).resolve()
 AGENT_ROOT = FILE.parents[1]
 sys.path.insert(0, str(AGENT_ROOT))  # for import modules
 
-from rag.rag_process import init_rag_process
+from rag.retriever import get_backend
 
 @tool(parse_docstring=True)
-def get_law_rag_answer(question: str) -> List[Document] | str:
+def get_law_rag_answer(question: str, law: Optional[str] = None, article: Optional[str] = None) -> List[Document] | str:
     """
     Perform retrieval-augmented generation (RAG) by querying the vectorstore.
     This function is specifically designed to retrieve answers related to ship-related laws 
@@ -34,6 +34,9 @@ def get_law_rag_answer(question: str) -> List[Document] | str:
         question:   Analyze the query question to extract the most important keywords for similarity search.
                     If no suitable keywords are found, ask the user to refine their query and you can input null to pass the tools call.
                     If the query is irrelevant to the company document information, return an empty string.
+        law:        Only search this law when the question names one, "船舶法" or "船舶安全營運與防止污染管理規則".
+                    Leave empty to search both laws.
+        article:    Only return this article when the question cites one, e.g. "第30條之1". Leave empty otherwise.
 
     Returns:
         A list of documents relevant to the query from internal company files or str
@@ -41,30 +44,21 @@ def get_law_rag_answer(question: str) -> List[Document] | str:
         範例 : @參考文件內容: .....
     """
     print('[Info] call get_law_rag_answer')
-    print('[Question]: ', question)
+    print('[Question]: ', question, law, article)
 
     if not question:
         return "No tools required for this query. Please answer the question by yourself."
     else:
-        # Initialize the file paths
-        AGENT_ROOT = Path(__file__).resolve().parents[1]
-        doc_path = AGENT_ROOT / "documents" / "law"
-        files_record_path =  doc_path / "files_record.json"
-        chorma_db_path = doc_path / "law_chroma_db"
-
-        # Initialize the RAG process (Get the vectorstore)
-        vectorstore = init_rag_process(
-                doc_path= doc_path,
-                files_record_path= files_record_path,
-                db_path= chorma_db_path 
-            )
-
-        # Perform similarity search
-        docs = vectorstore.similarity_search(question)
+        # Perform hybrid (BM25 + vector) search on the shared law index
+        filters = {field: value for field, value in (("document", law), ("article", article)) if value}
+        docs = get_backend().search(question, corpora=["law"], filters=filters)
+        if not docs and filters:
+            # 名稱或條號不符時退回搜尋整個法規集合
+            docs = get_backend().search(question, corpora=["law"])
 
         return docs
 
 if __name__ == "__main__":
     question = "船舶安全管理證書要求"
-    ans = get_law_rag_answer(question)
+    ans = get_law_rag_answer.invoke({"question": question, "law": "船舶安全營運與防止污染管理規則"})
     print(ans)
\ No newline at end of file
@@ -0,0 +1,61 @@
+from langchain_core.documents.base import Document
+from langchain_core.tools import tool
+from pathlib import Path
+from typing import List, Optional
+import sys
+
+FILE = Path(__file__).resolve()
+AGENT_ROOT = FILE.parents[1]
+sys.path.insert(0, str(AGENT_ROOT))  # for import modules
+
+from rag.retriever import get_backend
+
+@tool(parse_docstring=True)
+def search_documents(
+    question: str, corpora: Optional[List[str]] = None, documents: Optional[List[str]] = None
+) -> List[Document] | str:
+    """
+    Search several internal document collections in one call and return the most relevant passages.
+    Prefer this tool over calling get_law_rag_answer and get_system_rag_answer one after another
+    when a question needs both the law and the accident reports.
+    Collections{
+        law: 船舶法、船舶安全營運與防止污染管理規則
+        system: 重大海事事故調查報告 (天王星客船、臺馬之星)
+    }
+
+    Note{
+        Answer the users QUESTION using the DOCUMENT text above.
+        Keep your answer ground in the facts of the DOCUMENT.
+    }
+
+    Args:
+        question:   Analyze the query question to extract the most important keywords for similarity search.
+                    If the query is irrelevant to the company document information, return an empty string.
+        corpora:    Names of the collections to search, e.g. ["law", "system"]. Search all collections if omitted.
+        documents:  Only search these documents, e.g. ["船舶法", "臺馬之星"]. Search every document if omitted.
+
+    Returns:
+        A list of documents relevant to the query from internal company files or str
+        重要 : 若遇到文件查詢時附上原始文件描述內容不做修正
+    """
+    print('[Info] call search_documents')
+    print('[Question]: ', question, corpora, documents)
+
+    if not question:
+        return "No tools required for this query. Please answer the question by yourself."
+
+    backend = get_backend()
+    unknown = [name for name in corpora or [] if name not in backend.corpora]
+    if unknown:
+        return f"Unknown collections {unknown}, available collections: {list(backend.corpora)}"
+
+    known = [name for names in backend.documents().values() for name in names]
+    unknown = [name for name in documents or [] if name not in known]
+    if unknown:
+        return f"Unknown documents {unknown}, available documents: {known}"
+
+    return backend.search(question, corpora=corpora, k=6, filters={"document": documents} if documents else None)
+
+if __name__ == "__main__":
+    question = "臺馬之星失去動力與船舶安全管理證書要求"
+    print(search_documents.invoke({"question": question}))
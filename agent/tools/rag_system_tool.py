@@ -1,17 +1,17 @@
 from langchain_core.documents.base import Document
 from langchain_core.tools import tool
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 import sys
 
 FILE = Path(__file__).resolve()
 AGENT_ROOT = FILE.parents[1]
 sys.path.insert(0, str(AGENT_ROOT))  # for import modules
 
-from rag.rag_process import init_rag_process
+from rag.retriever import get_backend
 
 @tool(parse_docstring=True)
-def get_system_rag_answer(question: str) -> List[Document] | str:
+def get_system_rag_answer(question: str, report: Optional[str] = None) -> List[Document] | str:
     """
     Perform retrieval-augmented generation (RAG) by querying the vectorstore. 
     The documents primarily consist of major maritime transport accident investigation reports. 
@@ -29,36 +29,28 @@ def get_system_rag_answer(question: str) -> List[Document] | str:
         question:   Analyze the query question to extract the most important keywords for similarity search.
                     If no suitable keywords are found, ask the user to refine their query.
                     If the query is irrelevant to the company document information, return an empty string.
+        report:     Only search this report when the question is about one ship, "天王星客船" or "臺馬之星".
+                    Leave empty to search both reports.
 
     Returns:
         A list of documents relevant to the query from internal company files or str
         重要 : 若遇到文件查詢時附上原始文件描述內容不做修正
     """
     print('[Info] call get_system_rag_answer')
-    print('[Question]: ', question)
+    print('[Question]: ', question, report)
 
     if not question:
         return "No tools required for this query. Please answer the question by yourself."
     else:
-        # Initialize the file paths
-        AGENT_ROOT = Path(__file__).resolve().parents[1]
-        doc_path = AGENT_ROOT / "documents" / "system"
-        files_record_path =  doc_path / "files_record.json"
-        chorma_db_path = doc_path / "system_chroma_db"
-
-        # Initialize the RAG process (Get the vectorstore)
-        vectorstore = init_rag_process(
-                doc_path= doc_path,
-                files_record_path= files_record_path,
-                db_path= chorma_db_path 
-            )
-
-        # Perform similarity search
-        docs = vectorstore.similarity_search(question)
+        # Perform hybrid (BM25 + vector) search on the shared system index
+        docs = get_backend().search(question, corpora=["system"], filters={"document": report} if report else None)
+        if not docs and report:
+            # 報告名稱不符時退回搜尋全部報告
+            docs = get_backend().search(question, corpora=["system"])
 
         return docs
 
 if __name__ == "__main__":
     question = "臺馬之星在失去動力的過程中，主要是由於什麼原因？"
-    ans =  get_system_rag_answer(question)
+    ans =  get_system_rag_answer.invoke({"question": question, "report": "臺馬之星"})
     print(ans)
\ No newline at end of file
@@ -0,0 +1,397 @@
+import csv
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+AGENT_ROOT = Path(__file__).resolve().parents[1]
+DATA_PATH = AGENT_ROOT / "data"
+WAREHOUSE_DB_PATH = DATA_PATH / "warehouse.db"
+# 初始庫存取自零件型錄 CSV 的 stock 欄位
+CATALOG_CSV_PATH = DATA_PATH / "components.csv"
+
+# 庫存低於此數量時列入低庫存清單 (可依零件個別設定)
+DEFAULT_REORDER_LEVEL = 20
+# 其他連線持有寫入鎖時等待的毫秒數
+BUSY_TIMEOUT_MS = 5000
+# 樂觀鎖版本衝突時的重試次數
+VERSION_RETRIES = 5
+
+# 異動類型
+RECEIVE = "receive"    # 入庫
+RESERVE = "reserve"    # 預留給維修工單
+RELEASE = "release"    # 取消預留
+CONSUME = "consume"    # 領用
+ADJUST = "adjust"      # 盤點調整
+
+SCHEMA_SQL = f"""
+CREATE TABLE IF NOT EXISTS inventory (
+    sku TEXT PRIMARY KEY,
+    on_hand INTEGER NOT NULL DEFAULT 0 CHECK (on_hand >= 0),
+    reserved INTEGER NOT NULL DEFAULT 0 CHECK (reserved >= 0 AND reserved <= on_hand),
+    reorder_level INTEGER NOT NULL DEFAULT {DEFAULT_REORDER_LEVEL},
+    version INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+);
+-- 只索引低庫存的零件並依可用數量排序，查詢條件必須與索引條件相同才會使用此索引
+CREATE INDEX IF NOT EXISTS idx_inventory_low_stock
+    ON inventory(on_hand - reserved) WHERE on_hand - reserved <= reorder_level;
+-- 每次庫存變動一列，只新增不修改 (預留的狀態除外)
+CREATE TABLE IF NOT EXISTS stock_movements (
+    id INTEGER PRIMARY KEY,
+    sku TEXT NOT NULL REFERENCES inventory(sku),
+    kind TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    maintenance_log_id TEXT,
+    reservation_id INTEGER REFERENCES stock_movements(id),
+    open INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_stock_movements_sku ON stock_movements(sku, created_at);
+CREATE INDEX IF NOT EXISTS idx_stock_movements_log ON stock_movements(maintenance_log_id)
+    WHERE maintenance_log_id IS NOT NULL;
+"""
+
+class InventoryError(ValueError):
+    """A stock operation that cannot be applied (unknown SKU, not enough stock, ...)."""
+
+class InsufficientStock(InventoryError):
+    pass
+
+class VersionConflict(InventoryError):
+    """The row changed since it was read; re-read it and retry."""
+
+def connect(db_path: Path = WAREHOUSE_DB_PATH) -> sqlite3.Connection:
+    # isolation_level=None：交易由 BEGIN IMMEDIATE / COMMIT 明確控制
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    # WAL 讓讀取不被寫入阻擋，多個 worker 行程可同時查詢庫存
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA foreign_keys=ON")
+    return conn
+
+class Warehouse:
+    """
+    Warehouse inventory in SQLite, shared by every worker process.
+
+    Each stock operation runs in a `BEGIN IMMEDIATE` transaction, which takes the
+    write lock before reading, so concurrent reserve/consume calls from any number
+    of threads or processes are serialized by SQLite and no update is lost. Every
+    change bumps the row `version`; `adjust` uses it for optimistic concurrency when
+    a count was read earlier (e.g. shown to a user) and written back later.
+
+    Stock movements are recorded in `stock_movements` with the maintenance log entry
+    they belong to, so the parts used by a repair can be traced.
+    """
+    def __init__(self, db_path: Path = WAREHOUSE_DB_PATH, seed_csv: Optional[Path] = CATALOG_CSV_PATH):
+        self.db_path = db_path
+        self.local = threading.local()
+        self.conn.executescript(SCHEMA_SQL)
+        if seed_csv is not None and seed_csv.exists():
+            self.seed(seed_csv)
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        # SQLite 連線不能跨執行緒共用，每個執行緒各自開啟連線
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.local.conn = connect(self.db_path)
+        return conn
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Write transaction holding the database write lock from its first statement."""
+        conn = self.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def seed(self, csv_path: Path):
+        """Add the SKUs of the catalog CSV that are not in the inventory yet, with their listed stock."""
+        with open(csv_path, "r", encoding="utf-8-sig", newline="") as f:
+            rows = [(row["sku"].strip(), int(row.get("stock") or 0)) for row in csv.DictReader(f)]
+        now = time.time()
+        with self.transaction() as conn:
+            for sku, stock in rows:
+                inserted = conn.execute(
+                    "INSERT OR IGNORE INTO inventory (sku, on_hand, updated_at) VALUES (?, ?, ?)", (sku, stock, now)
+                ).rowcount
+                if inserted and stock:
+                    self._record(conn, sku, RECEIVE, stock, now=now)
+
+    @staticmethod
+    def _record(conn: sqlite3.Connection, sku: str, kind: str, quantity: int, maintenance_log_id: Optional[str] = None,
+                reservation_id: Optional[int] = None, open: bool = False, now: Optional[float] = None) -> int:
+        return conn.execute(
+            "INSERT INTO stock_movements (sku, kind, quantity, maintenance_log_id, reservation_id, open, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (sku, kind, quantity, maintenance_log_id, reservation_id, int(open), now or time.time()),
+        ).lastrowid
+
+    @staticmethod
+    def _check_quantity(quantity: int):
+        if not isinstance(quantity, int) or quantity <= 0:
+            raise InventoryError(f"Quantity must be a positive integer, got {quantity!r}")
+
+    @staticmethod
+    def _update(conn: sqlite3.Connection, sku: str, set_sql: str, params: tuple,
+                condition: str = "1", condition_params: tuple = ()) -> bool:
+        return conn.execute(
+            f"UPDATE inventory SET {set_sql}, version = version + 1, updated_at = ? WHERE sku = ? AND {condition}",
+            (*params, time.time(), sku, *condition_params),
+        ).rowcount == 1
+
+    def get(self, sku: str) -> Optional[Dict]:
+        row = self.conn.execute("SELECT * FROM inventory WHERE sku = ?", (sku,)).fetchone()
+        return to_stock(row) if row else None
+
+    def stock_levels(self, skus: List[str]) -> Dict[str, Dict]:
+        if not skus:
+            return {}
+        rows = self.conn.execute(
+            f"SELECT * FROM inventory WHERE sku IN ({', '.join('?' * len(skus))})", tuple(skus)
+        ).fetchall()
+        return {row["sku"]: to_stock(row) for row in rows}
+
+    def _require(self, conn: sqlite3.Connection, sku: str) -> sqlite3.Row:
+        row = conn.execute("SELECT * FROM inventory WHERE sku = ?", (sku,)).fetchone()
+        if row is None:
+            raise InventoryError(f"Unknown SKU '{sku}'")
+        return row
+
+    def receive(self, sku: str, quantity: int) -> Dict:
+        """Add delivered stock."""
+        self._check_quantity(quantity)
+        with self.transaction() as conn:
+            self._require(conn, sku)
+            self._update(conn, sku, "on_hand = on_hand + ?", (quantity,))
+            self._record(conn, sku, RECEIVE, quantity)
+            return to_stock(self._require(conn, sku))
+
+    def reserve(self, sku: str, quantity: int, maintenance_log_id: Optional[str] = None) -> int:
+        """
+        Set stock aside for a repair.
+
+        Returns:
+            int: Reservation id, passed to `consume` or `release`.
+
+        Raises:
+            InsufficientStock: If fewer than `quantity` units are available.
+        """
+        self._check_quantity(quantity)
+        with self.transaction() as conn:
+            row = self._require(conn, sku)
+            # 條件寫在 UPDATE 中，檢查與扣減是同一個動作
+            if not self._update(conn, sku, "reserved = reserved + ?", (quantity,), "on_hand - reserved >= ?", (quantity,)):
+                raise InsufficientStock(
+                    f"Only {row['on_hand'] - row['reserved']} of '{sku}' available, {quantity} requested"
+                )
+            return self._record(conn, sku, RESERVE, quantity, maintenance_log_id, open=True)
+
+    def _close_reservation(self, conn: sqlite3.Connection, reservation_id: int) -> sqlite3.Row:
+        reservation = conn.execute(
+            "SELECT * FROM stock_movements WHERE id = ? AND kind = ?", (reservation_id, RESERVE)
+        ).fetchone()
+        if reservation is None:
+            raise InventoryError(f"Unknown reservation {reservation_id}")
+        # open = 1 的條件確保同一筆預留只會被領用或取消一次
+        if conn.execute("UPDATE stock_movements SET open = 0 WHERE id = ? AND open = 1", (reservation_id,)).rowcount != 1:
+            raise InventoryError(f"Reservation {reservation_id} was already consumed or released")
+        return reservation
+
+    def consume(self, reservation_id: int) -> Dict:
+        """Take reserved stock out of the warehouse."""
+        with self.transaction() as conn:
+            reservation = self._close_reservation(conn, reservation_id)
+            sku, quantity = reservation["sku"], reservation["quantity"]
+            self._update(conn, sku, "on_hand = on_hand - ?, reserved = reserved - ?", (quantity, quantity))
+            self._record(conn, sku, CONSUME, quantity, reservation["maintenance_log_id"], reservation_id)
+            return to_stock(self._require(conn, sku))
+
+    def release(self, reservation_id: int) -> Dict:
+        """Return reserved stock to the available stock."""
+        with self.transaction() as conn:
+            reservation = self._close_reservation(conn, reservation_id)
+            sku, quantity = reservation["sku"], reservation["quantity"]
+            self._update(conn, sku, "reserved = reserved - ?", (quantity,))
+            self._record(conn, sku, RELEASE, quantity, reservation["maintenance_log_id"], reservation_id)
+            return to_stock(self._require(conn, sku))
+
+    def take(self, sku: str, quantity: int, maintenance_log_id: Optional[str] = None) -> Dict:
+        """Reserve and consume in one transaction, for parts taken immediately."""
+        self._check_quantity(quantity)
+        with self.transaction() as conn:
+            row = self._require(conn, sku)
+            if not self._update(conn, sku, "on_hand = on_hand - ?", (quantity,), "on_hand - reserved >= ?", (quantity,)):
+                raise InsufficientStock(
+                    f"Only {row['on_hand'] - row['reserved']} of '{sku}' available, {quantity} requested"
+                )
+            self._record(conn, sku, CONSUME, quantity, maintenance_log_id)
+            return to_stock(self._require(conn, sku))
+
+    def adjust(self, sku: str, on_hand: int, expected_version: int) -> Dict:
+        """
+        Set the counted stock of a SKU, if it has not changed since it was read.
+
+        Raises:
+            VersionConflict: If the row version is no longer `expected_version`.
+        """
+        if on_hand < 0:
+            raise InventoryError(f"Stock cannot be negative, got {on_hand}")
+        with self.transaction() as conn:
+            row = self._require(conn, sku)
+            if on_hand < row["reserved"]:
+                raise InventoryError(f"Stock {on_hand} of '{sku}' is below the {row['reserved']} reserved units")
+            if not self._update(conn, sku, "on_hand = ?", (on_hand,), "version = ?", (expected_version,)):
+                raise VersionConflict(f"'{sku}' changed (version {row['version']}, expected {expected_version})")
+            self._record(conn, sku, ADJUST, on_hand - row["on_hand"])
+            return to_stock(self._require(conn, sku))
+
+    def update_with_retry(self, sku: str, change, retries: int = VERSION_RETRIES) -> Dict:
+        """
+        Read-modify-write with optimistic concurrency: `change(stock)` returns the new
+        on-hand count, and is called again on the fresh row after a version conflict.
+        """
+        for attempt in range(retries):
+            stock = self.get(sku)
+            if stock is None:
+                raise InventoryError(f"Unknown SKU '{sku}'")
+            try:
+                return self.adjust(sku, change(stock), stock["Version"])
+            except VersionConflict:
+                if attempt == retries - 1:
+                    raise
+        raise VersionConflict(f"'{sku}' kept changing")
+
+    def low_stock(self, limit: int = 50) -> List[Dict]:
+        """SKUs whose available stock is at or below their reorder level, lowest first."""
+        rows = self.conn.execute(
+            "SELECT * FROM inventory WHERE on_hand - reserved <= reorder_level ORDER BY on_hand - reserved LIMIT ?",
+            (limit,),
+        ).fetchall()
+        return [to_stock(row) for row in rows]
+
+    def movements(self, sku: Optional[str] = None, maintenance_log_id: Optional[str] = None,
+                  limit: int = 50) -> List[Dict]:
+        """Latest stock movements of a SKU and/or a maintenance log entry."""
+        clauses, params = [], []
+        if sku is not None:
+            clauses.append("sku = ?")
+            params.append(sku)
+        if maintenance_log_id is not None:
+            clauses.append("maintenance_log_id = ?")
+            params.append(maintenance_log_id)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self.conn.execute(
+            f"SELECT * FROM stock_movements {where} ORDER BY id DESC LIMIT ?", (*params, limit)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+def to_stock(row: sqlite3.Row) -> Dict:
+    return {
+        "SKU": row["sku"],
+        "On Hand": row["on_hand"],
+        "Reserved": row["reserved"],
+        "Available": row["on_hand"] - row["reserved"],
+        "Reorder Level": row["reorder_level"],
+        "Version": row["version"],
+    }
+
+_warehouse: Optional[Warehouse] = None
+_warehouse_lock = threading.Lock()
+
+def get_warehouse() -> Warehouse:
+    """The process-wide warehouse, seeded from components.csv on first use."""
+    global _warehouse
+    with _warehouse_lock:
+        if _warehouse is None:
+            _warehouse = Warehouse()
+        return _warehouse
+
+def _load_test_worker(args) -> Dict[str, int]:
+    # 負載測試的子行程；定義在模組層級，spawn 啟動的子行程才能匯入
+    db_path, seed, skus, operations = args
+    rng = random.Random(seed)
+    warehouse = Warehouse(db_path, seed_csv=None)
+    counts = {"ok": 0, "insufficient": 0, "increments": 0}
+    for _ in range(operations):
+        sku = rng.choice(skus)
+        try:
+            action = rng.random()
+            if action < 0.5:
+                reservation_id = warehouse.reserve(sku, rng.randint(1, 5), f"LOG-{seed}")
+                (warehouse.consume if rng.random() < 0.8 else warehouse.release)(reservation_id)
+            elif action < 0.75:
+                warehouse.take(sku, rng.randint(1, 3), f"LOG-{seed}")
+            elif action < 0.9:
+                warehouse.receive(sku, rng.randint(1, 10))
+            else:
+                # 讀取後再寫回，版本衝突時重新讀取
+                warehouse.update_with_retry(sku, lambda stock: stock["On Hand"] + 1, retries=100)
+                counts["increments"] += 1
+            counts["ok"] += 1
+        except InsufficientStock:
+            counts["insufficient"] += 1
+    return counts
+
+if __name__ == "__main__":
+    # python -m agent.tools.ware_house
+    # 多個行程同時預留、領用、取消與盤點同一批零件，最後核對庫存與異動紀錄是否一致
+    import tempfile
+    from multiprocessing import Pool
+
+    WORKERS = 8
+    OPERATIONS = 300
+    SKUS = [f"LOAD-{i}" for i in range(4)]
+    INITIAL_STOCK = 500
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = Path(tmp_dir) / "warehouse.db"
+        warehouse = Warehouse(db_path, seed_csv=None)
+        with warehouse.transaction() as conn:
+            for sku in SKUS:
+                conn.execute("INSERT INTO inventory (sku, on_hand, updated_at) VALUES (?, ?, ?)",
+                             (sku, INITIAL_STOCK, time.time()))
+                warehouse._record(conn, sku, RECEIVE, INITIAL_STOCK)
+
+        start_time = time.perf_counter()
+        with Pool(WORKERS) as pool:
+            results = pool.map(_load_test_worker, [(db_path, seed, SKUS, OPERATIONS) for seed in range(WORKERS)])
+        elapsed = time.perf_counter() - start_time
+        total = {key: sum(result[key] for result in results) for key in results[0]}
+        print(f"{WORKERS} processes x {OPERATIONS} operations in {elapsed:.2f}s "
+              f"({WORKERS * OPERATIONS / elapsed:.0f} ops/s): {total}")
+
+        conn = warehouse.conn
+        consistent = True
+        for sku in SKUS:
+            stock = warehouse.get(sku)
+            expected = conn.execute(
+                "SELECT COALESCE(SUM(CASE kind WHEN ? THEN quantity WHEN ? THEN quantity WHEN ? THEN -quantity "
+                "ELSE 0 END), 0) FROM stock_movements WHERE sku = ?",
+                (RECEIVE, ADJUST, CONSUME, sku),
+            ).fetchone()[0]
+            open_reserved = conn.execute(
+                "SELECT COALESCE(SUM(quantity), 0) FROM stock_movements WHERE sku = ? AND kind = ? AND open = 1",
+                (sku, RESERVE),
+            ).fetchone()[0]
+            ok = stock["On Hand"] == expected and stock["Reserved"] == open_reserved
+            consistent &= ok
+            print(f"  {sku}: on hand {stock['On Hand']} (movements {expected}), "
+                  f"reserved {stock['Reserved']} (open {open_reserved}) {'OK' if ok else 'MISMATCH'}")
+        print("No lost updates" if consistent else "Lost updates detected")
+        print("Low stock:", [stock["SKU"] for stock in warehouse.low_stock()])
+        plan = conn.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM inventory WHERE on_hand - reserved <= reorder_level "
+            "ORDER BY on_hand - reserved"
+        ).fetchall()
+        print("Low stock query plan:", [row[-1] for row in plan])
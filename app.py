@@ -1,48 +1,106 @@
-from flask import Flask, request, abort
-from dotenv import load_dotenv
-import os 
-from pathlib import Path
+from server.startup import report, lazy_import, Preloader
+from server.limiter import SharedRunCoordinator, COALESCED, RATE_LIMITED
+from server.image_batcher import ImageBatcher
+
+with report.timed("import flask"):
+    from flask import Flask, request, abort, jsonify
+    from dotenv import load_dotenv
+    import os 
+    import shutil
+    from pathlib import Path
 
 ROOT = Path(__file__).resolve().parents[0]
 load_dotenv()
 CHANNEL_ACCESS_TOKEN = os.getenv("CHANNEL_ACCESS_TOKEN")
 CHANNEL_SECRET = os.getenv("CHANNEL_SECRET")
 
-from linebot.v3 import (
-    WebhookHandler
-)
-from linebot.v3.exceptions import (
-    InvalidSignatureError
-)
-from linebot.v3.messaging import (
-    Configuration,
-    ApiClient,
-    MessagingApi,
-    MessagingApiBlob,
-    ReplyMessageRequest,
-    TextMessage
-)
-from linebot.v3.webhooks import (
-    MessageEvent,
-    TextMessageContent,
-    ImageMessageContent
-)
+with report.timed("import linebot"):
+    from linebot.v3 import (
+        WebhookHandler
+    )
+    from linebot.v3.exceptions import (
+        InvalidSignatureError
+    )
+    from linebot.v3.messaging import (
+        Configuration,
+        ApiClient,
+        MessagingApi,
+        MessagingApiBlob,
+        ReplyMessageRequest,
+        TextMessage
+    )
+    from linebot.v3.webhooks import (
+        MessageEvent,
+        TextMessageContent,
+        ImageMessageContent
+    )
 
 app = Flask(__name__)
 
 configuration = Configuration(access_token=CHANNEL_ACCESS_TOKEN)
 handler = WebhookHandler(CHANNEL_SECRET)
 
-from agent.agent_main import get_agent_answer
-from sqlite.fetch import save_data, get_history
+# 重量級模組 (langgraph、torch、ultralytics) 於第一次使用或預載時才匯入
+agent_main = lazy_import("agent.agent_main")
+detect = lazy_import("vision.detect")
+with report.timed("import sqlite.fetch"):
+    from sqlite.fetch import save_data, get_history
 
 DB_PATH = ROOT / "sqlite" / "conversations.db"
-
-from vision.detect import default_detect, clean_folder
+# 建立資料表並套用尚未執行的遷移 (gunicorn preload 時只在 master 執行一次)
+with report.timed("initialize conversation database"):
+    from sqlite.create_db import initialize_database, sql_file_path
+    initialize_database(DB_PATH, sql_file_path)
 
 VISION_PATH = ROOT / "vision"
 IMAGES_PATH = VISION_PATH / "images"
-YOLO_RESULT_PATH = VISION_PATH / "runs"
+
+def preload_retrieval():
+    from rag.retriever import get_backend  # 與 agent tools 相同的模組路徑，共用同一個 backend
+    get_backend().preload()
+
+# 預載順序：agent 與 RAG 模組、embedding 模型與索引、YOLO 模型
+preloader = Preloader([
+    ("import agent.agent_main", agent_main.load),
+    ("load retrieval indexes", preload_retrieval),
+    ("import vision.detect", detect.load),
+    ("load yolo model", lambda: detect.get_model()),
+])
+# APP_PRELOAD: background (預設，背景載入)、sync (匯入時載入完成)、off (第一次請求時才載入)
+PRELOAD_MODE = os.getenv("APP_PRELOAD", "background")
+if PRELOAD_MODE == "sync":
+    preloader.run()
+elif PRELOAD_MODE == "background":
+    preloader.start()
+
+# 每位使用者的回合額度、全域同時執行上限與連發訊息合併，狀態存於 server/run_state.db 由所有 worker 共用
+coordinator = SharedRunCoordinator(dumps=lambda event: event.to_json(), loads=MessageEvent.from_json)
+RATE_LIMITED_REPLY = "訊息太頻繁，請稍後再試。"
+BUSY_REPLY = "目前使用人數眾多，請稍後再試。"
+
+@app.route("/healthz", methods=['GET'])
+def healthz():
+    # 程序存活即可，不等待模型載入
+    return jsonify(status="ok")
+
+@app.route("/readyz", methods=['GET'])
+def readyz():
+    status = preloader.status()
+    return jsonify(status), 200 if status["ready"] else 503
+
+@app.route("/metrics", methods=['GET'])
+def metrics():
+    # 計數為回應此請求的 worker 行程自己的統計
+    return jsonify(coordinator.metrics.snapshot())
+
+def reply_text(api_client, reply_token: str, text: str):
+    line_bot_api = MessagingApi(api_client)
+    line_bot_api.reply_message_with_http_info(
+        ReplyMessageRequest(
+            reply_token=reply_token,
+            messages=[TextMessage(text=text)]
+        )
+    )
 
 @app.route("/callback", methods=['POST'])
 def callback():
@@ -65,76 +123,118 @@ def callback():
 
 @handler.add(MessageEvent, message=TextMessageContent)
 def handle_message(event):
-    with ApiClient(configuration) as api_client:
+    user_id = event.source.user_id
+    decision = coordinator.submit(user_id, event)
+    if decision == COALESCED:
+        # 使用者的上一則訊息仍在處理中，這則訊息會在同一個 handler 的下一回合一起回答
+        return
 
-        # Get the conversation history
-        history = get_history(user_id=event.source.user_id, limit=5)
-
-        # Get the user's question and the agent's response
-        question = event.message.text
-        response = get_agent_answer(question=question, history=history)
+    with ApiClient(configuration) as api_client:
+        if decision == RATE_LIMITED:
+            reply_text(api_client, event.reply_token, RATE_LIMITED_REPLY)
+            return
+
+        batch = [event]
+        try:
+            while batch:
+                answer_messages(api_client, batch)
+                batch = coordinator.next_batch(user_id)
+        except Exception:
+            coordinator.abandon(user_id)
+            raise
+
+def answer_messages(api_client, events):
+    """Answer one or more consecutive text messages of a user with a single agent turn."""
+    user_id = events[-1].source.user_id
+    # 以最後一則訊息的 reply token 回覆，較早的 token 可能已接近失效
+    reply_token = events[-1].reply_token
+
+    # Get the conversation history
+    history = get_history(user_id=user_id, limit=5)
+
+    # Get the user's question and the agent's response
+    question = "\n".join(event.message.text for event in events)
+    try:
+        with coordinator.run_slot():
+            response = agent_main.get_agent_answer(question=question, history=history)
+    except TimeoutError:
+        reply_text(api_client, reply_token, BUSY_REPLY)
+        return
 
-        # Save the conversation to the database
-        user_message = {
-            'user_message': question,
-            'user_id': event.source.user_id,
-            'timestamp': event.timestamp
-        }
-        agent_message = {'agent_message': response}
-        save_data(user=user_message, agent=agent_message, db_path=DB_PATH)
+    # Save the conversation to the database
+    user_message = {
+        'user_message': question,
+        'user_id': user_id,
+        'timestamp': events[-1].timestamp
+    }
+    agent_message = {'agent_message': response}
+    save_data(user=user_message, agent=agent_message, db_path=DB_PATH)
 
-        line_bot_api = MessagingApi(api_client)
-        line_bot_api.reply_message_with_http_info(
-            ReplyMessageRequest(
-                reply_token=event.reply_token,
-                messages=[TextMessage(text=response)]
-            )
-        )
+    reply_text(api_client, reply_token, response)
 
 
 @handler.add(MessageEvent, message= ImageMessageContent)
 def handle_image_message(event):
-     with ApiClient(configuration) as api_client:
-
-        # 清空 images 資料夾
-        clean_folder(IMAGES_PATH)
-        # 清空 YOLO_RESULT_PATH 資料夾
-        clean_folder(YOLO_RESULT_PATH)
-
-        # 從LINE取得圖片並儲存至本地
-        line_bot_blob_api = MessagingApiBlob(api_client)
-        message_content = line_bot_blob_api.get_message_content(message_id=event.message.id)
-        save_dir = IMAGES_PATH / f"{event.message.id}.jpg"
-        with open(save_dir, "wb") as img_file:
-            img_file.write(message_content)
+    # 同一位使用者一次傳送的多張圖片 (相簿或連續傳送) 收集成一批，由 answer_images 以一次偵測與一次 agent 回合回答
+    image_set = event.message.image_set
+    image_batcher.add(
+        event.source.user_id, event,
+        set_id=image_set.id if image_set else None,
+        set_total=image_set.total if image_set else None,
+    )
+
+def answer_images(user_id: str, events):
+    """Run one detection over a user's batch of images and answer it with a single agent turn."""
+    # 以最後一張圖片的 reply token 回覆，較早的 token 可能已接近失效
+    reply_token = events[-1].reply_token
+    with ApiClient(configuration) as api_client:
 
-        # 執行物件偵測取得物件數量
-        detect_result = default_detect()
+        if not coordinator.allow(user_id):
+            reply_text(api_client, reply_token, RATE_LIMITED_REPLY)
+            return
+
+        # 每一批圖片使用自己的資料夾，同時處理的批次不會互相清除
+        batch_path = IMAGES_PATH / f"{user_id}-{events[0].message.id}"
+        batch_path.mkdir(parents=True, exist_ok=True)
+        try:
+            # 從LINE取得圖片並儲存至本地
+            line_bot_blob_api = MessagingApiBlob(api_client)
+            for event in events:
+                message_content = line_bot_blob_api.get_message_content(message_id=event.message.id)
+                with open(batch_path / f"{event.message.id}.jpg", "wb") as img_file:
+                    img_file.write(message_content)
+
+            # 執行物件偵測取得所有圖片的物件數量
+            detect_result = detect.default_detect(batch_path, save=False)
+        finally:
+            shutil.rmtree(batch_path, ignore_errors=True)
 
         # LLM 回復訊息
         # Get the conversation history
-        history = get_history(user_id=event.source.user_id, limit=5)
+        history = get_history(user_id=user_id, limit=5)
 
         # Get the user's question and the agent's response
-        question = "圖片內出現以下內容"+ str(detect_result) + "系統提示: 請看使用者需要什麼服務並提供相關資訊，請不要隨意執行未經要求之任務"
-        response = get_agent_answer(question=question, history=history)
+        images_note = f"(共 {len(events)} 張圖片)" if len(events) > 1 else ""
+        question = "圖片內出現以下內容"+ images_note + str(detect_result) + "系統提示: 請看使用者需要什麼服務並提供相關資訊，請不要隨意執行未經要求之任務"
+        try:
+            with coordinator.run_slot():
+                response = agent_main.get_agent_answer(question=question, history=history)
+        except TimeoutError:
+            reply_text(api_client, reply_token, BUSY_REPLY)
+            return
 
         # Save the conversation to the database
         user_message = {
             'user_message': question,
-            'user_id': event.source.user_id,
-            'timestamp': event.timestamp
+            'user_id': user_id,
+            'timestamp': events[-1].timestamp
         }
         agent_message = {'agent_message': response}
         save_data(user=user_message, agent=agent_message, db_path=DB_PATH)
 
-        line_bot_api = MessagingApi(api_client)
-        line_bot_api.reply_message_with_http_info(
-            ReplyMessageRequest(
-                reply_token=event.reply_token,
-                messages=[TextMessage(text=response)]
-            )
-        )
+        reply_text(api_client, reply_token, response)
+
+image_batcher = ImageBatcher(answer_images)
 
 if __name__ == "__main__":
     app.run()
\ No newline at end of file
@@ -0,0 +1,52 @@
+from pathlib import Path
+from datetime import datetime
+import tempfile
+import argparse
+import sys
+# python -m evaluation.bench_chunking ship_law ship_safety
+FILE = Path(__file__).resolve()
+PROJECT_ROOT = FILE.parents[1]
+EVAL_ROOT = PROJECT_ROOT / "evaluation"
+
+sys.path.insert(0, str(PROJECT_ROOT))  # for import modules
+from evaluation.bench_retrieval import (
+    RESULTS_PATH, RECALL_AT, load_questions, benchmark_corpus, print_results
+)
+from evaluation.records import append_jsonl
+
+# 比較的切分設定 (名稱, chunk_size, chunk_overlap, chunk_unit)
+CHUNK_CONFIGS = [
+    ("char1000_no_overlap", 1000, 0, "char"),
+    ("char1000_overlap100", 1000, 100, "char"),
+    ("char500_overlap50", 500, 50, "char"),
+    ("token256_overlap32", 256, 32, "token"),
+]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare chunk counts and retrieval recall of chunking settings.")
+    parser.add_argument("datasets", nargs="*", default=["ship_law", "ship_safety"],
+                        help="dataset folder names under evaluation/dataset")
+    parser.add_argument("--k", type=int, default=max(RECALL_AT), help="documents retrieved per question")
+    parser.add_argument("--config", nargs="+", choices=[config[0] for config in CHUNK_CONFIGS],
+                        default=[config[0] for config in CHUNK_CONFIGS])
+    args = parser.parse_args()
+
+    results = []
+    questions_by_corpus = load_questions(args.datasets)
+    with tempfile.TemporaryDirectory(prefix="bench_chunking_", ignore_cleanup_errors=True) as tmp_dir:
+        for name, chunk_size, chunk_overlap, chunk_unit in CHUNK_CONFIGS:
+            if name not in args.config:
+                continue
+            for corpus, questions in questions_by_corpus.items():
+                print(f"Benchmarking {corpus} with {name} ({len(questions)} questions)...")
+                for result in benchmark_corpus(
+                    corpus, questions, Path(tmp_dir) / f"{corpus}_{name}", args.k, modes=["dense", "hybrid"],
+                    chunk_size=chunk_size, chunk_overlap=chunk_overlap, chunk_unit=chunk_unit,
+                ):
+                    results.append({"chunking": name, **result})
+
+    print_results(results)
+    run_info = {"label": "chunking", "time": datetime.now().isoformat(timespec="seconds"), "k": args.k}
+    for result in results:
+        append_jsonl(RESULTS_PATH, {**run_info, **result})
+    print(f"Results appended to {RESULTS_PATH}")
@@ -0,0 +1,234 @@
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+from datetime import datetime
+import tempfile
+import argparse
+import string
+import json
+import time
+import sys
+# python -m evaluation.bench_retrieval --label baseline
+FILE = Path(__file__).resolve()
+PROJECT_ROOT = FILE.parents[1]
+EVAL_ROOT = PROJECT_ROOT / "evaluation"
+DATASET_ROOT = EVAL_ROOT / "dataset"
+DOCUMENTS_ROOT = PROJECT_ROOT / "agent" / "documents"
+RESULTS_PATH = EVAL_ROOT / "bench_results.jsonl"
+
+sys.path.insert(0, str(PROJECT_ROOT))  # for import modules
+from langchain_chroma import Chroma
+from langchain_core.documents.base import Document
+from agent.rag.load import pdf_loader
+from agent.rag.rag_process import get_embeddings, hybrid_search
+from agent.rag.bm25 import BM25Index
+from agent.rag.compact_store import CompactVectorStore, COMPACT_DTYPES
+from evaluation.records import append_jsonl
+
+# dataset 資料夾名稱 -> 要查詢的文件庫 (agent/documents 下的資料夾)
+DATASET_CORPUS = {
+    "ship_law": "law",
+    "ship_safety": "law",
+    "ship_accident_report1": "system",
+    "ship_accident_report2": "system",
+}
+RECALL_AT = (1, 3, 5, 10)
+# int8 / float16 為 compact_store 的量化向量 dense 查詢 (float16 重新計分)
+SEARCH_MODES = ("dense", "hybrid", *COMPACT_DTYPES)
+# 正確答案的字元 bigram 有多少比例出現在 chunk 內才視為「包含答案」的 chunk
+ANSWER_COVERAGE_THRESHOLD = 0.5
+
+SearchFn = Callable[[str, int], List[Document]]
+
+_PUNCTUATION = set(string.punctuation + string.whitespace + "，。、；：？！「」『』（）《》〈〉…—．・")
+
+def normalize(text: str) -> str:
+    """移除空白與標點符號，讓 PDF 斷行或全半形差異不影響比對。"""
+    return "".join(ch for ch in text.lower() if ch not in _PUNCTUATION)
+
+def char_bigrams(text: str) -> set:
+    text = normalize(text)
+    if len(text) < 2:
+        return {text} if text else set()
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+def answer_coverage(answer: str, chunk: str) -> float:
+    """正確答案的字元 bigram 出現在 chunk 中的比例。"""
+    answer_grams = char_bigrams(answer)
+    if not answer_grams:
+        return 0.0
+    return len(answer_grams & char_bigrams(chunk)) / len(answer_grams)
+
+def load_questions(dataset_names: List[str]) -> Dict[str, List[Tuple[str, str]]]:
+    """
+    讀取 dataset.json，依文件庫分組題目。
+
+    :param dataset_names: evaluation/dataset 下的資料夾名稱
+    :return: 文件庫名稱 -> [(question, answer)]
+    """
+    questions = {}
+    for name in dataset_names:
+        with open(DATASET_ROOT / name / "dataset.json", "r", encoding="utf-8") as f:
+            items = json.load(f)
+        questions.setdefault(DATASET_CORPUS[name], []).extend(
+            (item["question"], item["answer"]) for item in items if item.get("question")
+        )
+    return questions
+
+def directory_size(path: Path) -> int:
+    """資料夾內所有檔案的總大小 (bytes)。"""
+    return sum(file.stat().st_size for file in path.rglob("*") if file.is_file())
+
+def percentile(values: List[float], p: float) -> float:
+    """線性插值的百分位數。"""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    rank = (len(values) - 1) * p / 100
+    low = int(rank)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (rank - low)
+
+def build_index(corpus: str, db_path: Path, **chunk_options) -> Tuple[Chroma, BM25Index, Dict]:
+    """
+    以目前 (或指定) 的切分設定重新建立文件庫的向量資料庫與 BM25 索引，並記錄建立時間與大小。
+
+    :param corpus: agent/documents 下的資料夾名稱
+    :param db_path: 新資料庫的存放位置
+    :param chunk_options: 傳給 pdf_loader 的 chunk_size / chunk_overlap / chunk_unit
+    :return: 向量資料庫、BM25 索引與建立統計
+    """
+    embeddings = get_embeddings()
+
+    start_time = time.perf_counter()
+    docs = pdf_loader(DOCUMENTS_ROOT / corpus, **chunk_options)
+    load_seconds = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    vectorstore = Chroma.from_documents(documents=docs, embedding=embeddings, persist_directory=str(db_path))
+    embed_seconds = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    bm25 = BM25Index()
+    bm25.add_documents(docs)
+    bm25_seconds = time.perf_counter() - start_time
+
+    return vectorstore, bm25, {
+        "chunks": len(docs),
+        "avg_chunk_chars": round(sum(len(doc.page_content) for doc in docs) / max(len(docs), 1), 1),
+        "load_seconds": round(load_seconds, 2),
+        "embed_seconds": round(embed_seconds, 2),
+        "bm25_seconds": round(bm25_seconds, 2),
+        "index_bytes": directory_size(db_path),
+    }
+
+def run_queries(search: SearchFn, questions: List[Tuple[str, str]], max_k: int) -> Dict:
+    """
+    執行所有題目並計算 recall@k、MRR 與查詢延遲。
+
+    recall@k 為前 k 筆結果中至少有一個包含答案的 chunk 的題目比例，
+    MRR 以第一個包含答案的 chunk 的名次計算 (max_k 內找不到為 0)。
+
+    :param search: (question, k) -> 文件列表
+    :param questions: [(question, answer)]
+    :param max_k: 每題取回的文件數
+    :return: 評估結果，沒有題目時只有 queries = 0
+    """
+    if not questions:
+        return {"queries": 0}
+    search(questions[0][0], max_k)  # warm up，避免第一次查詢的模型加載影響延遲
+
+    latencies, first_hits = [], []
+    for question, answer in questions:
+        start_time = time.perf_counter()
+        docs = search(question, max_k)
+        latencies.append((time.perf_counter() - start_time) * 1000)
+
+        first_hit = None
+        for rank, doc in enumerate(docs, start=1):
+            if answer_coverage(answer, doc.page_content) >= ANSWER_COVERAGE_THRESHOLD:
+                first_hit = rank
+                break
+        first_hits.append(first_hit)
+
+    total = len(questions)
+    result = {
+        f"recall@{k}": round(sum(1 for hit in first_hits if hit and hit <= k) / total, 4)
+        for k in RECALL_AT if k <= max_k
+    }
+    result["mrr"] = round(sum(1 / hit for hit in first_hits if hit) / total, 4)
+    result.update({
+        "queries": total,
+        "latency_p50_ms": round(percentile(latencies, 50), 2),
+        "latency_p95_ms": round(percentile(latencies, 95), 2),
+        "latency_p99_ms": round(percentile(latencies, 99), 2),
+    })
+    return result
+
+def benchmark_corpus(
+    corpus: str,
+    questions: List[Tuple[str, str]],
+    db_path: Path,
+    max_k: int,
+    modes: List[str] = SEARCH_MODES,
+    **chunk_options
+) -> List[Dict]:
+    """
+    建立單一文件庫的索引，並以每種查詢模式執行評估。
+    vector_bytes 為查詢時載入的向量大小 (量化模式含重新計分用的向量)，disk_bytes 為索引佔用的磁碟空間 (量化模式為 Chroma 資料庫加上 compact store)，
+    用來比較量化模式的 recall 與記憶體、磁碟取捨。
+    """
+    vectorstore, bm25, build_stats = build_index(corpus, db_path, **chunk_options)
+
+    searches = {
+        "dense": lambda question, k: vectorstore.similarity_search(question, k=k),
+        "hybrid": lambda question, k: hybrid_search(vectorstore, bm25, question, k=k, fetch_k=max(2 * k, 20)),
+    }
+    chroma_bytes = directory_size(db_path)
+    vector_bytes = {}
+    disk_bytes = {"dense": chroma_bytes, "hybrid": chroma_bytes}
+    for dtype in COMPACT_DTYPES:
+        if dtype in modes:
+            store_path = db_path.parent / f"{db_path.name}_{dtype}"
+            CompactVectorStore.from_chroma(vectorstore, store_path, dtype)
+            store = CompactVectorStore(store_path, get_embeddings(), vectorstore)
+            searches[dtype] = store.similarity_search
+            vector_bytes[dtype] = store.nbytes
+            disk_bytes[dtype] = chroma_bytes + store.disk_bytes
+            # float32 向量的大小作為 Chroma 模式的基準
+            vector_bytes["dense"] = vector_bytes["hybrid"] = len(store) * int(store.vectors.shape[1]) * 4
+
+    return [
+        {
+            "corpus": corpus, "mode": mode, **build_stats, "vector_bytes": vector_bytes.get(mode, ""),
+            "disk_bytes": disk_bytes.get(mode, ""),
+            **run_queries(searches[mode], questions, max_k),
+        }
+        for mode in modes
+    ]
+
+def print_results(results: List[Dict]):
+    columns = list(dict.fromkeys(key for result in results for key in result))
+    print("\t".join(columns))
+    for result in results:
+        print("\t".join(str(result.get(column, "")) for column in columns))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark retrieval quality and latency of the RAG corpora.")
+    parser.add_argument("datasets", nargs="*", default=list(DATASET_CORPUS),
+                        help="dataset folder names under evaluation/dataset")
+    parser.add_argument("--k", type=int, default=max(RECALL_AT), help="documents retrieved per question")
+    parser.add_argument("--mode", nargs="+", choices=SEARCH_MODES, default=list(SEARCH_MODES))
+    parser.add_argument("--label", default="", help="name of this run in bench_results.jsonl")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="bench_retrieval_", ignore_cleanup_errors=True) as tmp_dir:
+        for corpus, questions in load_questions(args.datasets).items():
+            print(f"Benchmarking {corpus} ({len(questions)} questions)...")
+            results.extend(benchmark_corpus(corpus, questions, Path(tmp_dir) / corpus, args.k, args.mode))
+
+    print_results(results)
+    run_info = {"label": args.label, "time": datetime.now().isoformat(timespec="seconds"), "k": args.k}
+    for result in results:
+        append_jsonl(RESULTS_PATH, {**run_info, **result})
+    print(f"Results appended to {RESULTS_PATH}")
@@ -1,22 +1,66 @@
+import argparse
+import sys
 import pandas as pd
+from pathlib import Path
+from typing import Dict, Iterable
 
-# 設定數據
-data = {
-    "類別": ["船舶法", "船舶安全營運與防止污染管理規則", "天王星客船", "臺馬之星客貨船", "總數"],
-    "count": [69.0, 35.0, 20.0, 20.0, 144.0],
-    "mean": [0.943429, 0.930177, 0.724885, 0.743485, 0.882085],
-    "std": [0.029764, 0.031388, 0.087083, 0.090331, 0.10617],
-    "min": [0.8636, 0.8445, 0.4982, 0.5605, 0.4982],
-    "25%": [0.9244, 0.91315, 0.652175, 0.69035, 0.8443],
-    "50%": [0.9439, 0.9326, 0.75415, 0.722, 0.9265],
-    "75%": [0.9707, 0.9476, 0.778925, 0.82065, 0.952125],
-    "max": [0.989, 0.9815, 0.8559, 0.9119, 0.989],
+# python -m evaluation.csv_save
+FILE = Path(__file__).resolve()
+PROJECT_ROOT = FILE.parents[1]
+EVAL_ROOT = PROJECT_ROOT / "evaluation"
+DATASET_ROOT = EVAL_ROOT / "dataset"
+OUTPUT_PATH = EVAL_ROOT / "similarity_data.csv"
+
+sys.path.insert(0, str(PROJECT_ROOT))  # for import modules
+from evaluation.records import load_records
+
+# dataset 資料夾名稱 -> 報表類別名稱
+DATASET_LABELS = {
+    "ship_law": "船舶法",
+    "ship_safety": "船舶安全營運與防止污染管理規則",
+    "ship_accident_report2": "天王星客船",
+    "ship_accident_report1": "臺馬之星客貨船",
 }
+TOTAL_LABEL = "總數"
+
+def describe_similarity(scores: Dict[str, Iterable[float]]) -> pd.DataFrame:
+    """
+    計算各類別與總數的 con_sim 統計數據 (pandas describe)。
+
+    :param scores: 類別名稱 -> con_sim 數值
+    :return: 每列為一個類別，最後一列為所有類別合併的統計
+    """
+    series = {label: pd.Series(list(values), dtype=float) for label, values in scores.items()}
+    rows = {label: values.describe() for label, values in series.items()}
+    if series:
+        rows[TOTAL_LABEL] = pd.concat(series.values(), ignore_index=True).describe()
+
+    df = pd.DataFrame(rows).T
+    df.index.name = "類別"
+    return df.reset_index()
+
+def save_similarity_csv(stats: pd.DataFrame, output_path: Path = OUTPUT_PATH):
+    """將統計數據存成 CSV (utf-8-sig 以便 Excel 開啟)。"""
+    stats.to_csv(output_path, index=False, encoding="utf-8-sig")
+    print(f"CSV 檔案 '{output_path}' 已成功儲存！")
 
-# 建立 DataFrame
-df = pd.DataFrame(data)
+def load_scores(dataset_name: str) -> list:
+    """讀取 dataset 的 responses_with_sim (.jsonl 優先) 中的 con_sim。"""
+    dataset_root = DATASET_ROOT / dataset_name
+    for name in ("responses_with_sim.jsonl", "responses_with_sim.json"):
+        if (dataset_root / name).exists():
+            return [item["con_sim"] for item in load_records(dataset_root / name) if "con_sim" in item]
+    print(f"⚠️ Warning: {dataset_root} 沒有相似度結果，跳過。")
+    return []
 
-# 儲存 CSV 檔案
-df.to_csv("similarity_data.csv", index=False, encoding="utf-8-sig")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write similarity statistics of scored datasets to CSV.")
+    parser.add_argument("datasets", nargs="*", default=list(DATASET_LABELS),
+                        help="dataset folder names under evaluation/dataset")
+    parser.add_argument("--output", type=Path, default=OUTPUT_PATH)
+    args = parser.parse_args()
 
-print("CSV 檔案 'similarity_data.csv' 已成功儲存！")
+    scores = {DATASET_LABELS.get(name, name): load_scores(name) for name in args.datasets}
+    stats = describe_similarity({label: values for label, values in scores.items() if values})
+    print(stats)
+    save_similarity_csv(stats, args.output)
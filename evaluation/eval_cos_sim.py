@@ -1,27 +1,139 @@
+import sys
 import json
+import hashlib
+import argparse
+import numpy as np
 from pathlib import Path
-from sentence_transformers import SentenceTransformer, util
+from typing import Dict, List, Optional
+from sentence_transformers import SentenceTransformer
 
-# python -m evaluation.generate_response
+# python -m evaluation.eval_cos_sim
 FILE = Path(__file__).resolve()
 PROJECT_ROOT = FILE.parents[1]
-EVAL_ROOT = PROJECT_ROOT / "evaluation" 
+EVAL_ROOT = PROJECT_ROOT / "evaluation"
 DATASET_ROOT = EVAL_ROOT / "dataset"
 SHIP_SAFETY_ROOT = DATASET_ROOT  / "ship_safety"
 SHIP_LAW_ROOT = DATASET_ROOT / "ship_law"
 SHIP_ACCIDENT_REPORT1 = DATASET_ROOT / "ship_accident_report1"
 SHIP_ACCIDENT_REPORT2 = DATASET_ROOT / "ship_accident_report2"
 
-def compute_similarity(dataset_path: Path, response_path: Path, output_path: Path):
+sys.path.insert(0, str(PROJECT_ROOT))  # for import modules
+from evaluation.records import load_records
+
+# 預訓練模型 (IBM Granite)
+MODEL_PATH = "ibm-granite/granite-embedding-278m-multilingual"
+# 正確答案的向量快取，存放於各 dataset 資料夾
+EMBEDDING_CACHE_NAME = "answer_embeddings.npz"
+BATCH_SIZE = 32
+
+def load_model(model_path: str = MODEL_PATH) -> SentenceTransformer:
+    """加載相似度計算使用的 SentenceTransformer 模型。"""
+    return SentenceTransformer(model_path)
+
+def encode(model: SentenceTransformer, texts: List[str]) -> np.ndarray:
+    """以單一批次流程將文字轉為正規化向量 (L2 norm = 1)。"""
+    if not texts:
+        return np.zeros((0, model.get_sentence_embedding_dimension()), dtype=np.float32)
+    return model.encode(
+        texts,
+        batch_size=BATCH_SIZE,
+        convert_to_numpy=True,
+        normalize_embeddings=True,
+    ).astype(np.float32)
+
+def text_key(text: str, model_path: str = MODEL_PATH) -> str:
+    """以模型名稱與文字內容產生快取鍵值，模型或答案變更時自動失效。"""
+    return hashlib.sha1(f"{model_path}\0{text}".encode("utf-8")).hexdigest()
+
+def encode_references(
+    model: SentenceTransformer, answers: List[str], cache_path: Path, model_path: str = MODEL_PATH
+) -> np.ndarray:
+    """
+    將正確答案轉為向量，已計算過的答案直接從 cache_path 讀取，
+    只對新的答案進行編碼並寫回快取。
+
+    :param model: SentenceTransformer 模型
+    :param answers: 正確答案列表
+    :param cache_path: 向量快取檔 (.npz)
+    :param model_path: 模型名稱，作為快取鍵值的一部分
+    :return: 與 answers 對應的正規化向量
+    """
+    cached = {}
+    if cache_path.exists():
+        with np.load(cache_path) as data:
+            cached = dict(zip(data["keys"].tolist(), data["embeddings"]))
+
+    keys = [text_key(answer, model_path) for answer in answers]
+    missing = list(dict.fromkeys(
+        answer for answer, key in zip(answers, keys) if key not in cached
+    ))
+    if missing:
+        for answer, embedding in zip(missing, encode(model, missing)):
+            cached[text_key(answer, model_path)] = embedding
+        np.savez(
+            cache_path,
+            keys=np.array(list(cached.keys())),
+            embeddings=np.stack(list(cached.values())),
+        )
+
+    if not keys:
+        return encode(model, [])
+    return np.stack([cached[key] for key in keys])
+
+def rowwise_cosine(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """計算兩組正規化向量逐列的 cosine similarity。"""
+    return np.einsum("ij,ij->i", a, b)
+
+def score_records(
+    model: SentenceTransformer, records: List[Dict], answer_dict: Dict[str, str], cache_path: Path
+) -> List[Dict]:
+    """
+    為一批 LLM 回應加入正確答案 (answer) 與語義相似度 (con_sim)，任一為空者相似度為 0。
+
+    :param model: SentenceTransformer 模型
+    :param records: 含 question 與 agent_answer 的回應列表 (原地修改)
+    :param answer_dict: question -> 正確答案
+    :param cache_path: 正確答案的向量快取檔
+    :return: 加入 answer 與 con_sim 後的 records
+    """
+    # 整理所有配對
+    scored_items, agent_answers, correct_answers = [], [], []
+    for item in records:
+        question = item.get("question", "").strip()
+        agent_answer = item.get("agent_answer", "").strip()
+        correct_answer = answer_dict.get(question, "").strip()
+
+        item["answer"] = correct_answer  # 添加正確答案
+        item["con_sim"] = 0.0
+        if agent_answer and correct_answer:
+            scored_items.append(item)
+            agent_answers.append(agent_answer)
+            correct_answers.append(correct_answer)
+
+    # 批次轉換為向量並計算相似度
+    agent_embeddings = encode(model, agent_answers)
+    answer_embeddings = encode_references(model, correct_answers, cache_path)
+    similarities = rowwise_cosine(agent_embeddings, answer_embeddings)
+
+    # 新增 con_sim 欄位，保留 4 位小數
+    for item, similarity in zip(scored_items, similarities.tolist()):
+        item["con_sim"] = round(similarity, 4)
+
+    return records
+
+def compute_similarity(
+    dataset_path: Path, response_path: Path, output_path: Path, model: Optional[SentenceTransformer] = None
+):
     """
     讀取 dataset.json 取得正確答案 (answer)，
-    從 responses.json 取得 LLM 回應 (agent_answer)，
-    計算 answer 與 agent_answer 的語義相似度 (con_sim)，
+    從 responses.json (或 .jsonl) 取得 LLM 回應 (agent_answer)，
+    一次批次計算 answer 與 agent_answer 的語義相似度 (con_sim)，
     並存入新的 JSON 檔案。
 
     :param dataset_path: 包含正確答案的 JSON 檔案
     :param response_path: 包含 LLM 回應的 JSON 檔案
     :param output_path: 存放結果 JSON 檔案
+    :param model: 已加載的模型，多個 dataset 共用時傳入以避免重複加載
     """
     try:
         # 檢查檔案是否存在
@@ -37,34 +149,22 @@ def compute_similarity(dataset_path: Path, response_path: Path, output_path: Pat
             dataset = json.load(f)
         answer_dict = {item["question"]: item["answer"] for item in dataset}
 
-        # 讀取 responses.json（LLM 回應）
-        with open(response_path, "r", encoding="utf-8") as f:
-            responses = json.load(f)
-
-        # 加載預訓練模型 (IBM Granite)
-        model_path = "ibm-granite/granite-embedding-278m-multilingual"
-        model = SentenceTransformer(model_path)
+        # 讀取 responses.json 或 responses.jsonl（LLM 回應）
+        responses = load_records(response_path)
 
-        # 計算相似度
-        for item in responses:
-            question = item.get("question", "").strip()
-            agent_answer = item.get("agent_answer", "").strip()
-            correct_answer = answer_dict.get(question, "").strip()
+        if model is None:
+            model = load_model()
 
-            if agent_answer and correct_answer:
-                # 轉換為向量
-                embeddings = model.encode([agent_answer, correct_answer])
-                similarity = util.pytorch_cos_sim(embeddings[0], embeddings[1]).item()
-            else:
-                similarity = 0.0  # 若任一為空，設相似度為 0
-
-            # 新增 con_sim 欄位
-            item["answer"] = correct_answer  # 添加正確答案
-            item["con_sim"] = round(similarity, 4)  # 保留 4 位小數
+        # 批次計算相似度
+        score_records(model, responses, answer_dict, dataset_path.parent / EMBEDDING_CACHE_NAME)
 
-        # 存入新 JSON
+        # 存入新 JSON (副檔名為 .jsonl 時逐行寫入)
         with open(output_path, "w", encoding="utf-8") as f:
-            json.dump(responses, f, ensure_ascii=False, indent=4)
+            if output_path.suffix == ".jsonl":
+                for item in responses:
+                    f.write(json.dumps(item, ensure_ascii=False) + "\n")
+            else:
+                json.dump(responses, f, ensure_ascii=False, indent=4)
 
         print(f"Responses with similarity saved to {output_path}")
 
@@ -73,10 +173,28 @@ def compute_similarity(dataset_path: Path, response_path: Path, output_path: Pat
     except Exception as e:
         print(f"Unexpected error: {e}")
 
+def compute_similarities(dataset_roots: List[Path]):
+    """
+    對多個 dataset 資料夾計算相似度，只加載一次模型。
+
+    :param dataset_roots: 包含 dataset.json 與 responses.json 的資料夾列表
+    """
+    model = load_model()
+    for dataset_root in dataset_roots:
+        # 優先使用 JSON-lines 格式的回應
+        suffix = ".jsonl" if (dataset_root / "responses.jsonl").exists() else ".json"
+        compute_similarity(
+            dataset_root / "dataset.json",
+            dataset_root / f"responses{suffix}",
+            dataset_root / f"responses_with_sim{suffix}",
+            model=model,
+        )
+
 # Example usage:
 if __name__ == "__main__":
-    dataset_path = SHIP_ACCIDENT_REPORT2  / "dataset.json"
-    response_path = SHIP_ACCIDENT_REPORT2  / "responses.json"
-    output_path = SHIP_ACCIDENT_REPORT2  / "responses_with_sim.json"
+    parser = argparse.ArgumentParser(description="Score agent responses against reference answers.")
+    parser.add_argument("datasets", nargs="*", default=[SHIP_ACCIDENT_REPORT2.name],
+                        help="dataset folder names under evaluation/dataset")
+    args = parser.parse_args()
 
-    compute_similarity(dataset_path, response_path, output_path)
\ No newline at end of file
+    compute_similarities([DATASET_ROOT / name for name in args.datasets])
@@ -1,4 +1,5 @@
 import json
+import argparse
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
@@ -15,6 +16,8 @@ SHIP_LAW_ROOT = DATASET_ROOT / "ship_law"
 SHIP_ACCIDENT_REPORT1 = DATASET_ROOT / "ship_accident_report1"
 SHIP_ACCIDENT_REPORT2 = DATASET_ROOT / "ship_accident_report2"
 
+from evaluation.records import load_records
+
 import json
 import pandas as pd
 import matplotlib.pyplot as plt
@@ -24,9 +27,9 @@ from typing import List
 
 def analyze_similarity_scores(response_paths: List[Path]):
     """
-    讀取多個 responses_with_sim.json，使用 pandas 顯示 con_sim 的統計分析。
+    讀取多個 responses_with_sim.json (或 .jsonl)，使用 pandas 顯示 con_sim 的統計分析。
 
-    :param response_paths: responses_with_sim.json 的路徑列表 (可傳入多個 JSON 檔案)
+    :param response_paths: responses_with_sim.json 的路徑列表 (可傳入多個 JSON / JSON-lines 檔案)
     """
     try:
         all_data = []
@@ -37,9 +40,8 @@ def analyze_similarity_scores(response_paths: List[Path]):
                 print(f"⚠️ Warning: {response_path} does not exist, skipping...")
                 continue  # 跳過不存在的檔案
 
-            # 讀取 JSON
-            with open(response_path, "r", encoding="utf-8") as f:
-                responses = json.load(f)
+            # 讀取 JSON 或 JSON-lines
+            responses = load_records(response_path)
 
             # 轉換成 DataFrame
             df = pd.DataFrame(responses)
@@ -50,7 +52,7 @@ def analyze_similarity_scores(response_paths: List[Path]):
                 continue
 
             df["con_sim"] = pd.to_numeric(df["con_sim"], errors="coerce")
-            df["source_file"] = response_path.name  # 加入來源檔案名稱
+            df["source_file"] = response_path.parent.name  # 加入來源 dataset 名稱
             
             all_data.append(df)
 
@@ -86,11 +88,14 @@ def analyze_similarity_scores(response_paths: List[Path]):
 
 # Example usage:
 if __name__ == "__main__":
-    response_paths = [
-        # SHIP_LAW_ROOT / "responses_with_sim.json",
-        # SHIP_SAFETY_ROOT / "responses_with_sim.json",
-        # SHIP_ACCIDENT_REPORT1 / "responses_with_sim.json",
-        SHIP_ACCIDENT_REPORT2 / "responses_with_sim.json",
-    ]
+    parser = argparse.ArgumentParser(description="Show similarity statistics of scored datasets.")
+    parser.add_argument("datasets", nargs="*",
+                        default=[root.name for root in (SHIP_LAW_ROOT, SHIP_SAFETY_ROOT, SHIP_ACCIDENT_REPORT1, SHIP_ACCIDENT_REPORT2)],
+                        help="dataset folder names under evaluation/dataset")
+    args = parser.parse_args()
+
+    response_paths = []
+    for name in args.datasets:
+        jsonl_path = DATASET_ROOT / name / "responses_with_sim.jsonl"
+        response_paths.append(jsonl_path if jsonl_path.exists() else jsonl_path.with_suffix(".json"))
     analyze_similarity_scores(response_paths)
-
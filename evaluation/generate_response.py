@@ -1,12 +1,17 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
+from typing import Dict, Iterator
+import argparse
+import threading
 import shutil
 import json
+import time
 import os
 import sys
 # python -m evaluation.generate_response
 FILE = Path(__file__).resolve()
 PROJECT_ROOT = FILE.parents[1]
-EVAL_ROOT = PROJECT_ROOT / "evaluation" 
+EVAL_ROOT = PROJECT_ROOT / "evaluation"
 DATASET_ROOT = EVAL_ROOT / "dataset"
 
 SHIP_SAFETY_ROOT = DATASET_ROOT  / "ship_safety"
@@ -15,7 +20,12 @@ SHIP_ACCIDENT_REPORT1 = DATASET_ROOT / "ship_accident_report1"
 SHIP_ACCIDENT_REPORT2 = DATASET_ROOT / "ship_accident_report2"
 
 sys.path.insert(0, str(PROJECT_ROOT))  # for import modules
-from agent.agent_main import get_agent_answer
+from agent.agent_main import get_agent_messages, count_tool_calls
+from evaluation.records import read_jsonl, append_jsonl
+
+# 同時執行的 agent 數量與每秒最多送出的問題數 (避免超出 OpenAI rate limit)
+MAX_WORKERS = 4
+MAX_REQUESTS_PER_SECOND = 1.0
 
 
 def clean_folder(folder_path: Path):
@@ -27,36 +37,140 @@ def clean_folder(folder_path: Path):
         print(f"{folder_path} has been deleted.")
         os.makedirs(folder_path)
 
-def generate_responses(data_path: Path, output_path: Path):
+class RateLimiter:
+    """
+    Thread-safe limiter that spaces out calls to at most `rate` per second.
+    """
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.lock = threading.Lock()
+        self.next_time = time.monotonic()
+
+    def wait(self):
+        """Block until the caller is allowed to start the next call."""
+        with self.lock:
+            now = time.monotonic()
+            start_time = max(now, self.next_time)
+            self.next_time = start_time + self.interval
+        delay = start_time - now
+        if delay > 0:
+            time.sleep(delay)
+
+def load_checkpoint(output_path: Path) -> Dict[str, Dict]:
+    """
+    讀取已存在的 responses.jsonl，回傳已完成的問題，用於中斷後續跑。
+
+    :param output_path: 產生的問答 JSON-lines 檔案路徑
+    :return: question -> response 的字典
+    """
+    return {
+        item["question"]: item
+        for item in read_jsonl(output_path)
+        if item.get("question") and item.get("agent_answer")
+    }
+
+def answer_question(question: str, limiter: RateLimiter) -> Dict:
+    """
+    對單一問題執行 agent，並記錄回應時間與工具呼叫次數。
+
+    :param question: 問題
+    :param limiter: 共用的 RateLimiter
+    :return: 包含 question, agent_answer, latency, tool_calls 的字典
+    """
+    limiter.wait()
+    start_time = time.perf_counter()
+    messages = get_agent_messages(question)
+    latency = time.perf_counter() - start_time
+
+    return {
+        "question": question,
+        "agent_answer": messages[-1].content,
+        "latency": round(latency, 3),
+        "tool_calls": count_tool_calls(messages)
+    }
+
+def iter_responses(
+    data_path: Path,
+    output_path: Path,
+    max_workers: int = MAX_WORKERS,
+    rate: float = MAX_REQUESTS_PER_SECOND,
+    resume: bool = True
+) -> Iterator[Dict]:
     """
-    讀取 dataset.json，對每個問題生成回應，並存入 output JSON。
+    讀取 dataset.json，以多執行緒對尚未回答的問題生成回應。
+    每完成一題即附加到 output (JSON-lines) 並 yield 出去，
+    重新執行時會跳過 output 中已完成的問題。
 
     :param data_path: 問題 JSON 檔案路徑
-    :param output_path: 產生的問答 JSON 檔案路徑
+    :param output_path: 產生的問答 JSON-lines 檔案路徑
+    :param max_workers: 同時執行的 agent 數量
+    :param rate: 每秒最多送出的問題數
+    :param resume: 是否從既有的 output 續跑
+    :return: 依完成順序產生的回應
+    """
+    # 讀取 JSON
+    with open(data_path, "r", encoding="utf-8") as f:
+        question_groups = json.load(f)
+
+    # 確保 question 不為空
+    questions = [
+        question_group.get("question", "").strip()
+        for question_group in question_groups
+    ]
+    questions = [question for question in questions if question]
+
+    if not resume and output_path.exists():
+        output_path.unlink()
+    finished = load_checkpoint(output_path)
+    pending = list(dict.fromkeys(q for q in questions if q not in finished))
+    print(f"{len(finished)} answered, {len(pending)} remaining in {data_path}")
+
+    limiter = RateLimiter(rate)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(answer_question, question, limiter): question
+            for question in pending
+        }
+        for future in as_completed(futures):
+            question = futures[future]
+            try:
+                response = future.result()
+            except Exception as e:
+                # 失敗的問題不寫入，下次執行時會重新嘗試
+                print(f"Error answering '{question}': {e}")
+                continue
+
+            append_jsonl(output_path, response)
+            finished[question] = response
+            print(f"[{len(finished)}/{len(questions)}] {response['latency']}s, "
+                  f"{response['tool_calls']} tool calls: {question}")
+            yield response
+
+def generate_responses(
+    data_path: Path,
+    output_path: Path,
+    max_workers: int = MAX_WORKERS,
+    rate: float = MAX_REQUESTS_PER_SECOND,
+    resume: bool = True
+):
+    """
+    讀取 dataset.json，對每個問題生成回應，並存入 output JSON-lines。
+
+    :param data_path: 問題 JSON 檔案路徑
+    :param output_path: 產生的問答 JSON-lines 檔案路徑
+    :param max_workers: 同時執行的 agent 數量
+    :param rate: 每秒最多送出的問題數
+    :param resume: 是否從既有的 output 續跑
     """
     try:
         # 確保來源檔案存在
         if not data_path.exists():
             print(f"Error: {data_path} does not exist.")
             return
-        
-        # 讀取 JSON
-        with open(data_path, "r", encoding="utf-8") as f:
-            question_groups = json.load(f)
-
-        responses = []
-        for question_group in question_groups:
-            question = question_group.get("question", "").strip()
-            if question:  # 確保 question 不為空
-                agent_response = get_agent_answer(question)
-                responses.append({
-                    "question": question,
-                    "agent_answer": agent_response
-                })
-
-        # 存入 JSON
-        with open(output_path, "w", encoding="utf-8") as f:
-            json.dump(responses, f, ensure_ascii=False, indent=4)
+
+        for _ in iter_responses(data_path, output_path, max_workers, rate, resume):
+            pass
 
         print(f"Responses saved to {output_path}")
 
@@ -68,6 +182,15 @@ def generate_responses(data_path: Path, output_path: Path):
 
 # Example usage:
 if __name__ == "__main__":
-    dataset_path = SHIP_ACCIDENT_REPORT2 / "dataset.json"
-    response_path = SHIP_ACCIDENT_REPORT2 / "responses.json"
-    generate_responses(dataset_path, response_path)
+    parser = argparse.ArgumentParser(description="Generate agent responses for evaluation datasets.")
+    parser.add_argument("datasets", nargs="*", default=[SHIP_ACCIDENT_REPORT2.name],
+                        help="dataset folder names under evaluation/dataset")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS)
+    parser.add_argument("--rate", type=float, default=MAX_REQUESTS_PER_SECOND)
+    parser.add_argument("--restart", action="store_true", help="ignore existing responses.jsonl")
+    args = parser.parse_args()
+
+    for dataset_name in args.datasets:
+        dataset_path = DATASET_ROOT / dataset_name / "dataset.json"
+        response_path = DATASET_ROOT / dataset_name / "responses.jsonl"
+        generate_responses(dataset_path, response_path, args.workers, args.rate, not args.restart)
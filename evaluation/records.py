@@ -0,0 +1,35 @@
+import json
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+def read_jsonl(path: Path) -> Iterator[Dict]:
+    """
+    逐行讀取 JSON-lines 檔案，略過空行與中斷時寫到一半的最後一行。
+
+    :param path: JSON-lines 檔案路徑
+    :return: 每行解析後的字典
+    """
+    if not path.exists():
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                print(f"Warning: skipping malformed line in {path}")
+
+def append_jsonl(path: Path, record: Dict):
+    """將單筆紀錄附加到 JSON-lines 檔案並立即寫入磁碟。"""
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        f.flush()
+
+def load_records(path: Path) -> List[Dict]:
+    """讀取 .json (整份列表) 或 .jsonl (逐行) 格式的回應檔案。"""
+    if path.suffix == ".jsonl":
+        return list(read_jsonl(path))
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
@@ -0,0 +1,159 @@
+from itertools import chain, islice
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List
+import argparse
+import json
+import sys
+# python -m evaluation.run_eval ship_law ship_safety --workers 4
+FILE = Path(__file__).resolve()
+PROJECT_ROOT = FILE.parents[1]
+EVAL_ROOT = PROJECT_ROOT / "evaluation"
+DATASET_ROOT = EVAL_ROOT / "dataset"
+
+sys.path.insert(0, str(PROJECT_ROOT))  # for import modules
+from evaluation.records import read_jsonl, append_jsonl
+from evaluation.generate_response import iter_responses, MAX_WORKERS, MAX_REQUESTS_PER_SECOND
+from evaluation.eval_cos_sim import load_model, score_records, EMBEDDING_CACHE_NAME
+from evaluation.csv_save import DATASET_LABELS, OUTPUT_PATH, describe_similarity, save_similarity_csv
+
+# 每累積多少筆回應就計算一次相似度
+SCORE_BATCH_SIZE = 8
+
+class RunningStats:
+    """
+    Streaming count / mean / std / min / max (Welford's algorithm).
+    """
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = float("inf")
+        self.max = float("-inf")
+
+    def update(self, value: float):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    @property
+    def std(self) -> float:
+        return (self.m2 / (self.count - 1)) ** 0.5 if self.count > 1 else 0.0
+
+    def __str__(self) -> str:
+        if not self.count:
+            return "count=0"
+        return (f"count={self.count} mean={self.mean:.4f} std={self.std:.4f} "
+                f"min={self.min:.4f} max={self.max:.4f}")
+
+def batched(iterable: Iterable[Dict], size: int) -> Iterator[List[Dict]]:
+    """將串流切成固定大小的批次，最後一批可能不足 size。"""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+def evaluate_dataset(
+    dataset_name: str,
+    model,
+    max_workers: int = MAX_WORKERS,
+    rate: float = MAX_REQUESTS_PER_SECOND,
+    resume: bool = True,
+    batch_size: int = SCORE_BATCH_SIZE
+) -> List[float]:
+    """
+    對單一 dataset 執行 生成 -> 評分 -> 統計 的串流流程。
+    回應寫入 responses.jsonl，評分結果寫入 responses_with_sim.jsonl，
+    中斷後重新執行會從兩個檔案續跑。
+
+    :param dataset_name: evaluation/dataset 下的資料夾名稱
+    :param model: 已加載的 SentenceTransformer 模型
+    :param max_workers: 同時執行的 agent 數量
+    :param rate: 每秒最多送出的問題數
+    :param resume: 是否從既有結果續跑
+    :param batch_size: 每批評分的回應數量
+    :return: 此 dataset 所有題目的 con_sim
+    """
+    dataset_root = DATASET_ROOT / dataset_name
+    dataset_path = dataset_root / "dataset.json"
+    response_path = dataset_root / "responses.jsonl"
+    scored_path = dataset_root / "responses_with_sim.jsonl"
+    cache_path = dataset_root / EMBEDDING_CACHE_NAME
+
+    if not dataset_path.exists():
+        print(f"Error: {dataset_path} does not exist.")
+        return []
+    if not resume:
+        for path in (response_path, scored_path):
+            if path.exists():
+                path.unlink()
+
+    with open(dataset_path, "r", encoding="utf-8") as f:
+        answer_dict = {item["question"]: item["answer"] for item in json.load(f)}
+
+    # 已評分的結果直接計入統計
+    stats = RunningStats()
+    scores = []
+    scored_questions = set()
+    for item in read_jsonl(scored_path):
+        scored_questions.add(item["question"])
+        scores.append(item["con_sim"])
+        stats.update(item["con_sim"])
+
+    # 已生成但尚未評分的回應 (上次在評分前中斷) 先送入評分，再接上新生成的回應
+    backlog = [item for item in read_jsonl(response_path) if item["question"] not in scored_questions]
+    stream = chain(backlog, iter_responses(dataset_path, response_path, max_workers, rate, resume=True))
+
+    for batch in batched(stream, batch_size):
+        score_records(model, batch, answer_dict, cache_path)
+        for item in batch:
+            append_jsonl(scored_path, item)
+            scores.append(item["con_sim"])
+            stats.update(item["con_sim"])
+        print(f"[{dataset_name}] {stats}")
+
+    print(f"Scored responses saved to {scored_path}")
+    return scores
+
+def run_evaluation(
+    dataset_names: List[str],
+    output_path: Path = OUTPUT_PATH,
+    max_workers: int = MAX_WORKERS,
+    rate: float = MAX_REQUESTS_PER_SECOND,
+    resume: bool = True,
+    batch_size: int = SCORE_BATCH_SIZE
+):
+    """
+    依序評估多個 dataset (只加載一次模型)，並將各類別與總數的統計寫入 CSV。
+
+    :param dataset_names: evaluation/dataset 下的資料夾名稱列表
+    :param output_path: 統計 CSV 路徑
+    """
+    model = load_model()
+    scores = {}
+    for dataset_name in dataset_names:
+        values = evaluate_dataset(dataset_name, model, max_workers, rate, resume, batch_size)
+        if values:
+            scores[DATASET_LABELS.get(dataset_name, dataset_name)] = values
+
+    if not scores:
+        print("❌ No valid data found for analysis.")
+        return
+
+    stats = describe_similarity(scores)
+    print(stats)
+    save_similarity_csv(stats, output_path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate, score and summarize agent responses.")
+    parser.add_argument("datasets", nargs="*", default=list(DATASET_LABELS),
+                        help="dataset folder names under evaluation/dataset")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS)
+    parser.add_argument("--rate", type=float, default=MAX_REQUESTS_PER_SECOND)
+    parser.add_argument("--batch-size", type=int, default=SCORE_BATCH_SIZE)
+    parser.add_argument("--output", type=Path, default=OUTPUT_PATH)
+    parser.add_argument("--restart", action="store_true", help="discard existing .jsonl results")
+    args = parser.parse_args()
+
+    run_evaluation(args.datasets, args.output, args.workers, args.rate, not args.restart, args.batch_size)
@@ -0,0 +1,52 @@
+# Production server: gunicorn -c gunicorn.conf.py app:app
+#
+# The app is imported once in the master (preload_app) with APP_PRELOAD=sync, so the
+# embedding and YOLO models are loaded before fork and the workers share their memory
+# pages copy-on-write. Threads and SQLite/Chroma connections do not survive fork, so
+# every worker recreates them in post_fork.
+#
+# Models must stay on the CPU in the master: a CUDA context cannot be used after fork.
+# With a GPU, set APP_PRELOAD=background so each worker loads its own models instead.
+import os
+import sys
+
+bind = os.getenv("BIND", f"0.0.0.0:{os.getenv('PORT', '5000')}")
+workers = int(os.getenv("WEB_WORKERS", "2"))
+# 每個 worker 的執行緒數，即同時處理的 webhook 數。使用者額度、訊息合併與 MAX_CONCURRENT_RUNS
+# 由 server/run_state.db 在所有 worker 之間共用，不會隨 worker 數倍增
+threads = int(os.getenv("WEB_THREADS", "4"))
+worker_class = "gthread"
+preload_app = True
+
+# agent 一次回覆可能包含多次 LLM 與工具呼叫
+timeout = int(os.getenv("WEB_TIMEOUT", "180"))
+# 收到 SIGTERM 後等待進行中的 agent 回覆與資料庫寫入完成的秒數
+graceful_timeout = int(os.getenv("WEB_GRACEFUL_TIMEOUT", "120"))
+keepalive = 5
+
+accesslog = "-"
+errorlog = "-"
+
+os.environ.setdefault("APP_PRELOAD", "sync")
+# 避免每個 worker 的 torch 都使用全部 CPU 核心
+os.environ.setdefault("OMP_NUM_THREADS", str(max(1, (os.cpu_count() or 1) // workers)))
+
+def when_ready(server):
+    app_module = sys.modules.get("app")
+    if app_module is not None:
+        server.log.info(app_module.report.summary())
+    # master 不處理請求，索引監看改由各 worker 執行
+    retriever = sys.modules.get("rag.retriever")
+    if retriever is not None:
+        retriever.shutdown()
+
+def post_fork(server, worker):
+    retriever = sys.modules.get("rag.retriever")
+    if retriever is not None:
+        retriever.after_fork()
+
+def worker_exit(server, worker):
+    # 進行中的請求已由 gunicorn 在 graceful_timeout 內處理完，這裡停止背景的索引監看
+    retriever = sys.modules.get("rag.retriever")
+    if retriever is not None:
+        retriever.shutdown(timeout=graceful_timeout)
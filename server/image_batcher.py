@@ -0,0 +1,129 @@
+import os
+import time
+import threading
+from typing import Callable, Dict, Generic, List, Optional, TypeVar
+
+# 同一位使用者的圖片在最後一張抵達後等待的秒數，期間抵達的圖片併入同一批
+IMAGE_BATCH_WINDOW = float(os.getenv("IMAGE_BATCH_WINDOW", "2"))
+# 一批最長的收集時間與最多圖片數 (LINE 一次最多傳送 20 張)
+IMAGE_BATCH_MAX_WAIT = float(os.getenv("IMAGE_BATCH_MAX_WAIT", "10"))
+IMAGE_BATCH_MAX_IMAGES = int(os.getenv("IMAGE_BATCH_MAX_IMAGES", "20"))
+
+T = TypeVar("T")
+Clock = Callable[[], float]
+
+class ImageBatch(Generic[T]):
+    """Images of one user collected so far, with the totals of the LINE image sets they belong to."""
+    def __init__(self, now: float):
+        self.items: List[T] = []
+        self.started = now
+        self.updated = now
+        self.set_totals: Dict[str, Optional[int]] = {}
+        self.set_counts: Dict[str, int] = {}
+        self.unset_items = 0
+
+    def add(self, item: T, now: float, set_id: Optional[str], set_total: Optional[int]):
+        self.items.append(item)
+        self.updated = now
+        if set_id is None:
+            self.unset_items += 1
+        else:
+            self.set_totals[set_id] = set_total or self.set_totals.get(set_id)
+            self.set_counts[set_id] = self.set_counts.get(set_id, 0) + 1
+
+    def sets_complete(self) -> bool:
+        # 只有全部圖片都屬於已知張數的 image set 且都已抵達時，才能不等收集時間直接處理
+        return (not self.unset_items and bool(self.set_totals)
+                and all(total is not None and self.set_counts[set_id] >= total
+                        for set_id, total in self.set_totals.items()))
+
+class ImageBatcher(Generic[T]):
+    """
+    Groups the images a user sends in one go into a single batch.
+
+    LINE delivers every photo of a multi-image message as its own event, possibly
+    several in one webhook request. The first image of a user opens a batch and
+    starts a worker thread; images arriving while the batch is open are added to
+    it. The batch is handed to `on_batch` once the user's image sets are complete
+    (`image_set.total`), no image arrived for `window` seconds, `max_images` is
+    reached or `max_wait` seconds have passed. Images arriving after that open a
+    new batch.
+
+    Batches are kept per process, so images of one user delivered to different
+    gunicorn workers end up in different batches.
+    """
+    def __init__(self, on_batch: Callable[[str, List[T]], None], window: float = IMAGE_BATCH_WINDOW,
+                 max_wait: float = IMAGE_BATCH_MAX_WAIT, max_images: int = IMAGE_BATCH_MAX_IMAGES,
+                 clock: Clock = time.monotonic):
+        self.on_batch = on_batch
+        self.window = window
+        self.max_wait = max_wait
+        self.max_images = max_images
+        self.clock = clock
+        self.batches: Dict[str, ImageBatch[T]] = {}
+        self.condition = threading.Condition()
+
+    def add(self, user_id: str, item: T, set_id: Optional[str] = None, set_total: Optional[int] = None) -> bool:
+        """
+        Add an image event to the user's open batch, opening one if needed.
+
+        Returns:
+            bool: True if the image opened a new batch.
+        """
+        with self.condition:
+            batch = self.batches.get(user_id)
+            opened = batch is None
+            if opened:
+                batch = self.batches[user_id] = ImageBatch(self.clock())
+            batch.add(item, self.clock(), set_id, set_total)
+            self.condition.notify_all()
+        if opened:
+            # 非 daemon 執行緒：程序結束前 (gunicorn graceful shutdown) 會處理完已收集的圖片
+            threading.Thread(target=self._run, args=(user_id,), name=f"image-batch-{user_id}").start()
+        return opened
+
+    def _remaining(self, batch: ImageBatch[T]) -> float:
+        """Seconds until the batch closes, 0 when it is ready."""
+        if len(batch.items) >= self.max_images or batch.sets_complete():
+            return 0.0
+        now = self.clock()
+        return max(0.0, min(batch.updated + self.window, batch.started + self.max_wait) - now)
+
+    def collect(self, user_id: str) -> List[T]:
+        """Wait until the user's open batch is ready, then close it and return its images."""
+        with self.condition:
+            while True:
+                batch = self.batches[user_id]
+                remaining = self._remaining(batch)
+                if remaining <= 0:
+                    return self.batches.pop(user_id).items
+                self.condition.wait(remaining)
+
+    def _run(self, user_id: str):
+        items = self.collect(user_id)
+        try:
+            self.on_batch(user_id, items)
+        except Exception as e:
+            print(f"[Error] Image batch of {user_id} ({len(items)} images) failed: {e}")
+
+if __name__ == "__main__":
+    # python -m server.image_batcher
+    # 模擬兩位使用者：一位以相簿一次傳 4 張，一位間隔 0.3 秒連續傳 3 張單張圖片
+    batches: List[tuple] = []
+    done = threading.Event()
+
+    def on_batch(user_id: str, items: List[str]):
+        batches.append((time.perf_counter() - start_time, items))
+        if len(batches) == 2:
+            done.set()
+
+    batcher: ImageBatcher[str] = ImageBatcher(on_batch, window=1.0, max_wait=5.0)
+    start_time = time.perf_counter()
+    for i in range(4):
+        batcher.add("alice", f"alice-{i}", set_id="album-1", set_total=4)
+    for i in range(3):
+        batcher.add("bob", f"bob-{i}")
+        time.sleep(0.3)
+    done.wait(10)
+    for seconds, items in batches:
+        print(f"  batch after {seconds:.2f}s: {items}")
@@ -0,0 +1,414 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Generic, Iterator, List, Optional, TypeVar
+
+# 每位使用者每秒可啟動的 agent 回合數與可累積的額度 (一次連發的上限)
+USER_RATE = float(os.getenv("USER_RATE_PER_MINUTE", "6")) / 60
+USER_BURST = float(os.getenv("USER_BURST", "3"))
+# 全部使用者同時執行的 agent 回合上限，以及等待空位的最長秒數
+MAX_CONCURRENT_RUNS = int(os.getenv("MAX_CONCURRENT_RUNS", "4"))
+RUN_WAIT_TIMEOUT = float(os.getenv("RUN_WAIT_TIMEOUT", "60"))
+# 保留的使用者 bucket 數，超過時移除最久未使用的
+MAX_TRACKED_USERS = 10000
+# SharedRunCoordinator 的狀態檔，同一台機器上的所有 worker 行程共用
+RUN_STATE_PATH = Path(__file__).resolve().parent / "run_state.db"
+# 回合或執行名額超過此秒數未更新，視為持有者已終止 (POSIX 上另以 pid 檢查)
+STALE_SECONDS = float(os.getenv("RUN_STALE_SECONDS", "600"))
+# 等待執行名額時重新檢查的間隔
+SLOT_POLL_SECONDS = 0.1
+BUSY_TIMEOUT_MS = 5000
+
+ACCEPTED = "accepted"          # 由呼叫端執行 agent 回合
+COALESCED = "coalesced"        # 併入該使用者進行中回合之後的下一回合
+RATE_LIMITED = "rate_limited"  # 超過使用者額度，不執行
+
+T = TypeVar("T")
+Clock = Callable[[], float]
+
+class TokenBucket:
+    """Token bucket refilled continuously at `rate` tokens per second up to `capacity`."""
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def try_acquire(self, now: float, tokens: float = 1.0) -> bool:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+class UserRateLimiter:
+    """Per-user token buckets, created on first use and evicted least recently used."""
+    def __init__(self, rate: float = USER_RATE, capacity: float = USER_BURST,
+                 clock: Clock = time.monotonic, max_users: int = MAX_TRACKED_USERS):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.max_users = max_users
+        self.buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def allow(self, user_id: str) -> bool:
+        with self.lock:
+            now = self.clock()
+            bucket = self.buckets.get(user_id)
+            if bucket is None:
+                bucket = self.buckets[user_id] = TokenBucket(self.rate, self.capacity, now)
+                if len(self.buckets) > self.max_users:
+                    self.buckets.popitem(last=False)
+            self.buckets.move_to_end(user_id)
+            return bucket.try_acquire(now)
+
+class LimiterMetrics:
+    """Counters of the coordinator, read with `snapshot()`."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts: Dict[str, int] = {ACCEPTED: 0, COALESCED: 0, RATE_LIMITED: 0, "runs": 0, "run_timeouts": 0}
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.run_seconds = 0.0
+        self.wait_seconds = 0.0
+
+    def count(self, name: str):
+        with self.lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def snapshot(self) -> Dict:
+        with self.lock:
+            runs = self.counts["runs"]
+            return {
+                **self.counts,
+                "in_flight": self.in_flight,
+                "max_in_flight": self.max_in_flight,
+                "avg_run_seconds": round(self.run_seconds / runs, 3) if runs else 0.0,
+                "avg_wait_seconds": round(self.wait_seconds / runs, 3) if runs else 0.0,
+            }
+
+class RunCoordinator(Generic[T]):
+    """
+    Decides which incoming messages start an agent turn, within one process.
+
+    A user with no turn in flight gets a new turn if their token bucket allows it.
+    Messages that arrive while the user's turn is running are queued and returned
+    together by `next_batch`, so the handler that owns the turn answers them in a
+    single follow-up turn. All turns share a global cap of concurrent runs.
+
+    Typical handler::
+
+        if coordinator.submit(user_id, event) == ACCEPTED:
+            batch = [event]
+            while batch:
+                with coordinator.run_slot():
+                    ...  # one agent turn for every event in batch
+                batch = coordinator.next_batch(user_id)
+
+    All state lives in this process; with several worker processes use
+    `SharedRunCoordinator`.
+    """
+    def __init__(self, limiter: Optional[UserRateLimiter] = None, max_concurrent: int = MAX_CONCURRENT_RUNS,
+                 wait_timeout: float = RUN_WAIT_TIMEOUT, clock: Clock = time.monotonic):
+        self.limiter = limiter or UserRateLimiter(clock=clock)
+        self.clock = clock
+        self.wait_timeout = wait_timeout
+        self.slots = threading.BoundedSemaphore(max_concurrent)
+        self.metrics = LimiterMetrics()
+        self.pending: Dict[str, List[T]] = {}  # 有進行中回合的使用者 -> 排隊的訊息
+        self.lock = threading.Lock()
+
+    def allow(self, user_id: str) -> bool:
+        """Take one turn from the user's bucket, for turns that are never coalesced."""
+        return self.limiter.allow(user_id)
+
+    def submit(self, user_id: str, item: T) -> str:
+        """
+        Register a message.
+
+        Returns:
+            str: ACCEPTED if the caller should run a turn for it, COALESCED if it was
+            queued behind the user's running turn, RATE_LIMITED if it is dropped.
+        """
+        with self.lock:
+            if user_id in self.pending:
+                self.pending[user_id].append(item)
+                decision = COALESCED
+            elif self.limiter.allow(user_id):
+                self.pending[user_id] = []
+                decision = ACCEPTED
+            else:
+                decision = RATE_LIMITED
+        self.metrics.count(decision)
+        return decision
+
+    def next_batch(self, user_id: str) -> List[T]:
+        """Messages queued during the user's last turn; an empty list ends the user's turn."""
+        with self.lock:
+            batch = self.pending.get(user_id, [])
+            if batch:
+                self.pending[user_id] = []
+            else:
+                self.pending.pop(user_id, None)
+            return batch
+
+    def abandon(self, user_id: str) -> List[T]:
+        """End the user's turn after a failure, returning the messages that were still queued."""
+        with self.lock:
+            return self.pending.pop(user_id, [])
+
+    @contextmanager
+    def run_slot(self):
+        """
+        Hold one of the global agent run slots.
+
+        Raises:
+            TimeoutError: If no slot frees up within `wait_timeout` seconds.
+        """
+        start_time = self.clock()
+        slot = self._acquire_slot()
+        if slot is None:
+            self.metrics.count("run_timeouts")
+            raise TimeoutError("All agent run slots are busy")
+        metrics = self.metrics
+        with metrics.lock:
+            metrics.wait_seconds += self.clock() - start_time
+            metrics.in_flight += 1
+            metrics.max_in_flight = max(metrics.max_in_flight, metrics.in_flight)
+        run_start = self.clock()
+        try:
+            yield
+        finally:
+            with metrics.lock:
+                metrics.in_flight -= 1
+                metrics.counts["runs"] += 1
+                metrics.run_seconds += self.clock() - run_start
+            self._release_slot(slot)
+
+    def _acquire_slot(self) -> Optional[Any]:
+        """A slot token, or None if no slot freed up within `wait_timeout`."""
+        return True if self.slots.acquire(timeout=self.wait_timeout) else None
+
+    def _release_slot(self, slot: Any):
+        self.slots.release()
+
+RUN_STATE_SQL = """
+CREATE TABLE IF NOT EXISTS buckets (
+    user_id TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_buckets_updated ON buckets(updated);
+CREATE TABLE IF NOT EXISTS turns (
+    user_id TEXT PRIMARY KEY,
+    pid INTEGER NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pending (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    item TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_pending_user ON pending(user_id, id);
+CREATE TABLE IF NOT EXISTS run_slots (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    pid INTEGER NOT NULL,
+    acquired REAL NOT NULL
+);
+"""
+
+def pid_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    if os.name != "posix":
+        # Windows 的 os.kill 會終止行程，只能依時間判斷
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+class SharedRunCoordinator(RunCoordinator[T]):
+    """
+    `RunCoordinator` whose buckets, turns, queued messages and run slots are kept
+    in a SQLite file shared by every worker process, so the per-user rate, the
+    coalescing of a user's messages and the global cap hold across gunicorn
+    workers. Queued messages cross processes, so they are stored with `dumps`
+    and read back with `loads`.
+
+    A turn or slot whose process died (checked by pid on POSIX) or that was not
+    updated for `stale_seconds` is taken over. Metrics stay per process.
+    """
+    def __init__(self, db_path: Path = RUN_STATE_PATH, rate: float = USER_RATE, capacity: float = USER_BURST,
+                 max_concurrent: int = MAX_CONCURRENT_RUNS, wait_timeout: float = RUN_WAIT_TIMEOUT,
+                 dumps: Callable[[T], str] = json.dumps, loads: Callable[[str], T] = json.loads,
+                 stale_seconds: float = STALE_SECONDS, clock: Clock = time.time):
+        super().__init__(UserRateLimiter(rate, capacity, clock=clock), max_concurrent, wait_timeout, clock)
+        self.db_path = db_path
+        self.rate = rate
+        self.capacity = capacity
+        self.max_concurrent = max_concurrent
+        self.dumps = dumps
+        self.loads = loads
+        self.stale_seconds = stale_seconds
+        # 連線不跨 fork 使用：每個操作開啟自己的連線
+        with self.transaction(begin=False) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(RUN_STATE_SQL)
+
+    @contextmanager
+    def transaction(self, begin: bool = True) -> Iterator[sqlite3.Connection]:
+        """Write transaction on a fresh connection, holding the write lock from its first statement."""
+        conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+        try:
+            conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+            if not begin:
+                yield conn
+                return
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    def alive(self, pid: int, updated: float, now: float) -> bool:
+        return now - updated <= self.stale_seconds and pid_alive(pid)
+
+    def _allow(self, conn: sqlite3.Connection, user_id: str, now: float) -> bool:
+        row = conn.execute("SELECT tokens, updated FROM buckets WHERE user_id = ?", (user_id,)).fetchone()
+        bucket = TokenBucket(self.rate, self.capacity, now)
+        if row is not None:
+            bucket.tokens, bucket.updated = row
+        allowed = bucket.try_acquire(now)
+        conn.execute(
+            "INSERT INTO buckets (user_id, tokens, updated) VALUES (?, ?, ?) "
+            "ON CONFLICT(user_id) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+            (user_id, bucket.tokens, bucket.updated),
+        )
+        # 閒置到額度已補滿的 bucket 與新建的相同，可以刪除
+        if self.rate > 0:
+            conn.execute("DELETE FROM buckets WHERE updated < ?", (now - self.capacity / self.rate,))
+        return allowed
+
+    def allow(self, user_id: str) -> bool:
+        with self.transaction() as conn:
+            return self._allow(conn, user_id, self.clock())
+
+    def submit(self, user_id: str, item: T) -> str:
+        with self.transaction() as conn:
+            now = self.clock()
+            turn = conn.execute("SELECT pid, updated FROM turns WHERE user_id = ?", (user_id,)).fetchone()
+            if turn is not None and self.alive(*turn, now):
+                conn.execute("INSERT INTO pending (user_id, item) VALUES (?, ?)", (user_id, self.dumps(item)))
+                decision = COALESCED
+            elif self._allow(conn, user_id, now):
+                # 已終止的回合留下的訊息由新的回合在 next_batch 時一併回答
+                conn.execute("INSERT OR REPLACE INTO turns (user_id, pid, updated) VALUES (?, ?, ?)",
+                             (user_id, os.getpid(), now))
+                decision = ACCEPTED
+            else:
+                decision = RATE_LIMITED
+        self.metrics.count(decision)
+        return decision
+
+    def _take_pending(self, conn: sqlite3.Connection, user_id: str) -> List[T]:
+        rows = conn.execute("SELECT id, item FROM pending WHERE user_id = ? ORDER BY id", (user_id,)).fetchall()
+        if rows:
+            conn.execute("DELETE FROM pending WHERE user_id = ? AND id <= ?", (user_id, rows[-1][0]))
+        return [self.loads(item) for _, item in rows]
+
+    def next_batch(self, user_id: str) -> List[T]:
+        with self.transaction() as conn:
+            batch = self._take_pending(conn, user_id)
+            if batch:
+                conn.execute("UPDATE turns SET pid = ?, updated = ? WHERE user_id = ?",
+                             (os.getpid(), self.clock(), user_id))
+            else:
+                conn.execute("DELETE FROM turns WHERE user_id = ?", (user_id,))
+            return batch
+
+    def abandon(self, user_id: str) -> List[T]:
+        with self.transaction() as conn:
+            batch = self._take_pending(conn, user_id)
+            conn.execute("DELETE FROM turns WHERE user_id = ?", (user_id,))
+            return batch
+
+    def _acquire_slot(self) -> Optional[int]:
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            with self.transaction() as conn:
+                now = self.clock()
+                slots = conn.execute("SELECT id, pid, acquired FROM run_slots").fetchall()
+                stale = [slot_id for slot_id, pid, acquired in slots if not self.alive(pid, acquired, now)]
+                conn.executemany("DELETE FROM run_slots WHERE id = ?", [(slot_id,) for slot_id in stale])
+                if len(slots) - len(stale) < self.max_concurrent:
+                    return conn.execute("INSERT INTO run_slots (pid, acquired) VALUES (?, ?)",
+                                        (os.getpid(), now)).lastrowid
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(SLOT_POLL_SECONDS)
+
+    def _release_slot(self, slot: int):
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM run_slots WHERE id = ?", (slot,))
+
+if __name__ == "__main__":
+    # python -m server.limiter
+    # 以假時鐘模擬連發訊息：兩位使用者每 2 秒各送出 8 則，共 5 輪
+    from concurrent.futures import ThreadPoolExecutor
+
+    class FakeClock:
+        def __init__(self):
+            self.now = 0.0
+            self.lock = threading.Lock()
+
+        def __call__(self) -> float:
+            with self.lock:
+                return self.now
+
+        def advance(self, seconds: float):
+            with self.lock:
+                self.now += seconds
+
+    clock = FakeClock()
+    coordinator: RunCoordinator[str] = RunCoordinator(
+        UserRateLimiter(rate=USER_RATE, capacity=USER_BURST, clock=clock), max_concurrent=2, clock=clock
+    )
+    turns: List[List[str]] = []
+
+    def handle(user_id: str, message: str):
+        if coordinator.submit(user_id, message) != ACCEPTED:
+            return
+        batch = [message]
+        while batch:
+            with coordinator.run_slot():
+                turns.append(batch)
+                time.sleep(0.05)  # 讓同一使用者的後續訊息在回合進行中抵達
+            batch = coordinator.next_batch(user_id)
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        for burst in range(5):
+            for user in ("alice", "bob"):
+                for i in range(8):
+                    executor.submit(handle, user, f"{user}-{burst}-{i}")
+            time.sleep(0.3)
+            clock.advance(2.0)
+
+    print(f"{len(turns)} agent turns for 80 messages")
+    for batch in turns:
+        print(f"  turn with {len(batch)} message(s): {batch}")
+    print(coordinator.metrics.snapshot())
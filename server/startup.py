@@ -0,0 +1,105 @@
+import importlib
+import threading
+import time
+from contextlib import contextmanager
+from types import ModuleType
+from typing import Callable, Dict, List, Optional, Tuple
+
+class StartupReport:
+    """Wall-clock time of every import and model load done while the server starts."""
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def timed(self, name: str):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.phases[name] = round(time.perf_counter() - start_time, 3)
+
+    def as_dict(self) -> Dict:
+        with self.lock:
+            return {
+                "uptime_seconds": round(time.perf_counter() - self.started, 3),
+                "phases": dict(self.phases),
+            }
+
+    def summary(self) -> str:
+        report = self.as_dict()
+        lines = [f"Startup report ({report['uptime_seconds']}s since start):"]
+        lines += [f"  {name:<40} {seconds:>8.3f}s" for name, seconds in report["phases"].items()]
+        return "\n".join(lines)
+
+report = StartupReport()
+
+class LazyModule:
+    """
+    Module proxy that imports the module on first attribute access, so heavy
+    dependencies (torch, langgraph, ...) are not paid for when the app is imported.
+    """
+    def __init__(self, name: str):
+        self._name = name
+        self._module: Optional[ModuleType] = None
+        self._lock = threading.Lock()
+
+    def load(self) -> ModuleType:
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    with report.timed(f"import {self._name}"):
+                        self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr: str):
+        return getattr(self.load(), attr)
+
+def lazy_import(name: str) -> LazyModule:
+    return LazyModule(name)
+
+PreloadStep = Tuple[str, Callable[[], object]]
+
+class Preloader:
+    """
+    Runs the model loading steps of the server once, in the background or in the
+    calling thread, and tracks whether the server is ready to answer requests.
+    """
+    def __init__(self, steps: List[PreloadStep]):
+        self.steps = steps
+        self.done: List[str] = []
+        self.error: Optional[str] = None
+        self.ready = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def run(self):
+        """Run every step in order; a failed step is reported and the server stays not ready."""
+        for name, step in self.steps:
+            try:
+                with report.timed(name):
+                    step()
+            except Exception as e:
+                self.error = f"{name}: {e}"
+                print(f"[Error] Preload failed at {self.error}")
+                return
+            self.done.append(name)
+        self.ready.set()
+        print(report.summary())
+
+    def start(self) -> threading.Thread:
+        """Run the steps in a daemon thread so the server can answer health checks meanwhile."""
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name="preload", daemon=True)
+            self.thread.start()
+        return self.thread
+
+    def status(self) -> Dict:
+        return {
+            "ready": self.ready.is_set(),
+            "done": list(self.done),
+            "pending": [name for name, _ in self.steps if name not in self.done],
+            "error": self.error,
+            **report.as_dict(),
+        }
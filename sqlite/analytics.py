@@ -0,0 +1,220 @@
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+import pandas as pd
+
+PATH = Path(__file__).resolve().parent
+sys.path.insert(0, str(PATH.parent))  # for import modules
+
+from sqlite.compression import decompress_message
+from sqlite.retention import ARCHIVE_PATH, iter_archive
+
+DB_PATH = PATH / "conversations.db"
+# Parquet 匯出 (需要 pyarrow)，每次匯出新增一個 part 檔
+EXPORT_PATH = PATH / "analytics"
+STATE_NAME = "export_state.json"
+# 每次從資料庫讀取的列數，讀取交易保持短暫
+READ_BATCH_SIZE = 50_000
+# 每個 Parquet part 檔的最大列數
+PART_ROWS = 1_000_000
+# 圖片訊息由系統組成的問題開頭，不列入熱門問題
+IMAGE_QUESTION_PREFIX = "圖片內出現以下內容"
+
+LOCAL_TIMEZONE = datetime.now().astimezone().tzinfo
+
+COLUMNS = ["id", "user_id", "timestamp", "user_message", "answer_chars", "latency_ms"]
+
+def connect_readonly(db_path: Path) -> sqlite3.Connection:
+    """Read-only connection; with the database in WAL mode it never blocks the bot's writes."""
+    conn = sqlite3.connect(f"{db_path.as_uri()}?mode=ro", uri=True)
+    conn.execute("PRAGMA query_only = ON")
+    return conn
+
+def load_state(export_dir: Path) -> Dict:
+    state_path = export_dir / STATE_NAME
+    if state_path.exists():
+        with open(state_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {"last_id": 0, "rows": 0}
+
+def save_state(export_dir: Path, state: Dict):
+    tmp_path = export_dir / f"{STATE_NAME}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=4)
+    os.replace(tmp_path, export_dir / STATE_NAME)
+
+def iter_live(db_path: Path, after_id: int) -> Iterable[Dict]:
+    """Records of the live database after `after_id`, read in short id-range batches."""
+    conn = connect_readonly(db_path)
+    try:
+        while True:
+            rows = conn.execute(
+                "SELECT id, user_id, timestamp, user_message, ai_message, compression, latency_ms "
+                "FROM conversation_records WHERE id > ? ORDER BY id LIMIT ?",
+                (after_id, READ_BATCH_SIZE),
+            ).fetchall()
+            if not rows:
+                return
+            for record_id, user_id, timestamp, user_message, ai_message, compression, latency_ms in rows:
+                yield {
+                    "id": record_id, "user_id": user_id, "timestamp": timestamp, "user_message": user_message,
+                    "answer_chars": len(decompress_message(ai_message, compression)), "latency_ms": latency_ms,
+                }
+            after_id = rows[-1][0]
+    finally:
+        conn.close()
+
+def to_frame(records: List[Dict]) -> pd.DataFrame:
+    df = pd.DataFrame.from_records(records, columns=COLUMNS)
+    # timestamp 為 epoch 毫秒，轉為本地時間
+    df["timestamp"] = pd.to_datetime(df["timestamp"], unit="ms", utc=True).dt.tz_convert(LOCAL_TIMEZONE)
+    df["user_id"] = df["user_id"].astype("category")
+    df["answer_chars"] = df["answer_chars"].astype("Int64")
+    df["latency_ms"] = df["latency_ms"].astype("Int64")
+    return df
+
+def export_incremental(db_path: Path = DB_PATH, archive_dir: Path = ARCHIVE_PATH,
+                       export_dir: Path = EXPORT_PATH) -> Dict:
+    """
+    Append the records added since the last export to `export_dir` as Parquet parts.
+
+    Records already moved to the archive by `retention.py` are read from the
+    archive files, the rest from the live database through a read-only
+    connection. The last exported id is saved after each part is written, so
+    an interrupted export resumes where it stopped.
+
+    Returns:
+        Dict: Rows exported, parts written and the new last id.
+    """
+    export_dir.mkdir(parents=True, exist_ok=True)
+    state = load_state(export_dir)
+    stats = {"rows": 0, "parts": 0}
+
+    def flush(records: List[Dict]):
+        first_id, last_id = records[0]["id"], max(record["id"] for record in records)
+        part_path = export_dir / f"conversations-{first_id:012d}-{last_id:012d}.parquet"
+        tmp_path = part_path.with_name(part_path.name + ".tmp")
+        to_frame(records).to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, part_path)
+        state["last_id"] = max(state["last_id"], last_id)
+        state["rows"] += len(records)
+        save_state(export_dir, state)
+        stats["rows"] += len(records)
+        stats["parts"] += 1
+
+    def archived() -> Iterable[Dict]:
+        for record in iter_archive(archive_dir, state["last_id"]):
+            answer = record["ai_message"]
+            yield {**record, "answer_chars": len(answer) if answer is not None else None}
+
+    records: List[Dict] = []
+
+    def add(record: Dict):
+        nonlocal records
+        records.append({column: record.get(column) for column in COLUMNS})
+        if len(records) >= PART_ROWS:
+            flush(records)
+            records = []
+
+    archived_ids = set()
+    for record in archived():
+        archived_ids.add(record["id"])
+        add(record)
+    for record in iter_live(db_path, state["last_id"]):
+        # 已寫入封存檔但尚未自資料庫刪除的紀錄 (封存中斷時) 只匯出一次
+        if record["id"] not in archived_ids:
+            add(record)
+    if records:
+        flush(records)
+    stats["last_id"] = state["last_id"]
+    return stats
+
+def load_export(export_dir: Path = EXPORT_PATH, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Read every exported part; pass `columns` to read only what a report needs."""
+    parts = sorted(export_dir.glob("conversations-*.parquet"))
+    if not parts:
+        return pd.DataFrame(columns=columns or COLUMNS)
+    return pd.concat((pd.read_parquet(part, columns=columns) for part in parts), ignore_index=True)
+
+def conversation_report(export_dir: Path = EXPORT_PATH, top_n: int = 10, days: Optional[int] = None,
+                        plot: bool = True):
+    """
+    顯示對話量、熱門問題與回覆延遲的統計 (讀取 Parquet 匯出，不連線正式資料庫)。
+
+    :param export_dir: export_incremental 的輸出資料夾
+    :param top_n: 熱門問題顯示筆數
+    :param days: 只統計最近幾天 (None 表示全部)
+    :param plot: 是否繪製每日訊息量與延遲分佈圖
+    """
+    start_time = time.perf_counter()
+    df = load_export(export_dir, columns=["timestamp", "user_id", "user_message", "latency_ms"])
+    if df.empty:
+        print("❌ No exported conversations, run with --export first.")
+        return
+    if days is not None:
+        df = df[df["timestamp"] >= df["timestamp"].max() - pd.Timedelta(days=days)]
+    df["date"] = df["timestamp"].dt.floor("D")
+
+    print(f"\n🔹 共 {len(df):,} 則對話，{df['user_id'].nunique():,} 位使用者 "
+          f"({df['timestamp'].min()} ~ {df['timestamp'].max()})")
+
+    print("\n🔹 每日訊息量：")
+    daily = df.groupby("date").agg(messages=("user_id", "size"), users=("user_id", "nunique"))
+    print(daily.tail(30))
+
+    print(f"\n🔹 熱門問題 (前 {top_n} 名)：")
+    questions = df.loc[~df["user_message"].str.startswith(IMAGE_QUESTION_PREFIX), "user_message"]
+    questions = questions.str.strip().str.lower()
+    print(questions.value_counts().head(top_n).to_string())
+
+    latency = df["latency_ms"].dropna().astype("int64") / 1000
+    if latency.empty:
+        print("\n⚠️ Warning: 沒有回覆延遲資料 (latency_ms 於新版才開始記錄)。")
+    else:
+        print("\n🔹 回覆延遲 (秒)：")
+        print(latency.describe(percentiles=[0.5, 0.9, 0.95, 0.99]))
+        print("\n🔹 每日回覆延遲 (秒)：")
+        daily_latency = df.dropna(subset=["latency_ms"]).groupby("date")["latency_ms"]
+        print((daily_latency.quantile([0.5, 0.95]).unstack() / 1000).tail(30))
+    print(f"\nReport computed in {time.perf_counter() - start_time:.2f}s")
+
+    if plot:
+        import matplotlib.pyplot as plt
+        import seaborn as sns
+
+        fig, axes = plt.subplots(1, 2, figsize=(14, 5))
+        sns.lineplot(x=daily.index, y=daily["messages"], marker="o", color="skyblue", ax=axes[0])
+        axes[0].set_xlabel("日期")
+        axes[0].set_ylabel("訊息量")
+        axes[0].set_title("每日訊息量")
+        axes[0].grid()
+        if not latency.empty:
+            sns.histplot(latency, bins=30, kde=True, color="skyblue", ax=axes[1])
+            axes[1].set_xlabel("回覆延遲 (秒)")
+            axes[1].set_ylabel("頻率")
+            axes[1].set_title("回覆延遲分佈")
+            axes[1].grid()
+        plt.tight_layout()
+        plt.show()
+
+if __name__ == "__main__":
+    # python -m sqlite.analytics --export
+    parser = argparse.ArgumentParser(description="Export conversation history to Parquet and show usage statistics.")
+    parser.add_argument("--db", type=Path, default=DB_PATH, help="conversation database (opened read-only)")
+    parser.add_argument("--archive-dir", type=Path, default=ARCHIVE_PATH, help="archive written by sqlite.retention")
+    parser.add_argument("--export-dir", type=Path, default=EXPORT_PATH, help="folder of the Parquet export")
+    parser.add_argument("--export", action="store_true", help="export new records before the report")
+    parser.add_argument("--days", type=int, default=None, help="only report the last N days")
+    parser.add_argument("--top", type=int, default=10, help="number of top questions")
+    parser.add_argument("--no-plot", action="store_true", help="print the statistics only")
+    args = parser.parse_args()
+
+    if args.export:
+        print(export_incremental(args.db, args.archive_dir, args.export_dir))
+    conversation_report(args.export_dir, args.top, args.days, plot=not args.no_plot)
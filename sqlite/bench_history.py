@@ -0,0 +1,100 @@
+import argparse
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict
+
+PATH = Path(__file__).resolve().parent
+sys.path.insert(0, str(PATH.parent))  # for import modules
+
+# create_db 匯入時不開啟資料庫，基準測試只讀寫暫存資料夾中的資料庫，不會動到 sqlite/conversations.db
+from sqlite.create_db import migrate_database, sql_file_path
+
+# python -m sqlite.bench_history
+# 以合成資料比較 timestamp 遷移前 (TEXT、無索引) 與遷移後 (epoch 毫秒 + (user_id, timestamp) 索引) 的查詢延遲
+
+def build_legacy_database(db_path: Path, rows: int, users: int, seed: int = 0):
+    """Version 0 database with the mixed text timestamps written by the old code."""
+    rng = random.Random(seed)
+    start = datetime.now() - timedelta(days=365)
+    with sqlite3.connect(db_path) as conn:
+        conn.executescript(sql_file_path.read_text())
+        records = []
+        for i in range(rows):
+            moment = start + timedelta(seconds=i * 365 * 86400 / rows)
+            # insert_conversation 寫入無毫秒的字串，save_data 寫入含毫秒的 datetime
+            timestamp = moment.strftime("%Y-%m-%d %H:%M:%S") if i % 2 else str(moment)
+            records.append((f"U{rng.randrange(users):08d}", f"question {i}", f"answer {i}", timestamp))
+        conn.executemany(
+            "INSERT INTO conversation_records (user_id, user_message, ai_message, timestamp) VALUES (?, ?, ?, ?)",
+            records,
+        )
+        conn.commit()
+
+def time_query(conn: sqlite3.Connection, query: Callable[[sqlite3.Connection, int], list], repeats: int,
+               users: int, seed: int = 1) -> float:
+    """Mean milliseconds per call over `repeats` random users."""
+    rng = random.Random(seed)
+    start_time = time.perf_counter()
+    for _ in range(repeats):
+        query(conn, rng.randrange(users))
+    return (time.perf_counter() - start_time) * 1000 / repeats
+
+def run_benchmark(rows: int, users: int, repeats: int) -> Dict[str, float]:
+    week_ago = datetime.now() - timedelta(days=7)
+    legacy_queries = {
+        "recent history (LIMIT 5)": lambda conn, user: conn.execute(
+            "SELECT user_message, ai_message, timestamp FROM conversation_records "
+            "WHERE user_id = ? ORDER BY timestamp DESC LIMIT 5", (f"U{user:08d}",)).fetchall(),
+        "user messages in last 7 days": lambda conn, user: conn.execute(
+            "SELECT COUNT(*) FROM conversation_records WHERE user_id = ? AND timestamp >= ?",
+            (f"U{user:08d}", week_ago.strftime("%Y-%m-%d %H:%M:%S"))).fetchall(),
+        "all messages in last 7 days": lambda conn, user: conn.execute(
+            "SELECT COUNT(*) FROM conversation_records WHERE timestamp >= ?",
+            (week_ago.strftime("%Y-%m-%d %H:%M:%S"),)).fetchall(),
+    }
+    week_ago_ms = int(week_ago.timestamp() * 1000)
+    epoch_queries = {
+        "recent history (LIMIT 5)": lambda conn, user: conn.execute(
+            "SELECT user_message, ai_message, compression, timestamp FROM conversation_records "
+            "WHERE user_id = ? ORDER BY timestamp DESC, id DESC LIMIT 5", (f"U{user:08d}",)).fetchall(),
+        "user messages in last 7 days": lambda conn, user: conn.execute(
+            "SELECT COUNT(*) FROM conversation_records WHERE user_id = ? AND timestamp >= ?",
+            (f"U{user:08d}", week_ago_ms)).fetchall(),
+        "all messages in last 7 days": lambda conn, user: conn.execute(
+            "SELECT COUNT(*) FROM conversation_records WHERE timestamp >= ?", (week_ago_ms,)).fetchall(),
+    }
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = Path(tmp_dir) / "conversations.db"
+        build_legacy_database(db_path, rows, users)
+        with sqlite3.connect(db_path) as conn:
+            before = {name: time_query(conn, query, repeats, users) for name, query in legacy_queries.items()}
+        conn.close()
+
+        start_time = time.perf_counter()
+        migrate_database(db_path)
+        migration_seconds = time.perf_counter() - start_time
+
+        with sqlite3.connect(db_path) as conn:
+            after = {name: time_query(conn, query, repeats, users) for name, query in epoch_queries.items()}
+        conn.close()
+
+    print(f"{rows:,} rows, {users:,} users, migration took {migration_seconds:.2f}s")
+    print(f"{'query':<32}{'TEXT (ms)':>12}{'epoch ms (ms)':>16}{'speedup':>10}")
+    for name in legacy_queries:
+        print(f"{name:<32}{before[name]:>12.3f}{after[name]:>16.3f}{before[name] / after[name]:>9.1f}x")
+    return {"migration_seconds": migration_seconds, **{f"{name} before": before[name] for name in before},
+            **{f"{name} after": after[name] for name in after}}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark conversation history queries before and after the epoch-ms migration.")
+    parser.add_argument("--rows", type=int, default=500_000, help="synthetic conversation records")
+    parser.add_argument("--users", type=int, default=2_000, help="distinct user ids")
+    parser.add_argument("--repeats", type=int, default=200, help="queries per measurement")
+    args = parser.parse_args()
+    run_benchmark(args.rows, args.users, args.repeats)
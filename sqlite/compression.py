@@ -0,0 +1,54 @@
+import os
+import zlib
+from typing import Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # zstd 為選用套件，未安裝時使用 zlib
+    zstandard = None
+
+# ai_message 超過此位元組數才壓縮，短訊息壓縮後幾乎不會變小
+COMPRESS_MIN_BYTES = int(os.getenv("CONVERSATION_COMPRESS_MIN_BYTES", "1024"))
+COMPRESSIONS = ("zlib", "zstd")
+COMPRESSION = os.getenv("CONVERSATION_COMPRESSION", "zstd" if zstandard is not None else "zlib")
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 10
+
+def compress_message(text: str, compression: str = COMPRESSION) -> Tuple[str | bytes, Optional[str]]:
+    """
+    Compress a message body for the `ai_message` column.
+
+    Args:
+        text (str): The message.
+        compression (str): "zlib" or "zstd".
+
+    Returns:
+        Tuple[str | bytes, Optional[str]]: The value to store and the `compression` column,
+        the text itself and None when it is too short to be worth compressing.
+    """
+    data = text.encode("utf-8")
+    if len(data) < COMPRESS_MIN_BYTES:
+        return text, None
+    if compression == "zstd":
+        if zstandard is None:
+            raise ValueError("zstd compression requires the 'zstandard' package")
+        compressed = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    elif compression == "zlib":
+        compressed = zlib.compress(data, ZLIB_LEVEL)
+    else:
+        raise ValueError(f"Unknown compression '{compression}', expected one of {COMPRESSIONS}")
+    if len(compressed) >= len(data):
+        return text, None
+    return compressed, compression
+
+def decompress_message(value: str | bytes, compression: Optional[str]) -> str:
+    """Inverse of `compress_message`."""
+    if compression is None:
+        return value
+    if compression == "zlib":
+        return zlib.decompress(value).decode("utf-8")
+    if compression == "zstd":
+        if zstandard is None:
+            raise ValueError("Reading zstd compressed messages requires the 'zstandard' package")
+        return zstandard.ZstdDecompressor().decompress(value).decode("utf-8")
+    raise ValueError(f"Unknown compression '{compression}'")
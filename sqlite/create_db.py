@@ -2,9 +2,14 @@ from typing import List, Tuple, Optional, Dict
 from datetime import datetime
 from pathlib import Path
 import sqlite3
+import sys
 
 # Define the database path in the current directory
 PATH = Path(__file__).resolve().parent
+sys.path.insert(0, str(PATH.parent))  # for import modules
+
+from sqlite.compression import compress_message, decompress_message
+
 db_path = PATH / "conversations.db"
 
 # Path to the SQL file for creating tables
@@ -29,9 +34,94 @@ def initialize_database(db_path: Path, sql_file_path: Path):
         sql_script = sql_file_path.read_text()
         cursor.executescript(sql_script)  # Execute the SQL script.
         conn.commit()
+    migrate_database(db_path)
+
+def add_compression_column(conn: sqlite3.Connection):
+    """Version 1: large `ai_message` bodies may be stored compressed (see compression.py)."""
+    conn.execute("ALTER TABLE conversation_records ADD COLUMN compression TEXT")
+
+def add_latency_column(conn: sqlite3.Connection):
+    """Version 2: milliseconds from the user's message to the stored answer, for analytics."""
+    conn.execute("ALTER TABLE conversation_records ADD COLUMN latency_ms INTEGER")
+
+def epoch_ms_timestamps(conn: sqlite3.Connection):
+    """
+    Version 3: `timestamp` becomes INTEGER milliseconds since the epoch (the unit of
+    LINE's event.timestamp), indexed with user_id for history queries.
+
+    SQLite cannot change a column type in place, so the table is rebuilt. Existing
+    text values ("YYYY-MM-DD HH:MM:SS[.ffffff]", written in local time) are converted.
+    """
+    # executescript 會先提交進行中的交易，因此逐句執行，整個重建在同一個交易中完成
+    statements = [
+        """
+        CREATE TABLE conversation_records_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            user_message TEXT NOT NULL,
+            ai_message NOT NULL,  -- TEXT，或 compression 不為 NULL 時為壓縮後的 BLOB
+            compression TEXT,
+            timestamp INTEGER NOT NULL DEFAULT (CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER)),
+            latency_ms INTEGER
+        )
+        """,
+        """
+        INSERT INTO conversation_records_new (id, user_id, user_message, ai_message, compression, timestamp, latency_ms)
+        SELECT id, user_id, user_message, ai_message, compression,
+            CASE
+                WHEN typeof(timestamp) IN ('integer', 'real') THEN CAST(timestamp AS INTEGER)
+                ELSE COALESCE(CAST(ROUND((julianday(timestamp, 'utc') - 2440587.5) * 86400000) AS INTEGER), 0)
+            END,
+            latency_ms
+        FROM conversation_records
+        """,
+        "DROP TABLE conversation_records",
+        "ALTER TABLE conversation_records_new RENAME TO conversation_records",
+        "CREATE INDEX idx_conversation_records_user_time ON conversation_records(user_id, timestamp)",
+        "CREATE INDEX idx_conversation_records_time ON conversation_records(timestamp)",
+    ]
+    for statement in statements:
+        conn.execute(statement)
+
+# 第 n 個遷移將 PRAGMA user_version 由 n-1 升到 n，新的遷移只能加在最後
+MIGRATIONS = [add_compression_column, add_latency_column, epoch_ms_timestamps]
+
+def migrate_database(db_path: Path):
+    """
+    Apply the migrations newer than the database's `PRAGMA user_version`, each in
+    its own transaction, and switch the database to incremental auto-vacuum and
+    WAL journaling.
+
+    Args:
+        db_path (Path): Path to the SQLite database file.
+
+    Raises:
+        sqlite3.DatabaseError: If a migration fails; it is rolled back and the version is unchanged.
+    """
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        for number, migration in enumerate(MIGRATIONS, start=1):
+            # BEGIN IMMEDIATE 後重新讀取版本，多個 worker 同時啟動時每個遷移只執行一次
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if conn.execute("PRAGMA user_version").fetchone()[0] < number:
+                    migration(conn)
+                    conn.execute(f"PRAGMA user_version = {number}")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        # auto_vacuum 模式需 VACUUM 一次才會生效，之後 retention 以 incremental_vacuum 歸還空間
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+        # WAL 讓分析匯出等唯讀連線不會阻擋 bot 寫入
+        conn.execute("PRAGMA journal_mode = WAL")
+    finally:
+        conn.close()
 
 def insert_conversation(
-    db_path: Path, user_id: str, user_message: str, ai_message: str, timestamp: Optional[str] = None
+    db_path: Path, user_id: str, user_message: str, ai_message: str, timestamp: Optional[int] = None
 ):
     """
     Inserts a conversation record into the database. Automatically uses the current timestamp if not provided.
@@ -41,21 +131,22 @@ def insert_conversation(
         user_id (str): The unique identifier for the user.
         user_message (str): The message sent by the user.
         ai_message (str): The message generated by the AI.
-        timestamp (Optional[str]): The timestamp for the record. If None, the current timestamp is used.
+        timestamp (Optional[int]): Milliseconds since the epoch. If None, the current time is used.
 
     Raises:
         sqlite3.DatabaseError: If an error occurs while inserting the record.
     """
     if timestamp is None:
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        timestamp = int(datetime.now().timestamp() * 1000)
 
     insert_sql = """
-    INSERT INTO conversation_records (user_id, user_message, ai_message, timestamp)
-    VALUES (?, ?, ?, ?);
+    INSERT INTO conversation_records (user_id, user_message, ai_message, compression, timestamp)
+    VALUES (?, ?, ?, ?, ?);
     """
+    ai_message, compression = compress_message(ai_message)
     with sqlite3.connect(db_path) as conn:
         cursor = conn.cursor()
-        cursor.execute(insert_sql, (user_id, user_message, ai_message, timestamp))
+        cursor.execute(insert_sql, (user_id, user_message, ai_message, compression, timestamp))
         conn.commit()
 
 
@@ -72,28 +163,30 @@ def fetch_conversations(db_path: Path, user_id: str) -> List[Tuple[int, str, str
             - id (int): The record ID.
             - user_message (str): The message sent by the user.
             - ai_message (str): The message generated by the AI.
-            - timestamp (str): The timestamp of the record.
+            - timestamp (int): Milliseconds since the epoch.
 
     Raises:
         sqlite3.DatabaseError: If an error occurs while fetching records.
     """
     select_sql = """
-    SELECT id, user_message, ai_message, timestamp
+    SELECT id, user_message, ai_message, compression, timestamp
     FROM conversation_records
     WHERE user_id = ?
-    ORDER BY timestamp DESC;
+    ORDER BY timestamp DESC, id DESC;
     """
     with sqlite3.connect(db_path) as conn:
         cursor = conn.cursor()
         cursor.execute(select_sql, (user_id,))
-        return cursor.fetchall()
-
+        return [
+            (record_id, user_message, decompress_message(ai_message, compression), timestamp)
+            for record_id, user_message, ai_message, compression, timestamp in cursor.fetchall()
+        ]
 
-# Initialize the database and create tables
-initialize_database(db_path, sql_file_path)
 
 # Test inserting and retrieving conversation records
 if __name__ == "__main__":
+    # 建立資料表並套用遷移；伺服器於 app.py 啟動時執行，匯入本模組不會開啟資料庫
+    initialize_database(db_path, sql_file_path)
     # Insert test records
     insert_conversation(db_path, "user_123", "Hello, AI!", "Hello, user!")
     # insert_conversation(db_path, "user_123", "How are you?", "I'm just a program, but I'm fine.", "2025-01-17 16:00:00")
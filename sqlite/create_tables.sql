@@ -1,3 +1,4 @@
+-- 版本 0 的資料表結構；之後的欄位與索引變更見 create_db.py 的 MIGRATIONS
 CREATE TABLE IF NOT EXISTS conversation_records (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     user_id TEXT NOT NULL,
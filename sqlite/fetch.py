@@ -2,11 +2,17 @@ from typing import List, Dict, Optional
 from langchain_core.messages import HumanMessage, AIMessage
 from pathlib import Path
 import sqlite3
+import sys
+import time
 from datetime import datetime
 
 # Define the database path in the current directory
 PATH = Path(__file__).resolve().parent
 DB_PATH = PATH / "conversations.db"
+sys.path.insert(0, str(PATH.parent))  # for import modules
+
+from sqlite.create_db import initialize_database, sql_file_path
+from sqlite.compression import compress_message, decompress_message
 
 
 def fetch_recent_conversations(
@@ -24,10 +30,10 @@ def fetch_recent_conversations(
         Optional[List[Dict[str, str]]]: A list of dictionaries representing conversation records, or None if empty.
     """
     select_sql = """
-    SELECT user_message, ai_message, timestamp
+    SELECT user_message, ai_message, compression, timestamp
     FROM conversation_records
     WHERE user_id = ?
-    ORDER BY timestamp DESC
+    ORDER BY timestamp DESC, id DESC
     LIMIT ?;
     """
     with sqlite3.connect(db_path) as conn:
@@ -37,7 +43,7 @@ def fetch_recent_conversations(
 
     if rows:
         return [
-            {"user_message": row[0], "ai_message": row[1], "timestamp": row[2]}
+            {"user_message": row[0], "ai_message": decompress_message(row[1], row[2]), "timestamp": row[3]}
             for row in rows
         ]
     return None
@@ -68,7 +74,8 @@ def save_data(user: dict, agent: dict, db_path: Path):
     Saves a conversation record to a SQLite database.
 
     Args:
-        user (dict): User message data containing user_id, user_message, and timestamp.
+        user (dict): User message data containing user_id, user_message, and timestamp
+            (milliseconds since the epoch, as in LINE's event.timestamp).
         agent (dict): Agent message data containing ai_message and timestamp.
         db_path (Path): Path to the SQLite database file.
 
@@ -76,8 +83,8 @@ def save_data(user: dict, agent: dict, db_path: Path):
         None
     """
     insert_sql = """
-        INSERT INTO conversation_records (user_id, user_message, ai_message, timestamp)
-        VALUES (?, ?, ?, ?);
+        INSERT INTO conversation_records (user_id, user_message, ai_message, compression, timestamp, latency_ms)
+        VALUES (?, ?, ?, ?, ?, ?);
     """
 
     try:
@@ -85,15 +92,23 @@ def save_data(user: dict, agent: dict, db_path: Path):
         with sqlite3.connect(db_path) as conn:
             cursor = conn.cursor()
 
-            # Format timestamp
-            timestamp_dt = datetime.fromtimestamp(user["timestamp"] / 1000.0)
+            # LINE event timestamps are already milliseconds since the epoch
+            timestamp_ms = int(user["timestamp"])
+
+            # Time from the user's message (LINE event timestamp) to the answer
+            latency_ms = int(time.time() * 1000) - timestamp_ms
+
+            # Large answers (e.g. RAG quotes) are stored compressed
+            ai_message, compression = compress_message(agent["agent_message"])
 
             # Prepare data
             conversation_data = (
                 user["user_id"],
                 user["user_message"],
-                agent["agent_message"],
-                timestamp_dt,
+                ai_message,
+                compression,
+                timestamp_ms,
+                latency_ms,
             )
 
             # Insert data
@@ -158,4 +173,5 @@ def test_save_and_fetch():
 
 
 if __name__ == "__main__":
+    initialize_database(DB_PATH, sql_file_path)
     test_save_and_fetch()
\ No newline at end of file
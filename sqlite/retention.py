@@ -0,0 +1,231 @@
+import argparse
+import gzip
+import json
+import os
+import sqlite3
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set
+
+PATH = Path(__file__).resolve().parent
+sys.path.insert(0, str(PATH.parent))  # for import modules
+
+from sqlite.compression import COMPRESS_MIN_BYTES, compress_message, decompress_message
+from sqlite.create_db import db_path as DB_PATH, migrate_database
+
+ARCHIVE_PATH = PATH / "archive"
+# 超過此天數的對話移到封存檔
+RETENTION_DAYS = int(os.getenv("CONVERSATION_RETENTION_DAYS", "90"))
+# 每個交易處理的列數，避免長時間持有寫入鎖而阻擋 bot 寫入
+BATCH_SIZE = 1000
+# 每次 incremental_vacuum 歸還的頁數上限 (None 表示全部)
+VACUUM_PAGES: Optional[int] = None
+ARCHIVE_PATTERN = "*/conversations-*.jsonl.gz"
+
+def archive_file_name(first_id: int, last_id: int) -> str:
+    # 檔名包含 id 範圍：中斷後重跑同一批資料會覆寫同一個檔案，而不會產生重複紀錄
+    return f"conversations-{first_id:012d}-{last_id:012d}.jsonl.gz"
+
+def archive_id_range(path: Path) -> tuple:
+    _, first_id, last_id = path.name[:-len(".jsonl.gz")].split("-")
+    return int(first_id), int(last_id)
+
+def write_archive(path: Path, records: List[Dict]):
+    """Write gzip JSON lines to a temporary file, fsync and rename it, so a partition is complete or absent."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as raw, gzip.open(raw, "wt", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        f.close()  # 寫入 gzip 結尾後才 fsync
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(tmp_path, path)
+
+def read_archive(path: Path) -> List[Dict]:
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+def remove_from_archive(archive_dir: Path, ids: Set[int], keep: Set[Path]):
+    """
+    Remove `ids` from the partition files other than `keep` whose id range overlaps
+    them, so every record id is archived in a single file.
+
+    A run interrupted between writing a partition and deleting its rows leaves those
+    rows in the database; the next run may archive them in a batch with a different
+    id range (the cutoff moved on), i.e. under another file name.
+    """
+    low, high = min(ids), max(ids)
+    for path in archive_dir.glob(ARCHIVE_PATTERN):
+        first_id, last_id = archive_id_range(path)
+        if path in keep or last_id < low or first_id > high:
+            continue
+        records = read_archive(path)
+        remaining = [record for record in records if record["id"] not in ids]
+        if len(remaining) == len(records):
+            continue
+        if remaining:
+            new_path = path.with_name(archive_file_name(remaining[0]["id"], remaining[-1]["id"]))
+            write_archive(new_path, remaining)
+            if new_path == path:
+                continue
+        path.unlink()
+
+def archive_old_records(db_path: Path, archive_dir: Path = ARCHIVE_PATH, older_than_days: int = RETENTION_DAYS,
+                        batch_size: int = BATCH_SIZE) -> int:
+    """
+    Move conversation records older than `older_than_days` to monthly partitions
+    `archive_dir/YYYY-MM/conversations-<first id>-<last id>.jsonl.gz`, deleting
+    them from the live database once their partition file is on disk. Rerunning
+    after an interruption never archives a record twice.
+
+    Args:
+        db_path (Path): Path to the SQLite database file.
+        archive_dir (Path): Root of the archive.
+        older_than_days (int): Age in days after which records are archived.
+        batch_size (int): Records moved per transaction.
+
+    Returns:
+        int: Number of records archived.
+    """
+    cutoff = int((datetime.now() - timedelta(days=older_than_days)).timestamp() * 1000)
+    archived = 0
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        while True:
+            rows = conn.execute(
+                "SELECT id, user_id, user_message, ai_message, compression, timestamp, latency_ms FROM conversation_records "
+                "WHERE timestamp < ? ORDER BY id LIMIT ?",
+                (cutoff, batch_size),
+            ).fetchall()
+            if not rows:
+                return archived
+
+            partitions: Dict[str, List[Dict]] = {}
+            for record_id, user_id, user_message, ai_message, compression, timestamp, latency_ms in rows:
+                month = datetime.fromtimestamp(timestamp / 1000).strftime("%Y-%m")
+                partitions.setdefault(month, []).append({
+                    "id": record_id,
+                    "user_id": user_id,
+                    "user_message": user_message,
+                    "ai_message": decompress_message(ai_message, compression),
+                    "timestamp": timestamp,
+                    "latency_ms": latency_ms,
+                })
+            written = set()
+            for month, records in partitions.items():
+                path = archive_dir / month / archive_file_name(records[0]["id"], records[-1]["id"])
+                write_archive(path, records)
+                written.add(path)
+
+            ids = [row[0] for row in rows]
+            # 先前中斷的執行可能已把部分紀錄寫進檔名 (id 範圍) 不同的檔案
+            remove_from_archive(archive_dir, set(ids), written)
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(f"DELETE FROM conversation_records WHERE id IN ({', '.join('?' * len(ids))})", ids)
+            conn.execute("COMMIT")
+            archived += len(ids)
+    finally:
+        conn.close()
+
+def iter_archive(archive_dir: Path = ARCHIVE_PATH, after_id: int = 0) -> Iterator[Dict]:
+    """
+    Stream archived records partition by partition (ordered by first id), skipping
+    partitions that only hold ids up to `after_id`. A record found in two partitions
+    (a run interrupted before `remove_from_archive`) is yielded once.
+
+    Args:
+        archive_dir (Path): Root of the archive.
+        after_id (int): Only records with a larger id are returned.
+    """
+    paths = sorted(archive_dir.glob(ARCHIVE_PATTERN), key=archive_id_range)
+    seen: Set[int] = set()
+    for path in paths:
+        first_id, last_id = archive_id_range(path)
+        # 之後的檔案 id 都不小於 first_id，較小的 id 不會再出現，不必保留
+        seen = {record_id for record_id in seen if record_id >= first_id}
+        if last_id <= after_id:
+            continue
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                if record["id"] > after_id and record["id"] not in seen:
+                    seen.add(record["id"])
+                    yield record
+
+def compress_records(db_path: Path, batch_size: int = BATCH_SIZE) -> int:
+    """
+    Compress the `ai_message` bodies that were stored uncompressed (before the
+    compression column existed, or by older code) and are large enough.
+
+    Returns:
+        int: Number of messages compressed.
+    """
+    compressed = 0
+    last_id = 0
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        while True:
+            rows = conn.execute(
+                "SELECT id, ai_message FROM conversation_records WHERE id > ? AND compression IS NULL "
+                "AND length(CAST(ai_message AS BLOB)) >= ? ORDER BY id LIMIT ?",
+                (last_id, COMPRESS_MIN_BYTES, batch_size),
+            ).fetchall()
+            if not rows:
+                return compressed
+            last_id = rows[-1][0]
+            updates = []
+            for record_id, ai_message in rows:
+                value, compression = compress_message(ai_message)
+                if compression is not None:
+                    updates.append((value, compression, record_id))
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                "UPDATE conversation_records SET ai_message = ?, compression = ? WHERE id = ? AND compression IS NULL",
+                updates,
+            )
+            conn.execute("COMMIT")
+            compressed += len(updates)
+    finally:
+        conn.close()
+
+def incremental_vacuum(db_path: Path, max_pages: Optional[int] = VACUUM_PAGES) -> int:
+    """
+    Return free pages to the file system without rewriting the whole database.
+
+    Returns:
+        int: Number of pages freed.
+    """
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        # incremental_vacuum 逐列回傳結果，必須讀完才會執行完畢
+        conn.execute(f"PRAGMA incremental_vacuum({int(max_pages)})" if max_pages else "PRAGMA incremental_vacuum").fetchall()
+        return before - conn.execute("PRAGMA freelist_count").fetchone()[0]
+    finally:
+        conn.close()
+
+def run_retention(db_path: Path = DB_PATH, archive_dir: Path = ARCHIVE_PATH, older_than_days: int = RETENTION_DAYS,
+                  vacuum: bool = True, vacuum_pages: Optional[int] = VACUUM_PAGES) -> Dict[str, int]:
+    """Archive old records, compress large messages and vacuum the freed pages."""
+    migrate_database(db_path)
+    stats = {"size_before": db_path.stat().st_size}
+    stats["archived"] = archive_old_records(db_path, archive_dir, older_than_days)
+    stats["compressed"] = compress_records(db_path)
+    stats["pages_freed"] = incremental_vacuum(db_path, vacuum_pages) if vacuum else 0
+    stats["size_after"] = db_path.stat().st_size
+    return stats
+
+if __name__ == "__main__":
+    # 建議以排程 (cron / systemd timer) 每日執行：python -m sqlite.retention
+    parser = argparse.ArgumentParser(description="Archive, compress and vacuum the conversation history.")
+    parser.add_argument("--db", type=Path, default=DB_PATH, help="conversation database")
+    parser.add_argument("--archive-dir", type=Path, default=ARCHIVE_PATH, help="root folder of the JSON lines archive")
+    parser.add_argument("--days", type=int, default=RETENTION_DAYS, help="archive records older than this many days")
+    parser.add_argument("--no-vacuum", action="store_true", help="skip the incremental vacuum")
+    parser.add_argument("--vacuum-pages", type=int, default=VACUUM_PAGES, help="pages freed per run (default: all)")
+    args = parser.parse_args()
+
+    stats = run_retention(args.db, args.archive_dir, args.days, not args.no_vacuum, args.vacuum_pages)
+    print(json.dumps(stats, indent=4))
@@ -0,0 +1,82 @@
+import argparse
+import statistics
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List
+
+PATH = Path(__file__).resolve().parent
+sys.path.insert(0, str(PATH.parent))  # for import modules
+
+from vision.detect import DETECT_MODES, get_model, predict_classes
+
+# python -m vision.bench_detect
+# 比較各推論模式的單張延遲與計數準確度。參考答案為 runs/detect/predict/labels 的 YOLO 標記檔
+# (full 模式以 save_txt 存下的結果)，因此準確度代表與原解析度預設推論的一致程度
+PREDICT_PATH = PATH.parent / "runs" / "detect" / "predict"
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png"}
+
+def load_reference(labels_path: Path, image_path: Path) -> Counter:
+    """Objects per class id in the YOLO label file of an image (class x y w h per line)."""
+    label_file = labels_path / f"{image_path.stem}.txt"
+    if not label_file.exists():
+        return Counter()
+    with open(label_file, "r", encoding="utf-8") as f:
+        return Counter(int(line.split()[0]) for line in f if line.strip())
+
+def count_errors(predicted: Counter, reference: Counter) -> int:
+    """Sum over classes of the absolute count difference."""
+    return sum(abs(predicted[class_id] - reference[class_id]) for class_id in set(predicted) | set(reference))
+
+def run_benchmark(images_path: Path, labels_path: Path, modes: List[str], repeats: int) -> Dict[str, Dict]:
+    image_files = sorted(path for path in images_path.iterdir() if path.suffix.lower() in IMAGE_SUFFIXES)
+    if not image_files:
+        print(f"❌ No images in {images_path}")
+        return {}
+    references = [load_reference(labels_path, path) for path in image_files]
+    model = get_model()
+    names = getattr(model, "names", {})
+    reference_total = sum(references, Counter())
+
+    report = {}
+    for mode in modes:
+        predict_classes(model, [image_files[0]], mode, verbose=False)  # warm-up
+        latencies = []
+        counts: List[Counter] = []
+        for image_file in image_files:
+            # 與伺服器相同，一次處理一張圖片 (含解碼)
+            for _ in range(repeats):
+                start_time = time.perf_counter()
+                class_ids = predict_classes(model, [image_file], mode, verbose=False)[0]
+                latencies.append((time.perf_counter() - start_time) * 1000)
+            counts.append(Counter(class_ids))
+        errors = [count_errors(predicted, reference) for predicted, reference in zip(counts, references)]
+        report[mode] = {
+            "mean_ms": statistics.mean(latencies),
+            "max_ms": max(latencies),
+            "count_error": sum(errors) / max(1, sum(reference_total.values())),
+            "exact_images": sum(error == 0 for error in errors),
+            "per_class": sum(counts, Counter()),
+        }
+
+    print(f"{len(image_files)} images in {images_path}, {sum(reference_total.values())} reference objects")
+    print(f"{'mode':<8}{'mean (ms)':>12}{'max (ms)':>12}{'count error':>14}{'exact images':>15}")
+    for mode, row in report.items():
+        print(f"{mode:<8}{row['mean_ms']:>12.1f}{row['max_ms']:>12.1f}{row['count_error']:>13.1%}"
+              f"{row['exact_images']:>10}/{len(image_files)}")
+
+    print(f"\n{'class':<20}{'reference':>10}" + "".join(f"{mode:>10}" for mode in report))
+    for class_id in sorted(set(reference_total) | set().union(*(row["per_class"] for row in report.values()))):
+        print(f"{names.get(class_id, class_id)!s:<20}{reference_total[class_id]:>10}"
+              + "".join(f"{row['per_class'][class_id]:>10}" for row in report.values()))
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark latency and count accuracy of the detect modes.")
+    parser.add_argument("--images", type=Path, default=PREDICT_PATH, help="folder of images to detect")
+    parser.add_argument("--labels", type=Path, default=None, help="YOLO label files (default: <images>/labels)")
+    parser.add_argument("--modes", nargs="+", choices=DETECT_MODES, default=list(DETECT_MODES), help="modes to compare")
+    parser.add_argument("--repeats", type=int, default=3, help="timed runs per image")
+    args = parser.parse_args()
+    run_benchmark(args.images, args.labels or args.images / "labels", args.modes, args.repeats)
@@ -1,14 +1,40 @@
 from ultralytics import YOLO
+from torchvision.ops import batched_nms
+from PIL import Image, ImageOps
 from collections import Counter
-from typing import Dict, Optional
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple, Union
 from pathlib import Path
+import numpy as np
+import torch
+import cv2
 from glob import glob
+import threading
 import shutil
 import os
 
 VISION_PATH = Path(__file__).resolve().parents[0]
 IMAGES_PATH = VISION_PATH / "images"
 MODEL_PATH = VISION_PATH / "model" /"yolov11_detect.pt"
+# 共用的 YOLO 模型不保證執行緒安全，同時只允許一個 predict
+_predict_lock = threading.Lock()
+
+# 推論模式：full 為原本的設定；fast 以縮小解碼與較小的輸入尺寸快速計數；
+# tiled 以重疊切片原解析度推論再跨切片合併，小零件 (螺栓、R 型插銷、墊圈) 較不會漏掉
+DETECT_MODES = ("full", "fast", "tiled")
+DETECT_MODE = os.getenv("DETECT_MODE", "full")
+FAST_IMGSZ = int(os.getenv("DETECT_FAST_IMGSZ", "416"))
+TILE_SIZE = int(os.getenv("DETECT_TILE_SIZE", "640"))
+TILE_OVERLAP = float(os.getenv("DETECT_TILE_OVERLAP", "0.2"))
+# 每次 predict 送入的切片數
+TILE_BATCH = int(os.getenv("DETECT_TILE_BATCH", "16"))
+# 合併切片結果：同類別 IoU 超過 MERGE_IOU 的框，或有 MERGE_IOS 面積落在分數較高的同類別框內的框 (切片邊緣截斷的零件) 移除
+MERGE_IOU = 0.5
+MERGE_IOS = 0.8
+
+ImageInput = Union[str, Path, np.ndarray]
+# (xyxy boxes, confidences, class ids)
+Detections = Tuple[torch.Tensor, torch.Tensor, torch.Tensor]
 
 def clean_folder(folder_path: Path):
     '''
@@ -19,22 +45,132 @@ def clean_folder(folder_path: Path):
         print(f"{folder_path} has been deleted.")
         os.makedirs(folder_path)
 
-def default_detect() -> Optional[Dict[str, int]] | None:
-    model = YOLO(MODEL_PATH)
-    image_files = glob(str(IMAGES_PATH) + '/*.[JjPp][PpNn][Gg]')
+@lru_cache(maxsize=None)
+def get_model(model_path: Path = MODEL_PATH) -> YOLO:
+    '''
+        Load the YOLO weights once per process instead of on every detection
+    '''
+    return YOLO(model_path)
+
+def load_image(image_path: Union[str, Path], mode: str = "full") -> np.ndarray:
+    '''
+        Decode an image to a BGR array; in fast mode JPEGs are decoded directly
+        at a reduced scale (PIL draft) that is still larger than FAST_IMGSZ
+    '''
+    if mode != "fast":
+        image = cv2.imread(str(image_path))
+        if image is None:
+            raise ValueError(f"Cannot decode image: {image_path}")
+        return image
+    with Image.open(image_path) as image:
+        image.draft("RGB", (FAST_IMGSZ, FAST_IMGSZ))
+        image = ImageOps.exif_transpose(image).convert("RGB")
+        return np.ascontiguousarray(np.asarray(image)[:, :, ::-1])
+
+def tile_windows(width: int, height: int, tile_size: int = TILE_SIZE,
+                 overlap: float = TILE_OVERLAP) -> List[Tuple[int, int, int, int]]:
+    '''
+        (x0, y0, x1, y1) windows of at most tile_size pixels covering the image,
+        neighbours overlapping by `overlap` of a tile
+    '''
+    def starts(length: int) -> List[int]:
+        if length <= tile_size:
+            return [0]
+        stride = max(1, int(tile_size * (1 - overlap)))
+        positions = list(range(0, length - tile_size, stride))
+        positions.append(length - tile_size)  # 最後一塊貼齊邊緣
+        return positions
+
+    return [(x, y, min(x + tile_size, width), min(y + tile_size, height))
+            for y in starts(height) for x in starts(width)]
+
+def empty_detections() -> Detections:
+    return torch.zeros((0, 4)), torch.zeros(0), torch.zeros(0)
+
+def merge_detections(boxes: torch.Tensor, scores: torch.Tensor, classes: torch.Tensor,
+                     iou: float = MERGE_IOU, ios: float = MERGE_IOS) -> Detections:
+    '''
+        Class-wise NMS over the boxes of every tile, then drop boxes mostly inside
+        a higher scoring box of the same class (an object cut by a tile border)
+    '''
+    keep = batched_nms(boxes, scores, classes, iou)  # 依分數由高到低排列
+    boxes, scores, classes = boxes[keep], scores[keep], classes[keep]
+    if len(boxes) > 1:
+        areas = ((boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])).clamp(min=1e-6)
+        top_left = torch.max(boxes[:, None, :2], boxes[None, :, :2])
+        bottom_right = torch.min(boxes[:, None, 2:], boxes[None, :, 2:])
+        intersection = (bottom_right - top_left).clamp(min=0).prod(dim=2)
+        # covered[i, j]: 框 i 有超過 ios 的面積在同類別的框 j 內；只看分數較高的 j (j < i)
+        covered = (intersection / areas[:, None] > ios) & (classes[:, None] == classes[None, :])
+        keep = ~torch.tril(covered, diagonal=-1).any(dim=1)
+        boxes, scores, classes = boxes[keep], scores[keep], classes[keep]
+    return boxes, scores, classes
+
+def predict_tiled(model: YOLO, images: List[np.ndarray]) -> List[Detections]:
+    '''
+        Detect on overlapping full-resolution tiles plus a downscaled view of the
+        whole image (for parts larger than a tile), batched across images
+    '''
+    jobs = []  # (image index, x offset, y offset, pixels)
+    for index, image in enumerate(images):
+        height, width = image.shape[:2]
+        windows = tile_windows(width, height)
+        if len(windows) > 1:
+            jobs.append((index, 0, 0, image))
+        for x0, y0, x1, y1 in windows:
+            jobs.append((index, x0, y0, image[y0:y1, x0:x1]))
+
+    parts: List[List[Detections]] = [[] for _ in images]
+    for start in range(0, len(jobs), TILE_BATCH):
+        chunk = jobs[start:start + TILE_BATCH]
+        results = model.predict([pixels for _, _, _, pixels in chunk], imgsz=TILE_SIZE, verbose=False)
+        for (index, x0, y0, _), result in zip(chunk, results):
+            if result.boxes is None or not len(result.boxes):
+                continue
+            offset = result.boxes.xyxy.new_tensor([x0, y0, x0, y0])
+            parts[index].append((result.boxes.xyxy + offset, result.boxes.conf, result.boxes.cls))
+
+    return [merge_detections(*(torch.cat(tensors) for tensors in zip(*image_parts))) if image_parts
+            else empty_detections() for image_parts in parts]
+
+def predict_classes(model: YOLO, images: List[ImageInput], mode: str = DETECT_MODE, **predict_args) -> List[List[int]]:
+    '''
+        Class ids detected in each image with the given inference mode; extra
+        arguments are passed to model.predict in full mode only
+    '''
+    if mode not in DETECT_MODES:
+        raise ValueError(f"Unknown detect mode {mode!r}, expected one of {DETECT_MODES}")
+    if mode == "tiled":
+        arrays = [image if isinstance(image, np.ndarray) else load_image(image) for image in images]
+        return [classes.int().tolist() for _, _, classes in predict_tiled(model, arrays)]
+    if mode == "fast":
+        images = [image if isinstance(image, np.ndarray) else load_image(image, mode) for image in images]
+        predict_args = {"imgsz": FAST_IMGSZ, "verbose": False}
+    results = model.predict(images, **predict_args)
+    return [result.boxes.cls.int().tolist() if result.boxes is not None else [] for result in results]
+
+def default_detect(images_path: Path = IMAGES_PATH, save: bool = True,
+                   mode: str = DETECT_MODE) -> Optional[Dict[str, int]] | None:
+    '''
+        Count the objects in every image of `images_path`; the server passes its
+        per-batch folder and save=False, since nothing reads the saved results.
+        Results are only saved in full mode.
+    '''
+    model = get_model()
+    image_files = glob(str(images_path) + '/*.[JjPp][PpNn][Gg]')
 
     if not image_files:
         print("No image files found.")
         return None
     
     print(f"Processing {len(image_files)} images:", image_files)
-    results = model.predict(image_files, save=True, save_txt=True, save_crop=True, exist_ok=True)
+    save_args = {"save": save, "save_txt": save, "save_crop": save, "exist_ok": True} if mode == "full" else {}
+    with _predict_lock:
+        class_lists = predict_classes(model, image_files, mode, **save_args)
 
     object_count = Counter()
-    for result in results:
-        if hasattr(result, "boxes") and result.boxes is not None:
-            class_ids = result.boxes.cls.tolist() if result.boxes.cls is not None else []
-            object_count.update(class_ids)
+    for class_ids in class_lists:
+        object_count.update(class_ids)
 
     # 將 class ID 轉換為物件名稱
     if hasattr(model, "names"):
@@ -47,4 +183,5 @@ def default_detect() -> Optional[Dict[str, int]] | None:
 
 
 if __name__ == "__main__":
+    # DETECT_MODE=tiled python vision/detect.py
     default_detect()
\ No newline at end of file